@@ -120,6 +120,171 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = 'C:\\Users\\suici\\access_scanner\\accessibility_scanner\\scanner\\static\\scanner'
 
+# Scan pipeline
+# SCAN_EXECUTOR runs the WCAG validators 'serial'ly on the request thread, or fans
+# them out over a 'thread' or 'process' pool of SCAN_EXECUTOR_WORKERS workers
+
+SCAN_EXECUTOR = os.environ.get('SCAN_EXECUTOR', 'serial')
+SCAN_EXECUTOR_WORKERS = int(os.environ.get('SCAN_EXECUTOR_WORKERS', 5))
+
+# Validator results are cached on a hash of the page HTML and the validator versions.
+# The in-process tier keeps RESULT_CACHE_MEMORY_ENTRIES pages; the database tier drops
+# entries older than RESULT_CACHE_MAX_AGE seconds and keeps under RESULT_CACHE_MAX_BYTES,
+# checked every RESULT_CACHE_EVICT_EVERY writes
+
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MEMORY_ENTRIES = 128
+RESULT_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RESULT_CACHE_EVICT_EVERY = 100
+
+# The font check reads linked stylesheets through the fetcher, caching them by URL
+
+FONT_CHECK_LOAD_STYLESHEETS = True
+
+# Linked stylesheets are shared by the validators and the font check across scans.
+# They are kept in memory up to STYLESHEET_CACHE_MEMORY_BYTES and on disk in
+# STYLESHEET_CACHE_DIR up to STYLESHEET_CACHE_DISK_BYTES, and revalidated with
+# their ETag once they are older than STYLESHEET_CACHE_MAX_AGE seconds
+
+STYLESHEET_CACHE_DIR = os.path.join(BASE_DIR, 'stylesheet_cache')
+STYLESHEET_CACHE_MEMORY_BYTES = 32 * 1024 * 1024
+STYLESHEET_CACHE_DISK_BYTES = 256 * 1024 * 1024
+STYLESHEET_CACHE_MAX_AGE = 60 * 60
+
+# Scan findings are written with bulk_create in batches of FINDINGS_BATCH_SIZE rows
+
+FINDINGS_BATCH_SIZE = 1000
+
+# With INCREMENTAL_SCANS on, a rescan of a URL only stores the findings added or
+# resolved since its previous scan. Every INCREMENTAL_FULL_EVERY scans of a URL
+# store a full copy again, which bounds the work of rebuilding a scan
+
+INCREMENTAL_SCANS = os.environ.get('INCREMENTAL_SCANS', '') == '1'
+INCREMENTAL_FULL_EVERY = 30
+
+# `python manage.py prune_scans` keeps RETENTION_DAYS days of scans in full and rolls
+# older ones up into per-URL, per-day ScanRollup rows, deleting RETENTION_BATCH_SIZE
+# scans per transaction. With --archive they are first written to RETENTION_ARCHIVE_DIR
+
+RETENTION_DAYS = 90
+RETENTION_BATCH_SIZE = 200
+RETENTION_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive')
+
+# Exports stream findings from the database EXPORT_CHUNK_SIZE rows at a time.
+# Parquet exports need the optional pyarrow package
+
+EXPORT_CHUNK_SIZE = 2000
+
+# The dashboard charts the last DASHBOARD_TREND_SCANS scans of the URL it shows
+
+DASHBOARD_TREND_SCANS = 30
+
+# Signed in users see their own scans on the history page, HISTORY_PAGE_SIZE at a
+# time. Pages that need a signed in user send visitors to LOGIN_URL
+
+HISTORY_PAGE_SIZE = 25
+LOGIN_URL = 'login'
+
+# The stream endpoint scans a page inside the request, so it is for signed in users
+# only and runs at most STREAM_SCAN_MAX_CONCURRENT scans at once per web process.
+# Requests past that get a 429 asking them to retry
+
+STREAM_SCAN_MAX_CONCURRENT = 2
+
+# Scan results are persisted through RESULT_SINK: 'database', 'file' (a JSON file
+# per scan in RESULT_SINK_DIR) or 'none'. Crawls save RESULT_SINK_BATCH_SIZE scans
+# per transaction. SCAN_DEBUG_DUMP writes each scan's results to SCAN_DEBUG_DUMP_DIR
+
+RESULT_SINK = os.environ.get('RESULT_SINK', 'database')
+RESULT_SINK_DIR = os.path.join(BASE_DIR, 'results')
+RESULT_SINK_BATCH_SIZE = 50
+SCAN_DEBUG_DUMP = os.environ.get('SCAN_DEBUG_DUMP', '') == '1'
+SCAN_DEBUG_DUMP_DIR = os.path.join(BASE_DIR, 'debug_dumps')
+
+# Scans are queued as ScanJob rows and run by `python manage.py run_scan_worker`.
+# SCAN_STATUS_MAX_WAIT caps how long the status endpoint will hold a request
+# open for a job, short enough not to tie up a web worker; clients poll again
+# after SCAN_STATUS_RETRY_AFTER seconds. A page job still running after
+# SCAN_JOB_TIMEOUT seconds, or a crawl after CRAWL_JOB_TIMEOUT, belongs to a
+# worker that died and is queued again, up to SCAN_JOB_MAX_ATTEMPTS runs in all.
+# Requests for a URL and profile that is already queued or running join that job,
+# and a scan that finished less than SCAN_FRESHNESS_SECONDS ago is served again.
+# A queued job that a request would join fails instead when it has waited over
+# SCAN_QUEUE_TIMEOUT seconds and no worker has claimed any job in that time.
+# The web process only imports the scanning code when a view scans; with
+# SCAN_WORKER_PREWARM a worker imports it and every validator as it starts
+
+SCAN_STATUS_MAX_WAIT = 2
+SCAN_STATUS_RETRY_AFTER = 2
+SCAN_JOB_TIMEOUT = 15 * 60
+CRAWL_JOB_TIMEOUT = 6 * 60 * 60
+SCAN_JOB_MAX_ATTEMPTS = 3
+SCAN_FRESHNESS_SECONDS = 60
+SCAN_QUEUE_TIMEOUT = 15 * 60
+SCAN_WORKER_PREWARM = os.environ.get('SCAN_WORKER_PREWARM', '1') == '1'
+
+# Every scan records wall and CPU time per stage and per validator on its result and
+# on /metrics. SCAN_TRACE_ALLOCATIONS adds allocated bytes by running tracemalloc,
+# which slows scans down noticeably. SCAN_PROFILE also writes a cProfile profile and
+# a tracemalloc summary for each scan to SCAN_PROFILE_DIR
+
+SCAN_TRACE_ALLOCATIONS = os.environ.get('SCAN_TRACE_ALLOCATIONS', '') == '1'
+SCAN_PROFILE = os.environ.get('SCAN_PROFILE', '') == '1'
+SCAN_PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# The JSON API under /api/ accepts up to API_MAX_BATCH URLs or HTML documents per
+# request, in a body of at most API_MAX_REQUEST_BYTES. Lists return API_PAGE_SIZE
+# items unless ?limit= asks for more, up to API_MAX_PAGE_SIZE
+
+API_MAX_BATCH = 1000
+API_MAX_REQUEST_BYTES = 100 * 1024 * 1024
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# Local directories and zip archives of built sites are scanned across
+# LOCAL_SCAN_WORKERS processes. Archives may expand to LOCAL_SCAN_MAX_ARCHIVE_BYTES
+# and uploads to the scan_upload page are limited to LOCAL_SCAN_MAX_UPLOAD_BYTES.
+# Uploaded archives wait in LOCAL_SCAN_UPLOAD_DIR until a scan worker has scanned them
+
+LOCAL_SCAN_WORKERS = int(os.environ.get('LOCAL_SCAN_WORKERS', os.cpu_count() or 1))
+LOCAL_SCAN_MAX_ARCHIVE_BYTES = 1024 * 1024 * 1024
+LOCAL_SCAN_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+LOCAL_SCAN_UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
+
+# Page fetching shares one pooled session of FETCH_POOL_SIZE connections per host.
+# Timeouts are in seconds and bodies over FETCH_MAX_BYTES are abandoned
+
+FETCH_CONNECT_TIMEOUT = 5
+FETCH_READ_TIMEOUT = 30
+FETCH_MAX_BYTES = 10 * 1024 * 1024
+FETCH_POOL_SIZE = 10
+
+# SCAN_RENDERER turns a URL into the HTML that is scanned: 'http' fetches the server
+# HTML, 'snapshot' reads pages rendered ahead of time from RENDER_SNAPSHOT_DIR and
+# 'headless' runs the page's JavaScript in RENDER_ENGINE, kept warm in a pool of
+# RENDER_WORKERS processes. A render gets RENDER_TIMEOUT seconds (plus
+# RENDER_TIMEOUT_GRACE before its worker is killed) and RENDER_MEMORY_MB of memory.
+# With RENDER_FALLBACK, pages that can't be rendered, or every page when the engine
+# isn't installed, are fetched over HTTP instead
+
+SCAN_RENDERER = os.environ.get('SCAN_RENDERER', 'http')
+RENDER_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'snapshots')
+RENDER_ENGINE = 'scanner.renderers.PlaywrightEngine'
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 2))
+RENDER_TIMEOUT = 30
+RENDER_TIMEOUT_GRACE = 5
+RENDER_MEMORY_MB = 1024
+RENDER_FALLBACK = True
+
+# Site crawls fetch at most CRAWL_CONCURRENCY pages at once, wait CRAWL_HOST_DELAY
+# seconds between requests to the same host and stop after CRAWL_MAX_PAGES pages
+
+CRAWL_CONCURRENCY = 5
+CRAWL_HOST_DELAY = 1.0
+CRAWL_MAX_PAGES = 500
+CRAWL_USER_AGENT = 'access_scanner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
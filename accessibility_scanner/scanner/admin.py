@@ -1,7 +1,11 @@
 from django.contrib import admin
 
-from .models import AccessibilityResult
+from .models import AccessibilityResult, Finding, ScanJob, ScanProfile, ScanRollup
 
 # Register your models here.
 
 admin.site.register(AccessibilityResult)
+admin.site.register(ScanJob)
+admin.site.register(Finding)
+admin.site.register(ScanProfile)
+admin.site.register(ScanRollup)
@@ -0,0 +1,415 @@
+import json
+from bisect import bisect_right
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .jobs import enqueue_scans
+from .models import Finding, ScanJob, ScanProfile, ScanRollup
+from .incremental import current_finding_ids
+from .views import owned_jobs, owned_scans, parse_export_time, request_user
+
+# Result and finding columns, read with values() so no model instances are built
+RESULT_FIELDS = [
+    'id', 'url', 'timestamp', 'serif_font_check', 'base_scan_id',
+    'success_count', 'failure_count', 'warning_count', 'skipped_count',
+    'success_example', 'failure_example', 'warning_example', 'skipped_example',
+]
+FINDING_FIELDS = [
+    'id', 'scan_id', 'section_type', 'guideline', 'technique', 'message',
+    'error_code', 'xpath', 'classes', 'element_id', 'change',
+]
+ROLLUP_FIELDS = [
+    'id', 'url', 'day', 'profile_name', 'scan_count', 'success_count', 'failure_count',
+    'warning_count', 'skipped_count', 'max_failure_count', 'serif_font_scans',
+    'first_scan_at', 'last_scan_at',
+]
+# Query parameters that filter findings, and the field each one matches
+FINDING_FILTERS = {
+    'section': 'section_type',
+    'guideline': 'guideline',
+    'technique': 'technique',
+    'error_code': 'error_code',
+    'change': 'change',
+}
+
+
+class ApiError(Exception):
+    """
+    A problem with an API request, returned to the client as a JSON error
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_error(err):
+    return JsonResponse({'error': str(err)}, status=err.status)
+
+
+def page_limit(params):
+    """
+    Reads ?limit=, defaulting to settings.API_PAGE_SIZE and capped at settings.API_MAX_PAGE_SIZE
+    """
+    try:
+        limit = int(params.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be a number")
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def cursor(params, name):
+    try:
+        return int(params[name]) if params.get(name) else None
+    except ValueError:
+        raise ApiError(f"{name} must be an id")
+
+
+def page(request, rows, limit, cursor_name):
+    """
+    Builds one page of a keyset-paginated list.
+
+    The rows are already filtered past the cursor and ordered by id, so each
+    page is an index range scan however deep the client pages.
+
+    Args:
+        request (HttpRequest): The request, whose query string the next link keeps
+        rows (iterable): Row dicts ordered by id, at least limit + 1 of them if there are more
+        limit (int): The page size
+        cursor_name (str): 'after' or 'before', the parameter the next link sets
+
+    Returns:
+        dict: The items and the URL of the next page, or None on the last page
+    """
+    items = list(rows[:limit + 1])
+    next_url = None
+    if len(items) > limit:
+        items = items[:limit]
+        params = request.GET.copy()
+        params[cursor_name] = items[-1]['id']
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return {'items': items, 'next': next_url}
+
+
+def read_batch(request):
+    """
+    Parses and checks the body of a batch submission
+
+    Args:
+        request (HttpRequest): A POST with a JSON object holding 'urls', a list
+            of URLs, and/or 'documents', a list of {'html': ..., 'url': ...}
+            objects, plus an optional profile name
+
+    Returns:
+        tuple: (the URLs, the (html, url) documents, the ScanProfile or None)
+    """
+    from .documents import RAW_HTML_URL
+
+    if int(request.META.get('CONTENT_LENGTH') or 0) > settings.API_MAX_REQUEST_BYTES:
+        raise ApiError(f"Request bodies are limited to {settings.API_MAX_REQUEST_BYTES} bytes", status=413)
+    try:
+        # Read the stream directly, as request.body is capped far below a full batch
+        data = json.load(request)
+    except ValueError:
+        raise ApiError("The body must be a JSON object")
+    if not isinstance(data, dict):
+        raise ApiError("The body must be a JSON object")
+
+    urls = data.get('urls') or []
+    documents = data.get('documents') or []
+    if not isinstance(urls, list) or not isinstance(documents, list):
+        raise ApiError("urls and documents must be lists")
+    if not urls and not documents:
+        raise ApiError("Pass a list of urls or documents")
+    if len(urls) + len(documents) > settings.API_MAX_BATCH:
+        raise ApiError(f"A batch holds at most {settings.API_MAX_BATCH} urls and documents")
+
+    url_field = forms.URLField(max_length=200)
+    errors = []
+    for index, url in enumerate(urls):
+        try:
+            urls[index] = url_field.clean(url)
+        except ValidationError as err:
+            errors.append(f"urls[{index}]: {' '.join(err.messages)}")
+
+    checked = []
+    for index, document in enumerate(documents):
+        if not isinstance(document, dict) or not isinstance(document.get('html'), str):
+            errors.append(f"documents[{index}]: html must be a string")
+            continue
+        if len(document['html'].encode('utf-8')) > settings.FETCH_MAX_BYTES:
+            errors.append(f"documents[{index}]: html is over {settings.FETCH_MAX_BYTES} bytes")
+            continue
+        url = RAW_HTML_URL
+        if document.get('url'):
+            try:
+                url = url_field.clean(document['url'])
+            except ValidationError as err:
+                errors.append(f"documents[{index}]: {' '.join(err.messages)}")
+                continue
+        checked.append((document['html'], url))
+    if errors:
+        raise ApiError('; '.join(errors))
+
+    profile = None
+    if data.get('profile'):
+        try:
+            profile = ScanProfile.objects.get(name=data['profile'])
+        except ScanProfile.DoesNotExist:
+            raise ApiError(f"No scan profile named '{data['profile']}'")
+    return urls, checked, profile
+
+
+def job_data(job):
+    return {
+        'id': job.id,
+        'url': job.url,
+        'mode': job.mode,
+        'status': job.status,
+        'error': job.error,
+        'result_id': job.result_id,
+        'status_url': reverse('api_scan', args=[job.id]),
+    }
+
+
+def csrf_exempt_anonymous(view):
+    """
+    Skips the CSRF check for clients without a session, such as scripts and CI
+    jobs. A request that is signed in through its session cookie must still pass
+    it, so another site can't queue scans in a signed in user's name
+    """
+    check = CsrfViewMiddleware(lambda request: None)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            rejected = check.process_view(request, None, args, kwargs)
+            if rejected is not None:
+                return rejected
+        return view(request, *args, **kwargs)
+    return wrapped
+
+
+@csrf_exempt_anonymous
+@require_POST
+def submit_scans(request):
+    """
+    Queues a batch of URLs and HTML documents for the scan workers
+
+    Args:
+        request (HttpRequest): See read_batch for the body
+
+    Returns:
+        JsonResponse: 202 with the queued scans and their ids, in submission order
+    """
+    try:
+        urls, documents, profile = read_batch(request)
+    except ApiError as err:
+        return api_error(err)
+
+    user = request_user(request)
+    # URLs already queued, running or freshly scanned share that job
+    jobs = enqueue_scans(urls, profile, user) if urls else []
+    documents = [
+        ScanJob(url=url, mode=ScanJob.HTML, html=html, profile=profile, user=user) for html, url in documents
+    ]
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            ScanJob.objects.bulk_create(documents)
+        else:
+            for job in documents:
+                job.save()
+    return JsonResponse({'scans': [job_data(job) for job in jobs + documents]}, status=202)
+
+
+@require_GET
+def scan_detail(request, job_id):
+    """
+    Returns the state of a queued scan, with the id of its result once it is done
+    """
+    return JsonResponse(job_data(get_object_or_404(owned_jobs(request), pk=job_id)))
+
+
+@require_GET
+def result_list(request):
+    """
+    Lists the signed in user's saved scans, or the anonymous ones, newest first
+
+    Args:
+        request (HttpRequest): ?url=, ?url_prefix=, ?profile=, ?start=, ?end= and
+            ?has_failures=1 filter the scans; ?limit= and ?before= page through them
+
+    Returns:
+        JsonResponse: The scan summaries and the URL of the next page
+    """
+    params = request.GET
+    try:
+        limit = page_limit(params)
+        before = cursor(params, 'before')
+        start = parse_export_time(params.get('start'))
+        end = parse_export_time(params.get('end'))
+    except (ApiError, ValueError) as err:
+        return JsonResponse({'error': str(err)}, status=400)
+
+    results = owned_scans(request)
+    if params.get('url'):
+        results = results.filter(url=params['url'])
+    if params.get('url_prefix'):
+        results = results.filter(url__startswith=params['url_prefix'])
+    if params.get('profile'):
+        results = results.filter(profile__name=params['profile'])
+    if start is not None:
+        results = results.filter(timestamp__gte=start)
+    if end is not None:
+        results = results.filter(timestamp__lt=end)
+    if params.get('has_failures') == '1':
+        results = results.filter(failure_count__gt=0)
+    if before is not None:
+        results = results.filter(id__lt=before)
+
+    rows = results.order_by('-id').values(*RESULT_FIELDS, profile_name=F('profile__name'))
+    return JsonResponse(page(request, rows, limit, 'before'))
+
+
+@require_GET
+def result_detail(request, scan_id):
+    """
+    Returns the summary and timings of one saved scan
+    """
+    fields = RESULT_FIELDS + ['timings', 'chain_length']
+    rows = owned_scans(request).filter(pk=scan_id).values(*fields, profile_name=F('profile__name'))
+    row = rows.first()
+    if row is None:
+        return JsonResponse({'error': 'No such scan'}, status=404)
+    row['findings_url'] = reverse('api_result_findings', args=[scan_id])
+    return JsonResponse(row)
+
+
+def finding_filters(params):
+    return {field: params[name] for name, field in FINDING_FILTERS.items() if params.get(name)}
+
+
+@require_GET
+def result_findings(request, scan_id):
+    """
+    Lists the findings of one scan, in the order they were found
+
+    Args:
+        request (HttpRequest): ?section=, ?guideline=, ?technique= and ?error_code=
+            filter the findings; ?limit= and ?after= page through them
+        scan_id (int): The id of the scan
+
+    Returns:
+        JsonResponse: The findings and the URL of the next page
+    """
+    scan = get_object_or_404(owned_scans(request), pk=scan_id)
+    try:
+        limit = page_limit(request.GET)
+        after = cursor(request.GET, 'after') or 0
+    except ApiError as err:
+        return api_error(err)
+    filters = finding_filters(request.GET)
+    filters.pop('change', None)
+
+    if scan.base_scan_id is None:
+        rows = scan.findings.filter(id__gt=after, **filters).order_by('id').values(*FINDING_FIELDS)
+        return JsonResponse(page(request, rows, limit, 'after'))
+
+    # An incremental scan is rebuilt from its base scan, then its rows are
+    # read a batch of ids at a time until there is a page of them
+    ids = current_finding_ids(scan)
+    rows = []
+    for start in range(bisect_right(ids, after), len(ids), settings.API_MAX_PAGE_SIZE):
+        batch = ids[start:start + settings.API_MAX_PAGE_SIZE]
+        rows.extend(Finding.objects.filter(id__in=batch, **filters).order_by('id').values(*FINDING_FIELDS))
+        if len(rows) > limit:
+            break
+    for row in rows:
+        row['scan_id'] = scan.id
+    return JsonResponse(page(request, rows, limit, 'after'))
+
+
+@require_GET
+def finding_list(request):
+    """
+    Lists stored findings across the signed in user's scans, or the anonymous
+    ones, oldest first. Incremental scans only store what changed, marked in
+    the change field
+
+    Args:
+        request (HttpRequest): ?scan=, ?url=, ?url_prefix=, ?section=, ?guideline=,
+            ?technique=, ?error_code= and ?change= filter the findings; ?limit=
+            and ?after= page through them
+
+    Returns:
+        JsonResponse: The findings and the URL of the next page
+    """
+    params = request.GET
+    try:
+        limit = page_limit(params)
+        after = cursor(params, 'after') or 0
+        scan_id = cursor(params, 'scan')
+    except ApiError as err:
+        return api_error(err)
+
+    findings = Finding.objects.filter(scan__user=request_user(request), id__gt=after, **finding_filters(params))
+    if scan_id is not None:
+        findings = findings.filter(scan_id=scan_id)
+    if params.get('url'):
+        findings = findings.filter(scan__url=params['url'])
+    if params.get('url_prefix'):
+        findings = findings.filter(scan__url__startswith=params['url_prefix'])
+
+    rows = findings.order_by('id').values(*FINDING_FIELDS, url=F('scan__url'))
+    return JsonResponse(page(request, rows, limit, 'after'))
+
+
+@require_GET
+def rollup_list(request):
+    """
+    Lists the per-URL, per-day summaries of scans that retention has deleted, latest rolled up first
+
+    Args:
+        request (HttpRequest): ?url=, ?url_prefix=, ?profile=, ?start= and ?end=
+            filter the days; ?limit= and ?before= page through them
+
+    Returns:
+        JsonResponse: The daily summaries and the URL of the next page
+    """
+    params = request.GET
+    try:
+        limit = page_limit(params)
+        before = cursor(params, 'before')
+        start = parse_export_time(params.get('start'))
+        end = parse_export_time(params.get('end'))
+    except (ApiError, ValueError) as err:
+        return JsonResponse({'error': str(err)}, status=400)
+
+    rollups = ScanRollup.objects.filter(user=request_user(request))
+    if params.get('url'):
+        rollups = rollups.filter(url=params['url'])
+    if params.get('url_prefix'):
+        rollups = rollups.filter(url__startswith=params['url_prefix'])
+    if 'profile' in params:
+        rollups = rollups.filter(profile_name=params['profile'])
+    if start is not None:
+        rollups = rollups.filter(last_scan_at__gte=start)
+    if end is not None:
+        rollups = rollups.filter(first_scan_at__lt=end)
+    if before is not None:
+        rollups = rollups.filter(id__lt=before)
+
+    rows = rollups.order_by('-id').values(*ROLLUP_FIELDS)
+    return JsonResponse(page(request, rows, limit, 'before'))
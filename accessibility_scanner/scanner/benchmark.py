@@ -0,0 +1,321 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+
+from .result_cache import validator_versions
+from .wcag_script import Anteater, Ayeaye, Glowworm, Molerat, Tarsier, check_accessibility, run_validator
+
+# Bump when the layout of the results file changes
+BENCHMARK_FORMAT = 1
+
+KB = 1024
+MB = 1024 * KB
+DEFAULT_SIZES = [10 * KB, 100 * KB, 1 * MB, 10 * MB]
+
+# Elements added to each ~10 KB block of a synthetic page
+DEFAULT_DENSITY = {'images': 4, 'headings': 3, 'tables': 1, 'inline_styles': 6}
+BLOCK_SIZE = 10 * KB
+
+VALIDATORS = [Anteater, Ayeaye, Glowworm, Molerat, Tarsier]
+
+WORDS = (
+    'access scan page content colour contrast heading table image caption '
+    'reader screen label form button link navigation section article text'
+).split()
+
+# What a new process imports before it can do any work: a web process its
+# URLconf and every view, a scan worker its command
+STARTUP_MODULES = {
+    'web': 'accessibility_scanner.urls',
+    'worker': 'scanner.management.commands.run_scan_worker',
+}
+# Libraries only a scan needs, which the web process should not load at startup
+HEAVY_MODULES = ['wcag_zoo', 'premailer', 'cssutils', 'lxml', 'cssselect', 'requests']
+
+# Run in a fresh interpreter with the module and HEAVY_MODULES as arguments
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+__import__(sys.argv[1])
+end = time.perf_counter()
+loaded = sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[2:]))
+print(json.dumps({'setup': setup - start, 'import': end - setup, 'heavy_modules': loaded}))
+'''
+
+# Pairs of (foreground, background); every other one fails the contrast check
+COLOURS = [('#000000', '#ffffff'), ('#777777', '#888888'), ('#1a1a1a', '#f0f0f0'), ('#cccccc', '#ffffff')]
+
+
+class SyntheticResponse:
+    """
+    Stands in for a fetched requests.Response so check_accessibility can run
+    on a generated page without any network access
+    """
+
+    def __init__(self, text, url='http://benchmark.invalid/'):
+        self.text = text
+        self.url = url
+        self.status_code = 200
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _block(rng, index, density):
+    parts = [f'<section id="block-{index}">']
+    for n in range(density['headings']):
+        # Skip a level now and then so Tarsier has something to report
+        level = 2 + (n % 2) * (1 + index % 2)
+        parts.append(f'<h{level}>{_sentence(rng, 4)}</h{level}>')
+    for n in range(density['images']):
+        if n % 3 == 0:
+            parts.append(f'<img src="/img/{index}-{n}.png">')
+        else:
+            parts.append(f'<img src="/img/{index}-{n}.png" alt="{_sentence(rng, 3)}">')
+    for n in range(density['tables']):
+        header = '<thead><tr><th>Name</th><th>Value</th></tr></thead>' if n % 2 == 0 else ''
+        rows = ''.join(f'<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(0, 999)}</td></tr>' for _ in range(5))
+        parts.append(f'<table>{header}<tbody>{rows}</tbody></table>')
+    for n in range(density['inline_styles']):
+        foreground, background = COLOURS[(index + n) % len(COLOURS)]
+        parts.append(f'<p style="color: {foreground}; background-color: {background}">{_sentence(rng)}</p>')
+    parts.append('</section>')
+    return ''.join(parts)
+
+
+def generate_page(size, density=None, seed=0):
+    """
+    Builds a deterministic synthetic HTML page of about the requested size.
+
+    The page is made of ~10 KB blocks, each holding the counts of images,
+    headings, tables and inline-styled paragraphs in `density` and padded
+    with filler paragraphs, so larger pages have proportionally more elements.
+
+    Args:
+        size (int): The target page size in bytes
+        density (dict, optional): Elements per block; defaults to DEFAULT_DENSITY
+        seed (int): Seed for the filler text, so the same arguments give the same page
+
+    Returns:
+        str: The HTML page
+    """
+    density = dict(DEFAULT_DENSITY, **(density or {}))
+    rng = random.Random(seed)
+    head = (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Benchmark page</title>'
+        '<style>body { font-family: Georgia, serif; } .note { color: #999999; background: #ffffff; }</style>'
+        '</head><body><main>'
+    )
+    tail = '</main></body></html>'
+
+    parts = [head]
+    length = len(head) + len(tail)
+    index = 0
+    while length < size:
+        block = _block(rng, index, density)
+        # Pad full blocks with filler text up to BLOCK_SIZE
+        while len(block) < BLOCK_SIZE and length + len(block) < size:
+            block += f'<p class="note">{_sentence(rng, 20)}</p>'
+        parts.append(block)
+        length += len(block)
+        index += 1
+    parts.append(tail)
+    return ''.join(parts)
+
+
+def _timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'runs': timings}
+
+
+def _peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_page(html_content, repeat=3, executor=None):
+    """
+    Times each validator on its own and check_accessibility as a whole on one page
+
+    Args:
+        html_content (str): The HTML page
+        repeat (int): How many times each measurement is taken
+        executor (str, optional): The check_accessibility executor backend
+
+    Returns:
+        dict: Seconds (min, median and every run) and peak traced bytes per
+            validator and for the whole scan
+    """
+    result = {'bytes': len(html_content.encode('utf-8')), 'validators': {}}
+    for Validator in VALIDATORS:
+        def validate():
+            return run_validator(Validator, html_content)
+        timing = _timed(validate, repeat)
+        timing['peak_memory'] = _peak_memory(validate)
+        result['validators'][Validator.__name__] = timing
+
+    def scan():
+        return check_accessibility(SyntheticResponse(html_content), executor=executor)
+    result['total'] = _timed(scan, repeat)
+    result['total']['peak_memory'] = _peak_memory(scan)
+    return result
+
+
+def measure_startup(module, repeat=3):
+    """
+    Times importing a module in fresh interpreters, after django.setup(), as
+    a newly started web or worker process would
+
+    Args:
+        module (str): The module to import
+        repeat (int): How many interpreters to start
+
+    Returns:
+        dict: Seconds (min, median and every run) for the import and the median
+            for django.setup(), plus the HEAVY_MODULES the import loaded
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, module, *HEAVY_MODULES],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(completed.stdout))
+    imports = [run['import'] for run in runs]
+    return {
+        'module': module,
+        'min': min(imports),
+        'median': statistics.median(imports),
+        'runs': imports,
+        'setup_median': statistics.median(run['setup'] for run in runs),
+        'heavy_modules': runs[-1]['heavy_modules'],
+    }
+
+
+def run_benchmark(sizes=None, repeat=3, density=None, seed=0, executor=None, progress=None, startup=False):
+    """
+    Runs the benchmark over synthetic pages of each size
+
+    Args:
+        sizes (list, optional): Page sizes in bytes; defaults to DEFAULT_SIZES
+        repeat (int): How many times each measurement is taken
+        density (dict, optional): Elements per ~10 KB block, see generate_page
+        seed (int): Seed for the synthetic pages
+        executor (str, optional): The check_accessibility executor backend
+        progress (callable, optional): Called with each size before it runs
+        startup (bool): Also time the cold start of the web and worker processes,
+            see measure_startup
+
+    Returns:
+        dict: The environment and a result per page size, ready to write as JSON
+    """
+    sizes = sizes or DEFAULT_SIZES
+    density = dict(DEFAULT_DENSITY, **(density or {}))
+    report = {
+        'format': BENCHMARK_FORMAT,
+        'created_at': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'versions': validator_versions(VALIDATORS),
+        'executor': executor,
+        'repeat': repeat,
+        'seed': seed,
+        'density': density,
+        'pages': {},
+    }
+    for size in sizes:
+        if progress is not None:
+            progress(size)
+        html_content = generate_page(size, density=density, seed=seed)
+        report['pages'][str(size)] = benchmark_page(html_content, repeat=repeat, executor=executor)
+    if startup:
+        report['startup'] = {name: measure_startup(module, repeat) for name, module in STARTUP_MODULES.items()}
+    return report
+
+
+def compare_reports(baseline, current, threshold=0.2):
+    """
+    Compares two benchmark reports on their median timings and peak memory,
+    and on their median startup times when both have them
+
+    Args:
+        baseline (dict): The earlier report
+        current (dict): The new report
+        threshold (float): The relative slowdown or growth that counts as a regression
+
+    Returns:
+        list: A dict per measurement found in both reports with the page size
+            (None for startup), name ('total', the validator or the process), metric,
+            both values, the ratio and whether it regressed
+    """
+    comparisons = []
+    for size, page in current['pages'].items():
+        old_page = baseline['pages'].get(size)
+        if old_page is None:
+            continue
+        measurements = [('total', page['total'], old_page['total'])]
+        measurements.extend(
+            (name, timing, old_page['validators'][name])
+            for name, timing in page['validators'].items()
+            if name in old_page['validators']
+        )
+        for name, new, old in measurements:
+            for metric in ('median', 'peak_memory'):
+                ratio = new[metric] / old[metric] if old[metric] else 1.0
+                comparisons.append({
+                    'size': size,
+                    'name': name,
+                    'metric': metric,
+                    'baseline': old[metric],
+                    'current': new[metric],
+                    'ratio': ratio,
+                    'regressed': ratio > 1 + threshold,
+                })
+    for name, new in current.get('startup', {}).items():
+        old = baseline.get('startup', {}).get(name)
+        if old is None:
+            continue
+        ratio = new['median'] / old['median'] if old['median'] else 1.0
+        comparisons.append({
+            'size': None,
+            'name': f'{name} startup',
+            'metric': 'median',
+            'baseline': old['median'],
+            'current': new['median'],
+            'ratio': ratio,
+            'regressed': ratio > 1 + threshold,
+        })
+    return comparisons
+
+
+def write_report(report, path):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def read_report(path):
+    with open(path) as file:
+        return json.load(file)
@@ -0,0 +1,232 @@
+import asyncio
+import gzip
+import time
+from urllib import robotparser
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import lxml.html
+import requests
+from django.conf import settings
+from lxml import etree
+
+from .fetcher import fetch
+from .renderers import render_page
+
+SITEMAP_NAMESPACE = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def parse_sitemap(content):
+    """
+    Reads the <loc> entries out of a sitemap or sitemap index
+
+    Args:
+        content (bytes): The sitemap XML, optionally gzipped
+
+    Returns:
+        tuple: (page urls, nested sitemap urls)
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+
+    parser = etree.XMLParser(resolve_entities=False, no_network=True)
+    root = etree.fromstring(content, parser)
+    locs = [loc.text.strip() for loc in root.iter(f'{SITEMAP_NAMESPACE}loc') if loc.text]
+
+    if root.tag == f'{SITEMAP_NAMESPACE}sitemapindex':
+        return [], locs
+    return locs, []
+
+
+def extract_links(html_content, base_url):
+    """
+    Finds the http(s) pages a document links to
+
+    Args:
+        html_content (str): The HTML content of the webpage
+        base_url (str): The URL the page was fetched from
+
+    Returns:
+        list: Absolute link URLs without fragments
+    """
+    if not html_content.strip():
+        return []
+
+    links = []
+    document = lxml.html.fromstring(html_content)
+    for element, attribute, link, pos in document.iterlinks():
+        if element.tag != 'a' or attribute != 'href':
+            continue
+        url = urldefrag(urljoin(base_url, link.strip()))[0]
+        if urlsplit(url).scheme in ('http', 'https'):
+            links.append(url)
+    return links
+
+
+class Crawler:
+    """
+    Crawls a site from seed URLs or sitemaps and scans every page it finds.
+
+    Pages are fetched by a fixed number of asyncio workers, so at most
+    `concurrency` requests are in flight at once. Requests to the same host
+    are spaced at least `host_delay` seconds apart (or the robots.txt
+    Crawl-delay if that is longer) and robots.txt rules are honoured.
+    The blocking fetch and scan run in threads so the event loop keeps going,
+    sharing the fetcher's pooled session.
+
+    Pages go through renderers.render_page, so settings.SCAN_RENDERER applies
+    to crawls as it does to single pages. Sitemaps and robots.txt aren't
+    pages and are always fetched over HTTP. A snapshot or headless render has
+    no Content-Type of its own, so those renderers scan whatever they return.
+    """
+
+    def __init__(self, seeds=(), sitemaps=(), max_depth=1, max_pages=None,
+                 allowed_domains=None, concurrency=None, host_delay=None,
+                 respect_robots=True, on_page=None):
+        self.seeds = list(seeds)
+        self.sitemaps = list(sitemaps)
+        self.max_depth = max_depth
+        self.max_pages = max_pages or settings.CRAWL_MAX_PAGES
+        self.allowed_domains = set(allowed_domains or [])
+        self.allowed_domains.update(urlsplit(url).hostname for url in self.seeds + self.sitemaps)
+        self.concurrency = concurrency or settings.CRAWL_CONCURRENCY
+        self.host_delay = settings.CRAWL_HOST_DELAY if host_delay is None else host_delay
+        self.respect_robots = respect_robots
+        self.on_page = on_page
+        self.user_agent = settings.CRAWL_USER_AGENT
+
+        self.seen = set()
+        self.pages = []
+        self._robots = {}
+        self._robots_locks = {}
+        self._host_locks = {}
+        self._host_next_request = {}
+
+    def run(self):
+        """
+        Runs the crawl to completion
+
+        Returns:
+            list: A dict per visited page with url, depth, status_code and error
+        """
+        return asyncio.run(self.crawl())
+
+    async def crawl(self):
+        queue = asyncio.Queue()
+
+        for sitemap in self.sitemaps:
+            await self._enqueue_sitemap(sitemap, queue)
+        for seed in self.seeds:
+            self._enqueue(seed, 0, queue)
+
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        return self.pages
+
+    def _enqueue(self, url, depth, queue):
+        if url in self.seen or len(self.seen) >= self.max_pages:
+            return
+        if urlsplit(url).hostname not in self.allowed_domains:
+            return
+        self.seen.add(url)
+        queue.put_nowait((url, depth))
+
+    async def _enqueue_sitemap(self, sitemap_url, queue, nested=0):
+        try:
+            response = await self._fetch(sitemap_url)
+            response.raise_for_status()
+            pages, sitemaps = parse_sitemap(response.content)
+        except (requests.exceptions.RequestException, etree.XMLSyntaxError) as err:
+            self.pages.append(self._page(sitemap_url, 0, error=f"Could not read the sitemap. Error: {err}"))
+            return
+
+        for url in pages:
+            self._enqueue(url, 0, queue)
+        # Sitemap indexes can't nest, but guard against loops in broken ones
+        if nested == 0:
+            for url in sitemaps:
+                await self._enqueue_sitemap(url, queue, nested=1)
+
+    async def _worker(self, queue):
+        while True:
+            url, depth = await queue.get()
+            try:
+                self.pages.append(await self._visit(url, depth, queue))
+            except Exception as err:
+                self.pages.append(self._page(url, depth, error=f"Scan failed. Error: {err}"))
+            finally:
+                queue.task_done()
+
+    async def _visit(self, url, depth, queue):
+        if not await self._allowed_by_robots(url):
+            return self._page(url, depth, error="Blocked by robots.txt")
+
+        try:
+            response = await self._render(url)
+        except requests.exceptions.RequestException as err:
+            return self._page(url, depth, error=f"Could not fetch the URL. Error: {err}")
+
+        if response.status_code != 200:
+            return self._page(url, depth, response.status_code, f"Error with request: {response.status_code}")
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return self._page(url, depth, response.status_code, "Not an HTML page")
+
+        if self.on_page is not None:
+            await asyncio.to_thread(self.on_page, response)
+
+        if depth < self.max_depth:
+            for link in extract_links(response.text, response.url):
+                self._enqueue(link, depth + 1, queue)
+
+        return self._page(url, depth, response.status_code)
+
+    def _page(self, url, depth, status_code=None, error=''):
+        return {'url': url, 'depth': depth, 'status_code': status_code, 'error': error}
+
+    async def _fetch(self, url):
+        await self._wait_for_host(urlsplit(url).netloc)
+        return await asyncio.to_thread(fetch, url)
+
+    async def _render(self, url):
+        await self._wait_for_host(urlsplit(url).netloc)
+        return await asyncio.to_thread(render_page, url)
+
+    async def _wait_for_host(self, host):
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._host_next_request.get(host, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            delay = self.host_delay
+            robots = self._robots.get(host)
+            if robots is not None and robots.crawl_delay(self.user_agent):
+                delay = max(delay, float(robots.crawl_delay(self.user_agent)))
+            self._host_next_request[host] = time.monotonic() + delay
+
+    async def _allowed_by_robots(self, url):
+        if not self.respect_robots:
+            return True
+
+        parts = urlsplit(url)
+        # Only the first worker to reach a host fetches its robots.txt
+        async with self._robots_locks.setdefault(parts.netloc, asyncio.Lock()):
+            if parts.netloc not in self._robots:
+                robots = robotparser.RobotFileParser()
+                try:
+                    response = await self._fetch(f'{parts.scheme}://{parts.netloc}/robots.txt')
+                    if response.status_code == 200:
+                        robots.parse(response.text.splitlines())
+                    elif response.status_code in (401, 403):
+                        # The site refuses robots.txt itself, so crawling isn't allowed either
+                        robots.disallow_all = True
+                    else:
+                        # No robots.txt, so everything is allowed
+                        robots.allow_all = True
+                except requests.exceptions.RequestException:
+                    robots.allow_all = True
+                self._robots[parts.netloc] = robots
+
+        return self._robots[parts.netloc].can_fetch(self.user_agent, url)
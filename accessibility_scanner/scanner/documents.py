@@ -0,0 +1,200 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
+
+import requests
+from django.conf import settings
+
+from .fonts import load_cached_stylesheet, parse_stylesheet
+from .stylesheets import stylesheet_cache
+
+RAW_HTML_URL = 'about:blank'
+HTML_EXTENSIONS = ('.html', '.htm')
+
+
+class HtmlDocument:
+    """
+    HTML to scan that wasn't fetched over HTTP. It has the attributes of a
+    requests.Response that check_accessibility and the result sinks read.
+
+    A document read from a SiteDirectory keeps it as `site`, so the stylesheets
+    it links to are read from the same directory. A renderer sets the status
+    code the page was served with.
+    """
+    status_code = 200
+
+    def __init__(self, text, url=RAW_HTML_URL, site=None):
+        self.text = text
+        self.url = url
+        self.site = site
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+def decode_html(data):
+    """
+    Decodes the bytes of an HTML file, as UTF-8 unless that fails
+
+    Args:
+        data (bytes): The file contents
+
+    Returns:
+        str: The HTML
+    """
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+@lru_cache(maxsize=256)
+def _read_stylesheet(path, modified):
+    with open(path, 'rb') as file:
+        text = decode_html(file.read())
+    return text, parse_stylesheet(text)
+
+
+class SiteDirectory:
+    """
+    A built static site on disk, published under `base_url`.
+
+    Each page is scanned under the URL it will have once deployed, so
+    relative and root-relative stylesheet links resolve to files in the
+    directory and are read from disk rather than downloaded. Stylesheets
+    from other hosts go through the shared stylesheet cache as for a
+    fetched page. Without a base_url, pages get file:// URLs.
+    """
+
+    def __init__(self, root, base_url=None):
+        self.root = os.path.realpath(root)
+        base_url = base_url or Path(self.root).as_uri()
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+
+    def pages(self):
+        """
+        Lists the HTML files under the directory, in a stable order
+
+        Returns:
+            list: The absolute paths
+        """
+        paths = []
+        for directory, subdirectories, files in os.walk(self.root):
+            subdirectories.sort()
+            paths.extend(
+                os.path.join(directory, name) for name in sorted(files)
+                if name.lower().endswith(HTML_EXTENSIONS)
+            )
+        return paths
+
+    def url_for(self, path):
+        relative = os.path.relpath(os.path.realpath(path), self.root).replace(os.sep, '/')
+        return self.base_url + quote(relative)
+
+    def path_for(self, url):
+        """
+        Maps a URL under base_url to the file it was built from
+
+        Args:
+            url (str): An absolute URL
+
+        Returns:
+            str: The path of the file, or None when the URL isn't a file in the directory
+        """
+        if not url.startswith(self.base_url):
+            return None
+        relative = unquote(urlsplit(url[len(self.base_url):]).path)
+        path = os.path.realpath(os.path.join(self.root, relative))
+        # Links can't climb out of the site with ../ or symlinks
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def read(self, path):
+        """
+        Reads a page of the site
+
+        Args:
+            path (str): The path of an HTML file in the directory
+
+        Returns:
+            HtmlDocument: The page, under its URL on the site
+        """
+        with open(path, 'rb') as file:
+            text = decode_html(file.read())
+        return HtmlDocument(text, self.url_for(path), site=self)
+
+    def load_text(self, url):
+        """
+        Returns the text of a linked stylesheet, from disk when it is part of the site
+        """
+        path = self.path_for(url)
+        if path is None:
+            return stylesheet_cache.get_text(url)
+        return _read_stylesheet(path, os.path.getmtime(path))[0]
+
+    def load_rules(self, url):
+        """
+        Returns the parsed rules of a linked stylesheet, like fonts.load_cached_stylesheet
+        """
+        path = self.path_for(url)
+        if path is None:
+            return load_cached_stylesheet(url)
+        return _read_stylesheet(path, os.path.getmtime(path))[1]
+
+
+def extract_archive(archive, directory):
+    """
+    Unpacks a zip of a built site, refusing archives that expand past
+    settings.LOCAL_SCAN_MAX_ARCHIVE_BYTES
+
+    Args:
+        archive (str or file): The zip file
+        directory (str): Where to unpack it
+    """
+    with zipfile.ZipFile(archive) as zip_file:
+        members = zip_file.infolist()
+        size = sum(member.file_size for member in members)
+        if size > settings.LOCAL_SCAN_MAX_ARCHIVE_BYTES:
+            raise ValueError(
+                f"The archive expands to {size} bytes, over the limit of {settings.LOCAL_SCAN_MAX_ARCHIVE_BYTES}"
+            )
+        # extractall drops absolute paths and .. from member names
+        zip_file.extractall(directory)
+
+
+@contextmanager
+def open_site(path, base_url=None):
+    """
+    Opens a directory, a zip archive or a single HTML file for scanning
+
+    Args:
+        path (str or file): The directory, archive or page
+        base_url (str, optional): The URL the site is published under
+
+    Yields:
+        tuple: (SiteDirectory, the paths of the pages to scan)
+    """
+    if not isinstance(path, str) or zipfile.is_zipfile(path):
+        directory = tempfile.mkdtemp(prefix='site-')
+        try:
+            extract_archive(path, directory)
+            site = SiteDirectory(directory, base_url)
+            yield site, site.pages()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    elif os.path.isdir(path):
+        site = SiteDirectory(path, base_url)
+        yield site, site.pages()
+    elif os.path.isfile(path):
+        site = SiteDirectory(os.path.dirname(os.path.abspath(path)), base_url)
+        yield site, [os.path.realpath(path)]
+    else:
+        raise ValueError(f"{path} is not a directory, zip archive or HTML file")
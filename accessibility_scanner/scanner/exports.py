@@ -0,0 +1,270 @@
+import csv
+import json
+import zlib
+
+from django.conf import settings
+
+from .incremental import current_finding_ids
+from .models import AccessibilityResult, Finding
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+EXPORT_FIELDS = [
+    'scan_id', 'datetime', 'url', 'section_type', 'guideline', 'technique',
+    'message', 'error_code', 'xpath', 'classes', 'id', 'change',
+]
+
+# Finding columns in EXPORT_FIELDS order, fetched as tuples to avoid building model instances
+FINDING_COLUMNS = [
+    'scan_id', 'scan__timestamp', 'scan__url', 'section_type', 'guideline', 'technique',
+    'message', 'error_code', 'xpath', 'classes', 'element_id', 'change',
+]
+
+
+class ExportUnavailable(Exception):
+    """
+    Raised when an export format needs an optional package that isn't installed
+    """
+
+
+def export_findings(user=None, scan_id=None, start=None, end=None, url_prefix=None):
+    """
+    Selects the findings to export, in scan order.
+
+    A single incremental scan exports its current findings, rebuilt from the
+    scans it builds on. Exports spanning several scans are the stored rows, so
+    there an incremental scan contributes only the findings it added or
+    resolved, marked in the change column.
+
+    Args:
+        user (User, optional): Whose scans to export; None for the anonymous ones
+        scan_id (int, optional): Only this scan
+        start (datetime, optional): Only scans at or after this time
+        end (datetime, optional): Only scans before this time
+        url_prefix (str, optional): Only scans of URLs starting with this
+
+    Returns:
+        iterable: Finding value tuples in FINDING_COLUMNS order
+    """
+    findings = Finding.objects.filter(scan__user=user)
+    if scan_id is not None:
+        scan = AccessibilityResult.objects.filter(pk=scan_id, user=user).first()
+        if scan is not None and scan.base_scan_id is not None and scan_matches(scan, start, end, url_prefix):
+            return current_scan_rows(scan)
+        findings = findings.filter(scan_id=scan_id)
+    if start is not None:
+        findings = findings.filter(scan__timestamp__gte=start)
+    if end is not None:
+        findings = findings.filter(scan__timestamp__lt=end)
+    if url_prefix:
+        findings = findings.filter(scan__url__startswith=url_prefix)
+    return findings.order_by('scan_id', 'id').values_list(*FINDING_COLUMNS)
+
+
+def scan_matches(scan, start, end, url_prefix):
+    return ((start is None or scan.timestamp >= start) and (end is None or scan.timestamp < end)
+            and (not url_prefix or scan.url.startswith(url_prefix)))
+
+
+def current_scan_rows(scan):
+    """
+    Yields the current findings of an incremental scan as export tuples, a chunk
+    of ids at a time, credited to the scan itself with an empty change column
+
+    Args:
+        scan (AccessibilityResult): A scan with a base_scan
+
+    Yields:
+        tuple: Finding values in FINDING_COLUMNS order
+    """
+    ids = current_finding_ids(scan)
+    columns = FINDING_COLUMNS[3:-1]
+    for offset in range(0, len(ids), settings.EXPORT_CHUNK_SIZE):
+        batch = Finding.objects.filter(id__in=ids[offset:offset + settings.EXPORT_CHUNK_SIZE])
+        for values in batch.order_by('id').values_list(*columns):
+            yield (scan.pk, scan.timestamp, scan.url, *values, '')
+
+
+def iter_rows(findings):
+    """
+    Streams export rows from the database without loading the whole queryset
+
+    Args:
+        findings (iterable): Value tuples from export_findings
+
+    Yields:
+        list: One row of values in EXPORT_FIELDS order
+    """
+    if hasattr(findings, 'iterator'):
+        findings = findings.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for values in findings:
+        row = list(values)
+        row[1] = row[1].isoformat()
+        yield row
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_chunks(rows):
+    """
+    Yields one JSON object per line, written a batch of rows at a time
+    """
+    for batch in batched(rows, settings.EXPORT_CHUNK_SIZE):
+        lines = [json.dumps(dict(zip(EXPORT_FIELDS, row))) for row in batch]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class Echo:
+    """
+    A file-like object that hands back what is written, so csv.writer can
+    produce chunks for a streaming response
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    """
+    Yields a CSV header and then the rows, a batch at a time
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS).encode('utf-8')
+    for batch in batched(rows, settings.EXPORT_CHUNK_SIZE):
+        yield ''.join(writer.writerow(row) for row in batch).encode('utf-8')
+
+
+class ParquetSink:
+    """
+    A write-only file for pyarrow that keeps the bytes written since the last drain
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(rows):
+    """
+    Yields a Parquet file written as one row group per batch of rows.
+
+    pyarrow is optional, so the import happens here and ExportUnavailable is
+    raised when it isn't installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable("Parquet export needs the pyarrow package")
+
+    schema = pa.schema([
+        (field, pa.int64() if field == 'scan_id' else pa.string())
+        for field in EXPORT_FIELDS
+    ])
+
+    def generate():
+        sink = ParquetSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+        for batch in batched(rows, settings.EXPORT_CHUNK_SIZE):
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema,
+            ))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def gzip_chunks(chunks):
+    """
+    Gzips a stream of byte chunks without holding the whole body in memory
+    """
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(export_format, findings, compress=False):
+    """
+    Streams findings in the requested format
+
+    Args:
+        export_format (str): One of EXPORT_FORMATS
+        findings (iterable): Value tuples from export_findings
+        compress (bool): Gzip the output
+
+    Returns:
+        iterator: Byte chunks of the export
+    """
+    formats = {'ndjson': ndjson_chunks, 'csv': csv_chunks, 'parquet': parquet_chunks}
+    chunks = formats[export_format](iter_rows(findings))
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def scan_json_chunks(scan):
+    """
+    Streams one scan in the shape check_accessibility returns, a section at a time
+
+    Args:
+        scan (AccessibilityResult): The scan to export
+
+    Yields:
+        bytes: Pieces of the JSON document
+    """
+    datetime_stamp = scan.timestamp.isoformat()
+    if scan.base_scan_id is not None:
+        # An incremental scan has to be rebuilt from its base scan first
+        current = list(scan.current_findings())
+    for index, section in enumerate(AccessibilityResult.SECTIONS):
+        yield ('{' if index == 0 else ', ').encode('utf-8')
+        yield f'{json.dumps(section)}: ['.encode('utf-8')
+        if scan.base_scan_id is not None:
+            findings = (finding for finding in current if finding.section_type == section)
+        else:
+            findings = scan.findings.filter(section_type=section).order_by('id').iterator()
+        rows = (finding.as_row(datetime_stamp, scan.url) for finding in findings)
+        for batch_index, batch in enumerate(batched(rows, settings.EXPORT_CHUNK_SIZE)):
+            prefix = ', ' if batch_index else ''
+            yield (prefix + ', '.join(json.dumps(row) for row in batch)).encode('utf-8')
+        yield b']'
+    serif_font_check = [scan.serif_font_check] if scan.serif_font_check else []
+    yield f', "serif_font_check": {json.dumps(serif_font_check)}}}'.encode('utf-8')
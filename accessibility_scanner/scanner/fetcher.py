@@ -0,0 +1,142 @@
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .models import FetchedPage
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes br responses when it is installed
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """
+    Raised when a page body is bigger than settings.FETCH_MAX_BYTES
+    """
+
+
+def get_session():
+    """
+    Returns the process-wide session, so connections to a site are kept
+    alive and reused between scans
+
+    Returns:
+        requests.Session: The shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.FETCH_POOL_SIZE,
+                pool_maxsize=settings.FETCH_POOL_SIZE,
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'User-Agent': settings.CRAWL_USER_AGENT,
+                'Accept-Encoding': ACCEPT_ENCODING,
+            })
+            _session = session
+        return _session
+
+
+def fetch(url, conditional=False, headers=None):
+    """
+    Fetches a page with timeouts and a cap on the body size.
+
+    With conditional=True the ETag and Last-Modified from the last scan of the
+    url are sent, so an unchanged page comes back as a 304 with no body.
+
+    Args:
+        url (str): The URL to fetch
+        conditional (bool): Send If-None-Match / If-Modified-Since when known
+        headers (dict, optional): Extra request headers
+
+    Returns:
+        requests.Response: The response with its body already read
+    """
+    headers = dict(headers or {})
+    if conditional:
+        page = FetchedPage.objects.filter(url=url, result__isnull=False).first()
+        if page is not None:
+            if page.etag:
+                headers['If-None-Match'] = page.etag
+            if page.last_modified:
+                headers['If-Modified-Since'] = page.last_modified
+
+    response = get_session().get(
+        url,
+        headers=headers,
+        timeout=(settings.FETCH_CONNECT_TIMEOUT, settings.FETCH_READ_TIMEOUT),
+        stream=True,
+    )
+    try:
+        response._content = read_body(response)
+    finally:
+        response.close()
+    return response
+
+
+def read_body(response):
+    """
+    Reads a streamed response body, stopping once it passes settings.FETCH_MAX_BYTES
+
+    Args:
+        response (requests.Response): A response opened with stream=True
+
+    Returns:
+        bytes: The decompressed body
+    """
+    max_bytes = settings.FETCH_MAX_BYTES
+    if int(response.headers.get('Content-Length') or 0) > max_bytes:
+        raise ResponseTooLarge(f"Page is larger than {max_bytes} bytes", response=response)
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        size += len(chunk)
+        if size > max_bytes:
+            raise ResponseTooLarge(f"Page is larger than {max_bytes} bytes", response=response)
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def previous_result(url):
+    """
+    Returns the result saved for the last full scan of a url, used when it comes back 304
+
+    Args:
+        url (str): The URL that was fetched
+
+    Returns:
+        AccessibilityResult: The earlier result, or None
+    """
+    page = FetchedPage.objects.filter(url=url).select_related('result').first()
+    return page.result if page else None
+
+
+def record_fetch(url, response, result):
+    """
+    Stores the validators for a scanned page so the next fetch can be conditional
+
+    Args:
+        url (str): The URL that was requested
+        response (requests.Response): The 200 response that was scanned
+        result (AccessibilityResult): The saved scan of this response
+    """
+    FetchedPage.objects.update_or_create(
+        url=url,
+        defaults={
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+            'result': result,
+        },
+    )
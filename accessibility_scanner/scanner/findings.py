@@ -0,0 +1,131 @@
+import sys
+from collections.abc import Mapping
+
+# The keys of a check_accessibility row, in the order they are serialized
+ROW_FIELDS = (
+    'datetime', 'url', 'section_type', 'guideline', 'technique',
+    'message', 'error_code', 'xpath', 'classes', 'id',
+)
+
+# The slot holding each row key that isn't shared through the FindingBatch
+ROW_SLOTS = {
+    'section_type': 'section_type', 'guideline': 'guideline', 'technique': 'technique',
+    'message': 'message', 'error_code': 'error_code', 'xpath': 'xpath',
+    'classes': 'classes', 'id': 'element_id',
+}
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class FindingBatch:
+    """
+    The findings of one scan, holding the url and timestamp once for all of them
+    """
+    __slots__ = ('url', 'datetime')
+
+    def __init__(self, url, datetime_stamp):
+        self.url = url
+        self.datetime = datetime_stamp
+
+    def add(self, section, entry):
+        """
+        Builds a CompactFinding from a validator entry
+
+        Args:
+            section (str): success, failures, warnings or skipped
+            entry (dict): The entry reported by the validator
+
+        Returns:
+            CompactFinding: The finding
+        """
+        return CompactFinding(
+            self,
+            section,
+            entry.get('guideline'),
+            entry.get('technique'),
+            entry.get('message'),
+            entry.get('error_code'),
+            entry.get('xpath'),
+            entry.get('classes'),
+            entry.get('id'),
+        )
+
+
+class CompactFinding(Mapping):
+    """
+    A check_accessibility row without a dict of its own.
+
+    Large pages report tens of thousands of success and skipped entries, and a
+    10-key dict per entry repeating the url and timestamp dominated the memory
+    of a scan. This keeps the values in slots, shares the url and timestamp
+    through its FindingBatch and interns the strings that repeat.
+
+    It reads like the row dict it replaces (row['message'], row.get('xpath'),
+    dict(row), template lookups); as_dict() or json_default build the dict
+    when it has to be serialized.
+    """
+    __slots__ = ('batch', 'section_type', 'guideline', 'technique', 'message', 'error_code', 'xpath', 'classes', 'element_id')
+
+    def __init__(self, batch, section_type, guideline, technique, message, error_code, xpath, classes, element_id):
+        self.batch = batch
+        self.section_type = _intern(section_type)
+        self.guideline = _intern(guideline)
+        self.technique = _intern(technique)
+        self.message = message
+        self.error_code = _intern(error_code)
+        self.xpath = xpath
+        self.classes = _intern(classes)
+        self.element_id = element_id
+
+    def __getitem__(self, key):
+        if key == 'datetime':
+            return self.batch.datetime
+        if key == 'url':
+            return self.batch.url
+        try:
+            return getattr(self, ROW_SLOTS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(ROW_FIELDS)
+
+    def __len__(self):
+        return len(ROW_FIELDS)
+
+    def __repr__(self):
+        return f'CompactFinding({self.as_dict()!r})'
+
+    def as_dict(self):
+        """
+        Returns the finding as the row dict check_accessibility used to build
+        """
+        return {
+            'datetime': self.batch.datetime,
+            'url': self.batch.url,
+            'section_type': self.section_type,
+            'guideline': self.guideline,
+            'technique': self.technique,
+            'message': self.message,
+            'error_code': self.error_code,
+            'xpath': self.xpath,
+            'classes': self.classes,
+            'id': self.element_id,
+        }
+
+
+def json_default(value):
+    """
+    The json.dump default hook that writes CompactFindings as row dicts
+
+    Args:
+        value: An object json can't serialize by itself
+
+    Returns:
+        dict: The row
+    """
+    if isinstance(value, CompactFinding):
+        return value.as_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,438 @@
+import re
+from functools import lru_cache
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+
+import cssselect
+from lxml import etree
+
+GENERIC_FAMILIES = {'serif', 'sans-serif', 'monospace', 'cursive', 'fantasy', 'system-ui', 'ui-serif', 'ui-sans-serif', 'ui-monospace', 'math'}
+
+# Named fonts that are known to be serif or sans-serif, so a family list can be
+# classified before reaching its generic fallback
+KNOWN_SERIF_FONTS = {
+    'times new roman', 'times', 'georgia', 'garamond', 'eb garamond', 'palatino', 'palatino linotype',
+    'book antiqua', 'baskerville', 'libre baskerville', 'cambria', 'didot', 'bodoni mt', 'big caslon',
+    'merriweather', 'playfair display', 'lora', 'pt serif', 'noto serif', 'source serif pro',
+    'crimson text', 'droid serif', 'century schoolbook', 'constantia', 'charter', 'bitstream charter',
+}
+KNOWN_SANS_SERIF_FONTS = {
+    'arial', 'helvetica', 'helvetica neue', 'verdana', 'tahoma', 'trebuchet ms', 'segoe ui', 'roboto',
+    'open sans', 'lato', 'noto sans', 'source sans pro', 'calibri', 'gill sans', 'futura', 'inter',
+    'montserrat', 'ubuntu', 'fira sans', 'dejavu sans', 'liberation sans', '-apple-system',
+    'blinkmacsystemfont',
+}
+
+SERIF_GUIDELINE = '1.4.8'
+SERIF_TECHNIQUE = 'C22'
+
+# Elements whose text is never rendered
+UNRENDERED_TAGS = {'head', 'title', 'style', 'script', 'noscript', 'template', 'meta', 'link'}
+
+# At-rules whose blocks hold more style rules; the others (font-face, keyframes, page) are skipped
+GROUPING_AT_RULES = {'media', 'supports', 'document', 'layer', 'container'}
+
+# Every pattern here matches in one pass without backtracking, so tokenizing is
+# linear in the size of the CSS
+COMMENT_END = '*/'
+STRUCTURE_RE = re.compile(r'[{};"\']|/\*')
+BLOCK_END_RE = re.compile(r'[}"\']|/\*')
+DECLARATION_RE = re.compile(r'([-\w]+)\s*:\s*((?:"[^"]*"|\'[^\']*\'|\([^)]*\)|[^;"\'(])*)')
+IMPORT_RE = re.compile(r'@import\s+(?:url\(\s*)?["\']?([^"\')\s]+)', re.IGNORECASE)
+FONT_SIZE_RE = re.compile(r'(?:^|\s)(?:[\d.]+(?:px|pt|em|rem|%|ex|ch|vw|vh|cm|mm|in|pc)?|xx-small|x-small|small|medium|large|x-large|xx-large|larger|smaller)(?:/\S+)?\s+', re.IGNORECASE)
+
+_translator = cssselect.HTMLTranslator()
+
+
+def _skip_string(css, start):
+    quote = css[start]
+    position = start + 1
+    while True:
+        end = css.find(quote, position)
+        if end == -1:
+            return len(css)
+        # A quote preceded by an odd number of backslashes is escaped
+        backslashes = 0
+        while css[end - 1 - backslashes] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end + 1
+        position = end + 1
+
+
+def _skip_comment(css, start):
+    end = css.find(COMMENT_END, start + 2)
+    return len(css) if end == -1 else end + 2
+
+
+def _strip_comments(text):
+    if '/*' not in text:
+        return text
+    parts = []
+    position = 0
+    while True:
+        start = text.find('/*', position)
+        if start == -1:
+            parts.append(text[position:])
+            return ''.join(parts)
+        parts.append(text[position:start])
+        position = _skip_comment(text, start)
+
+
+def _block_end(css, start):
+    position = start
+    while True:
+        match = BLOCK_END_RE.search(css, position)
+        if match is None:
+            return len(css)
+        token = match.group()
+        if token == '}':
+            return match.start()
+        if token == '/*':
+            position = _skip_comment(css, match.start())
+        else:
+            position = _skip_string(css, match.start())
+
+
+def parse_stylesheet(css):
+    """
+    Splits a stylesheet into its style rules and @import URLs.
+
+    Rules inside @media, @supports and similar blocks are kept; @font-face,
+    @keyframes and other at-rules are skipped. Media conditions aren't
+    evaluated, so a rule for any screen counts.
+
+    Args:
+        css (str): The stylesheet text
+
+    Returns:
+        tuple: (list of (selector text, declarations text), list of imported URLs)
+    """
+    rules = []
+    imports = []
+    stack = []
+    position = start = 0
+    while True:
+        match = STRUCTURE_RE.search(css, position)
+        if match is None:
+            break
+        token = match.group()
+        index = match.start()
+        if token == '/*':
+            position = _skip_comment(css, index)
+            continue
+        if token in ('"', "'"):
+            position = _skip_string(css, index)
+            continue
+
+        prelude = _strip_comments(css[start:index]).strip()
+        if token == '{':
+            if stack and stack[-1] == 'skip':
+                stack.append('skip')
+            elif prelude.startswith('@'):
+                keyword = prelude[1:].split(None, 1)[0].split('(')[0].lower() if len(prelude) > 1 else ''
+                stack.append('group' if keyword in GROUPING_AT_RULES else 'skip')
+            else:
+                end = _block_end(css, index + 1)
+                if prelude:
+                    rules.append((prelude, _strip_comments(css[index + 1:end])))
+                position = start = end + 1
+                continue
+        elif token == '}':
+            if stack:
+                stack.pop()
+        elif token == ';' and not stack:
+            imported = IMPORT_RE.match(prelude)
+            if imported:
+                imports.append(imported.group(1))
+        position = start = index + 1
+    return rules, imports
+
+
+def parse_declarations(text):
+    """
+    Reads the declarations of a rule or style attribute
+
+    Args:
+        text (str): Declarations such as 'color: red; font-family: Georgia, serif'
+
+    Returns:
+        list: (property, value, important) tuples in source order
+    """
+    declarations = []
+    for match in DECLARATION_RE.finditer(text):
+        value = match.group(2).strip()
+        important = value.lower().endswith('!important')
+        if important:
+            value = value[:-len('!important')].strip()
+        declarations.append((match.group(1).lower(), value, important))
+    return declarations
+
+
+def font_family_of(declarations):
+    """
+    Finds the font family a list of declarations sets, from font-family or the font shorthand
+
+    Args:
+        declarations (list): Tuples from parse_declarations
+
+    Returns:
+        tuple: (family value, important), or None when the font isn't set
+    """
+    family = None
+    for name, value, important in declarations:
+        if name == 'font-family':
+            family = (value, important)
+        elif name == 'font':
+            # The family comes last, after the size and optional line height
+            match = FONT_SIZE_RE.search(value)
+            if match is not None:
+                family = (value[match.end():].strip(), important)
+            elif value.lower() in ('inherit', 'initial', 'unset'):
+                family = (value, important)
+    return family
+
+
+def split_families(value):
+    """
+    Splits a font-family value into lower case family names
+
+    Args:
+        value (str): A font-family value such as '"Times New Roman", serif'
+
+    Returns:
+        list: The family names without quotes
+    """
+    return [family.strip().strip('"\'').strip().lower() for family in value.split(',') if family.strip()]
+
+
+def classify_family(value):
+    """
+    Decides whether a font-family list renders as a serif font.
+
+    The first family that is generic or known to be serif or sans-serif
+    decides; unknown named fonts fall through to the next in the list.
+
+    Args:
+        value (str): A font-family value
+
+    Returns:
+        str: 'serif', 'sans-serif', another generic family, or None if unknown
+    """
+    for family in split_families(value):
+        if family in GENERIC_FAMILIES:
+            return 'serif' if family == 'ui-serif' else family
+        if family in KNOWN_SERIF_FONTS:
+            return 'serif'
+        if family in KNOWN_SANS_SERIF_FONTS:
+            return 'sans-serif'
+    return None
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(selector_text):
+    """
+    Turns a selector list into (xpath, specificity) pairs, dropping the
+    selectors that can't match a static document, like :hover
+
+    Args:
+        selector_text (str): A selector list such as 'h1, .intro p'
+
+    Returns:
+        tuple: (XPath expression, specificity tuple) pairs
+    """
+    try:
+        selectors = cssselect.parse(selector_text)
+    except cssselect.SelectorError:
+        return ()
+
+    compiled = []
+    for selector in selectors:
+        if selector.pseudo_element:
+            continue
+        try:
+            compiled.append((_translator.selector_to_xpath(selector), selector.specificity()))
+        except cssselect.SelectorError:
+            continue
+    return tuple(compiled)
+
+
+def load_cached_stylesheet(url):
+    """
+    Returns the parsed rules of a linked stylesheet from the shared stylesheet cache
+
+    Args:
+        url (str): The absolute stylesheet URL
+
+    Returns:
+        tuple: (rules, imports) from parse_stylesheet
+    """
+    # Imported here so the parsing above works without Django settings, as serif_checker.py does
+    from .stylesheets import stylesheet_cache
+
+    return stylesheet_cache.get_rules(url)
+
+
+class FontAnalysis:
+    """
+    The fonts a page uses: the serif declarations in its CSS and the text
+    elements that render in a serif font
+    """
+
+    def __init__(self):
+        self.serif_declarations = []
+        self.elements = []
+        self.unloaded_stylesheets = []
+
+    @property
+    def summary(self):
+        if self.serif_declarations or self.elements:
+            return "Serif font found in url."
+        return "No serif fonts found in url."
+
+    def as_validator_result(self):
+        """
+        Returns the findings in the shape the wcag_zoo validators return them
+
+        Returns:
+            dict: success, failures, warnings and skipped sections of guideline -> technique -> entries
+        """
+        result = {'success': {}, 'failures': {}, 'warnings': {}, 'skipped': {}}
+        if self.elements:
+            result['warnings'] = {SERIF_GUIDELINE: {SERIF_TECHNIQUE: self.elements}}
+        if self.unloaded_stylesheets:
+            result['skipped'] = {SERIF_GUIDELINE: {SERIF_TECHNIQUE: self.unloaded_stylesheets}}
+        return result
+
+
+def _collect_rules(root, base_url, load_stylesheet, analysis):
+    sheets = []
+    for element in root.iter('style', 'link'):
+        if element.tag == 'style':
+            sheets.append(('<style>', parse_stylesheet(element.text or ''), base_url))
+            continue
+        if 'stylesheet' not in (element.get('rel') or '').lower().split() or not element.get('href'):
+            continue
+        sheets.extend(_load_sheets(element.get('href'), base_url, load_stylesheet, analysis))
+
+    rules = []
+    for source, (sheet_rules, imports), sheet_url in sheets:
+        # Imported sheets come before the rules of the sheet importing them
+        for href in imports:
+            for imported in _load_sheets(href, sheet_url, load_stylesheet, analysis):
+                rules.extend((imported[0], rule) for rule in imported[1][0])
+        rules.extend((source, rule) for rule in sheet_rules)
+    return rules
+
+
+def _load_sheets(href, base_url, load_stylesheet, analysis):
+    url = urljoin(base_url or '', href)
+    if load_stylesheet is None or urlsplit(url).scheme not in ('http', 'https', 'file'):
+        return []
+    try:
+        return [(url, load_stylesheet(url), url)]
+    except Exception as err:
+        analysis.unloaded_stylesheets.append({
+            'guideline': SERIF_GUIDELINE,
+            'technique': SERIF_TECHNIQUE,
+            'message': f"Could not load stylesheet {url} - {err}",
+            'error_code': 'fonts-stylesheet',
+            'xpath': None,
+            'classes': None,
+            'id': None,
+        })
+        return []
+
+
+def _has_own_text(element):
+    # Text after a child (its tail) is rendered in this element's font, not the child's
+    return bool((element.text or '').strip()) or any((child.tail or '').strip() for child in element)
+
+
+def analyse_fonts(html_content, base_url=None, root=None, load_stylesheet=None):
+    """
+    Resolves the font family of every element and reports the text set in a serif font.
+
+    Style rules from <style> blocks and linked stylesheets are matched to
+    elements with lxml, cascaded by !important, origin, specificity and order,
+    and inherited down the tree in one walk, so the cost grows linearly with
+    the document for a given stylesheet.
+
+    Args:
+        html_content (str): The HTML content of the webpage
+        base_url (str, optional): The page URL, to resolve relative stylesheet links
+        root (lxml.etree._Element, optional): An already parsed copy of the page; it is not modified
+        load_stylesheet (callable, optional): Returns the parsed rules for a stylesheet URL;
+            linked stylesheets are ignored when not given
+
+    Returns:
+        FontAnalysis: The serif declarations and per-element findings
+    """
+    analysis = FontAnalysis()
+    if root is None:
+        if not html_content.strip():
+            return analysis
+        root = etree.parse(BytesIO(html_content.encode('utf-8')), etree.HTMLParser()).getroot()
+        if root is None:
+            return analysis
+
+    # Cascade: element -> (priority, family) for the winning declaration
+    declared = {}
+    for order, (source, (selector_text, body)) in enumerate(_collect_rules(root, base_url, load_stylesheet, analysis)):
+        family = font_family_of(parse_declarations(body))
+        if family is None:
+            continue
+        value, important = family
+        if classify_family(value) == 'serif':
+            analysis.serif_declarations.append((source, selector_text, value))
+        for xpath, specificity in compile_selector(selector_text):
+            priority = (important, False, specificity, order)
+            for element in root.xpath(xpath):
+                if element not in declared or declared[element][0] < priority:
+                    declared[element] = (priority, value)
+
+    for element in root.iter():
+        style = element.get('style') if isinstance(element.tag, str) else None
+        if not style:
+            continue
+        family = font_family_of(parse_declarations(_strip_comments(style)))
+        if family is None:
+            continue
+        value, important = family
+        if classify_family(value) == 'serif':
+            analysis.serif_declarations.append(('style attribute', root.getroottree().getpath(element), value))
+        priority = (important, True, (0, 0, 0), 0)
+        if element not in declared or declared[element][0] < priority:
+            declared[element] = (priority, value)
+
+    # Inherit down the tree in document order, so every parent is resolved first
+    tree = root.getroottree()
+    effective = {}
+    hidden = {}
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        parent = element.getparent()
+        hidden[element] = element.tag in UNRENDERED_TAGS or hidden.get(parent, False)
+        inherited = effective.get(parent)
+        value = declared[element][1] if element in declared else None
+        if value is None or value.lower() in ('inherit', 'unset'):
+            value = inherited
+        elif value.lower() == 'initial':
+            value = None
+        effective[element] = value
+
+        if value is None or hidden[element] or not _has_own_text(element):
+            continue
+        if classify_family(value) == 'serif':
+            xpath = tree.getpath(element)
+            analysis.elements.append({
+                'guideline': SERIF_GUIDELINE,
+                'technique': SERIF_TECHNIQUE,
+                'message': f"Text is set in a serif font ({value}), which is harder to read for some users - {xpath}",
+                'error_code': 'fonts-serif',
+                'xpath': xpath,
+                'classes': element.get('class'),
+                'id': element.get('id'),
+            })
+    return analysis
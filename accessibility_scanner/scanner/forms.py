@@ -1,9 +1,44 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.conf import settings
+from .models import ScanJob, ScanProfile
 
 class UrlForm(forms.Form):
     url = forms.URLField(label='Enter the URLto check', max_length=200)
+    profile = forms.ModelChoiceField(
+        queryset=ScanProfile.objects.order_by('name'),
+        required=False,
+        empty_label='Full scan',
+        to_field_name='name',
+    )
+
+class CrawlForm(forms.Form):
+    url = forms.URLField(label='Enter the site or sitemap URL to crawl', max_length=200)
+    mode = forms.ChoiceField(choices=[
+        (ScanJob.CRAWL, 'Crawl from this page'),
+        (ScanJob.SITEMAP, 'Pages in this sitemap'),
+    ])
+    max_depth = forms.IntegerField(label='Link depth', min_value=0, max_value=10, initial=1)
+    max_pages = forms.IntegerField(min_value=1, max_value=settings.CRAWL_MAX_PAGES, initial=100)
+
+class UploadForm(forms.Form):
+    file = forms.FileField(label='An HTML file or a zip of a built site')
+    base_url = forms.URLField(
+        label='The URL the site is published under', max_length=200, required=False,
+    )
+    profile = forms.ModelChoiceField(
+        queryset=ScanProfile.objects.order_by('name'),
+        required=False,
+        empty_label='Full scan',
+        to_field_name='name',
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if file.size > settings.LOCAL_SCAN_MAX_UPLOAD_BYTES:
+            raise forms.ValidationError(f"Uploads are limited to {settings.LOCAL_SCAN_MAX_UPLOAD_BYTES} bytes")
+        return file
 
 class RegisterForm(UserCreationForm):
     class Meta:
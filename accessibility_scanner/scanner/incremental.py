@@ -0,0 +1,187 @@
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+
+from .models import AccessibilityResult, Finding
+
+
+def previous_scan(url, **filters):
+    """
+    Returns the latest saved scan of a URL
+
+    Args:
+        url (str): The scanned URL
+        **filters: Further AccessibilityResult lookups, such as profile
+
+    Returns:
+        AccessibilityResult: The scan, or None if the URL hasn't been scanned
+    """
+    return AccessibilityResult.objects.filter(url=url, **filters).order_by('-timestamp', '-id').first()
+
+
+def diff_findings(previous, results):
+    """
+    Matches the rows of a new scan against the findings of an earlier one.
+
+    Rows are matched on their section and fingerprint (guideline, technique,
+    error_code and xpath), so a finding whose message wording changed is still
+    the same finding. Repeated rows are matched one for one.
+
+    Args:
+        previous (iterable): Finding rows of the earlier scan
+        results (dict): The results from check_accessibility
+
+    Returns:
+        tuple: (added rows, resolved Findings)
+    """
+    unmatched = defaultdict(list)
+    for finding in previous:
+        unmatched[finding.key].append(finding)
+
+    added = []
+    for section in AccessibilityResult.SECTIONS:
+        for row in results.get(section, []):
+            key = (section, Finding.fingerprint_row(row))
+            if unmatched.get(key):
+                unmatched[key].pop(0)
+            else:
+                added.append(row)
+    resolved = sorted((finding for group in unmatched.values() for finding in group), key=lambda finding: finding.pk)
+    return added, resolved
+
+
+def scan_chain(scan):
+    """
+    Returns the scans an incremental scan is rebuilt from
+
+    Args:
+        scan (AccessibilityResult): The scan
+
+    Returns:
+        tuple: (id, timestamp) pairs from the full scan at the root of the chain to this one
+    """
+    chain = [(scan.pk, scan.timestamp)]
+    base_id = scan.base_scan_id
+    while base_id is not None:
+        base = AccessibilityResult.objects.filter(pk=base_id).values('timestamp', 'base_scan_id').first()
+        chain.append((base_id, base['timestamp']))
+        base_id = base['base_scan_id']
+    return tuple(reversed(chain))
+
+
+@lru_cache(maxsize=64)
+def _replay_ids(chain):
+    findings = {}
+    # Timestamps are part of the key so a reused id can't serve another scan's replay
+    root, *deltas = [pk for pk, timestamp in chain]
+    rows = Finding.objects.filter(scan_id=root).order_by('id').values_list('id', 'section_type', 'fingerprint')
+    for pk, section_type, fingerprint in rows.iterator():
+        findings.setdefault((section_type, fingerprint), []).append(pk)
+    for delta in deltas:
+        rows = Finding.objects.filter(scan_id=delta).order_by('id').values_list(
+            'id', 'section_type', 'fingerprint', 'change',
+        )
+        for pk, section_type, fingerprint, change in rows.iterator():
+            if change == Finding.RESOLVED:
+                if findings.get((section_type, fingerprint)):
+                    findings[(section_type, fingerprint)].pop(0)
+            else:
+                findings.setdefault((section_type, fingerprint), []).append(pk)
+    return sorted(pk for group in findings.values() for pk in group)
+
+
+def current_finding_ids(scan):
+    """
+    Returns the ids of every finding of a scan, replaying an incremental scan's
+    changes over the full scan it builds on like AccessibilityResult.current_findings,
+    but reading ids and keys alone. Replays are kept for the scan's chain, which
+    changes when retention materializes a scan in it, so paging through a scan
+    replays it once and the stored rows are never touched
+
+    Args:
+        scan (AccessibilityResult): The scan
+
+    Returns:
+        list: Finding ids in the order they were found
+    """
+    if scan.base_scan_id is None:
+        return list(scan.findings.order_by('id').values_list('id', flat=True))
+    return _replay_ids(scan_chain(scan))
+
+
+def plan_findings(scan, results):
+    """
+    Decides which rows of a new scan are stored as its findings.
+
+    With settings.INCREMENTAL_SCANS on, a scan of a URL that was scanned before
+    only stores the findings added and resolved since its last scan with the
+    same profile by the same user, and points base_scan at it. Every INCREMENTAL_FULL_EVERY scans a full copy is stored
+    again, so rebuilding a scan never replays more than that many deltas.
+
+    Args:
+        scan (AccessibilityResult): The unsaved scan; base_scan and chain_length are set on it
+        results (dict): The results from check_accessibility
+
+    Returns:
+        iterable: (row, change) pairs for Finding.from_row
+    """
+    # Each user's scans of a URL form a chain of their own
+    base = previous_scan(scan.url, profile=scan.profile, user=scan.user) if settings.INCREMENTAL_SCANS else None
+    if base is None or base.chain_length + 1 >= settings.INCREMENTAL_FULL_EVERY:
+        return (
+            (row, '')
+            for section in AccessibilityResult.SECTIONS
+            for row in results.get(section, [])
+        )
+
+    scan.base_scan = base
+    scan.chain_length = base.chain_length + 1
+    added, resolved = diff_findings(base.current_findings(), results)
+    datetime_stamp = scan.timestamp.isoformat()
+    changes = [(row, Finding.ADDED) for row in added]
+    changes.extend((finding.as_row(datetime_stamp, scan.url), Finding.RESOLVED) for finding in resolved)
+    return changes
+
+
+def scan_changes(scan):
+    """
+    Lists what changed between a scan and the previous scan of its URL
+
+    Args:
+        scan (AccessibilityResult): The scan
+
+    Returns:
+        dict: The scan and previous scan ids, and the added and resolved rows
+    """
+    if scan.base_scan_id is not None:
+        base = scan.base_scan
+        findings = scan.findings.order_by('id')
+        added = [finding for finding in findings if finding.change == Finding.ADDED]
+        resolved = [finding for finding in findings if finding.change == Finding.RESOLVED]
+    else:
+        base = (
+            AccessibilityResult.objects
+            .filter(
+                url=scan.url, profile=scan.profile_id, user=scan.user_id,
+                timestamp__lte=scan.timestamp, id__lt=scan.id,
+            )
+            .order_by('-timestamp', '-id')
+            .first()
+        )
+        if base is None:
+            added, resolved = list(scan.findings.order_by('id')), []
+        else:
+            rows = scan.as_results()
+            added_rows, resolved = diff_findings(base.current_findings(), rows)
+            added = [Finding.from_row(scan, row) for row in added_rows]
+
+    datetime_stamp = scan.timestamp.isoformat()
+    return {
+        'scan_id': scan.id,
+        'previous_scan_id': base.id if base is not None else None,
+        'url': scan.url,
+        'datetime': datetime_stamp,
+        'added': [finding.as_row(datetime_stamp, scan.url) for finding in added],
+        'resolved': [finding.as_row(datetime_stamp, scan.url) for finding in resolved],
+    }
@@ -0,0 +1,322 @@
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+
+from django.conf import settings
+
+# Upper bounds, in seconds, of the histogram buckets for stage and validator timings
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGES = ('fetch', 'parse', 'validate', 'fonts', 'dump', 'persist')
+
+_local = threading.local()
+
+# tracemalloc traces the whole process, so it is shared by every scan that
+# wants it: the first starts it and it stops when the last one finishes
+_tracing_lock = threading.Lock()
+_tracing_scans = 0
+_tracing_owned = False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms, rendered in the Prometheus text format.
+
+    Like the result cache counters these are per process, so each worker
+    serves its own numbers and the scraper sums them.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds to a counter
+
+        Args:
+            name (str): The metric name, ending in _total
+            value (float): The amount to add
+            **labels: Label values for this series
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_counter(self, name, value, **labels):
+        """
+        Sets a counter to a total kept elsewhere, such as the result cache counters
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Records one observation in a histogram
+
+        Args:
+            name (str): The metric name
+            value (float): The observed value
+            **labels: Label values for this series
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format
+
+        Returns:
+            str: The metrics page
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_label_text(labels)} {value}')
+
+        for (name, labels), histogram in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_label_text(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_bucket{_label_text(labels + (("le", "+Inf"),))} {histogram["count"]}')
+            lines.append(f'{name}_sum{_label_text(labels)} {histogram["sum"]}')
+            lines.append(f'{name}_count{_label_text(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+metrics_registry.describe('scan_stage_seconds', 'Wall time of each scan stage')
+metrics_registry.describe('scan_stage_cpu_seconds_total', 'CPU time spent in each scan stage')
+metrics_registry.describe('scan_stage_allocated_bytes_total', 'Bytes allocated in each scan stage, when traced')
+metrics_registry.describe('scan_validator_seconds', 'Wall time of each WCAG validator')
+metrics_registry.describe('scan_validator_cpu_seconds_total', 'CPU time spent in each WCAG validator')
+metrics_registry.describe('scans_total', 'Scans finished by this process')
+metrics_registry.describe('scan_jobs_total', 'Scan jobs run by this process, by final status')
+
+
+class Measurement:
+    """
+    Measures the wall time, CPU time and, while tracemalloc is tracing, the
+    peak bytes allocated by a block of code.
+
+    CPU time is for the measuring thread only, so a validate stage that fans
+    out over a pool counts its own waiting; the per-validator measurements
+    carry the CPU time of the workers. Allocations are traced for the whole
+    process, so they are approximate when validators run in parallel.
+    """
+
+    def __init__(self, record, name, metric=None):
+        self.record = record
+        self.name = name
+        self.metric = metric
+
+    def __enter__(self):
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+            self.peak_seen = 0
+            tracemalloc.reset_peak()
+        stack = getattr(_local, 'measurements', None)
+        if stack is None:
+            stack = _local.measurements = []
+        stack.append(self)
+        self.cpu_start = time.thread_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.thread_time() - self.cpu_start
+        _local.measurements.pop()
+
+        allocated = None
+        if self.tracing and tracemalloc.is_tracing():
+            # A nested measurement resets the peak, so take the highest it saw too
+            peak = max(tracemalloc.get_traced_memory()[1], self.peak_seen)
+            allocated = max(peak - self.memory_start, 0)
+            if _local.measurements and _local.measurements[-1].tracing:
+                parent = _local.measurements[-1]
+                parent.peak_seen = max(parent.peak_seen, peak)
+
+        self.record[self.name] = {'wall': wall, 'cpu': cpu, 'allocated': allocated}
+        if self.metric is not None:
+            label = {self.metric: self.name}
+            metrics_registry.observe(f'scan_{self.metric}_seconds', wall, **label)
+            metrics_registry.inc(f'scan_{self.metric}_cpu_seconds_total', cpu, **label)
+            if allocated is not None:
+                metrics_registry.inc(f'scan_{self.metric}_allocated_bytes_total', allocated, **label)
+        return False
+
+
+def measure_validator(function, ValidatorClass, *args):
+    """
+    Runs a validator function and measures it in the thread or process it runs in
+
+    Args:
+        function (callable): run_validator or validate_in_process
+        ValidatorClass (class): The WCAG validator
+        *args: The remaining arguments for function
+
+    Returns:
+        tuple: (the validator result, the measurement dict)
+    """
+    record = {}
+    with Measurement(record, ValidatorClass.__name__):
+        result = function(ValidatorClass, *args)
+    return result, record[ValidatorClass.__name__]
+
+
+def acquire_tracing():
+    """
+    Starts tracemalloc for a scan, or joins the scans already tracing
+    """
+    global _tracing_scans, _tracing_owned
+    with _tracing_lock:
+        if _tracing_scans == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_scans += 1
+
+
+def release_tracing():
+    """
+    Leaves tracing for a scan, stopping tracemalloc once no scan needs it.
+    Tracing that was on before any scan started it is left running
+    """
+    global _tracing_scans, _tracing_owned
+    with _tracing_lock:
+        _tracing_scans -= 1
+        if _tracing_scans == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+class ScanMetrics:
+    """
+    Collects the stage and validator timings for one scan.
+
+    With settings.SCAN_TRACE_ALLOCATIONS tracemalloc runs for the scan so each
+    measurement includes allocated bytes. With settings.SCAN_PROFILE a cProfile
+    profile and a tracemalloc snapshot are written to settings.SCAN_PROFILE_DIR,
+    named after the scan id, when the scan finishes.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.validators = {}
+        self.cache_hit = False
+        self.profiler = None
+        self._tracing = False
+        self._finished = False
+
+        if settings.SCAN_TRACE_ALLOCATIONS or settings.SCAN_PROFILE:
+            acquire_tracing()
+            self._tracing = True
+        if settings.SCAN_PROFILE:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stage(self, name):
+        """
+        Measures a stage of the scan
+
+        Args:
+            name (str): One of STAGES
+
+        Returns:
+            Measurement: A context manager around the stage
+        """
+        return Measurement(self.stages, name, metric='stage')
+
+    def add_validator(self, name, measurement):
+        """
+        Records a validator measured by measure_validator, possibly in another thread or process
+        """
+        self.validators[name] = measurement
+        metrics_registry.observe('scan_validator_seconds', measurement['wall'], validator=name)
+        metrics_registry.inc('scan_validator_cpu_seconds_total', measurement['cpu'], validator=name)
+
+    def as_dict(self):
+        return {'stages': self.stages, 'validators': self.validators, 'cache_hit': self.cache_hit}
+
+    def finish(self, scan=None):
+        """
+        Stops any profiling and writes the profile files. The timings are stored
+        by the result sink along with the scan, so nothing is saved here
+
+        Args:
+            scan (AccessibilityResult, optional): The saved scan, whose id names the profile files
+        """
+        if self._finished:
+            return
+        self._finished = True
+        metrics_registry.inc('scans_total')
+
+        snapshot = None
+        if self.profiler is not None:
+            self.profiler.disable()
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+        if self._tracing:
+            self._tracing = False
+            release_tracing()
+
+        if scan is None or scan.pk is None:
+            return
+
+        if self.profiler is not None:
+            os.makedirs(settings.SCAN_PROFILE_DIR, exist_ok=True)
+            path = os.path.join(settings.SCAN_PROFILE_DIR, f'scan-{scan.pk}')
+            self.profiler.dump_stats(f'{path}.prof')
+            if snapshot is not None:
+                with open(f'{path}-memory.txt', 'w') as file:
+                    for stat in snapshot.statistics('lineno')[:50]:
+                        file.write(f'{stat}\n')
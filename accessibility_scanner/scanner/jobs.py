@@ -0,0 +1,545 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from functools import partial
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .instrumentation import ScanMetrics, metrics_registry
+from .models import ScanJob
+from .profiles import VALIDATORS, load_validator
+from .sinks import get_result_sink
+
+# Queueing scans is all the web process does here, so the modules that
+# render and scan pages are imported by the job runners when they run.
+# Scan workers can load them up front with prewarm
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Puts a URL in the form identical scan requests share: the scheme and host
+    lower-cased, the default port and the fragment dropped and an empty path
+    made '/'. The query string is kept as it is, as its order can matter.
+    It is only used to match requests; jobs scan and save the URL as submitted
+
+    Args:
+        url (str): An absolute URL
+
+    Returns:
+        str: The normalized URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if ':' in netloc:
+        # An IPv6 address
+        netloc = f'[{netloc}]'
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{parts.port}'
+    if parts.username:
+        userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+        netloc = f'{userinfo}@{netloc}'
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def coalesce_key(url, profile=None, user=None):
+    """
+    The key of a page scan that identical requests wait on: the normalized URL,
+    the profile and, as scans belong to the user who ran them, the user
+    """
+    profile_id = profile.pk if profile is not None else ''
+    key = f'{url}\0{profile_id}' + (f'\0{user.pk}' if user is not None else '')
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def fresh_jobs(keys):
+    """
+    Finds page scans with the given keys that finished within settings.SCAN_FRESHNESS_SECONDS
+
+    Args:
+        keys (iterable): coalesce_key values
+
+    Returns:
+        dict: The most recent done job for each key that has one
+    """
+    if not settings.SCAN_FRESHNESS_SECONDS:
+        return {}
+    cutoff = timezone.now() - timedelta(seconds=settings.SCAN_FRESHNESS_SECONDS)
+    jobs = (
+        ScanJob.objects.filter(
+            scan_key__in=set(keys), mode=ScanJob.PAGE, status=ScanJob.DONE,
+            finished_at__gte=cutoff, result__isnull=False,
+        )
+        .order_by('finished_at')
+    )
+    # Later jobs overwrite earlier ones
+    return {job.scan_key: job for job in jobs}
+
+
+def in_flight_jobs(keys):
+    """
+    Finds the queued or running page scans with the given coalesce keys.
+
+    Requests don't join a job nobody will finish. One left running by a
+    worker that died is reclaimed first, see reclaim_stale_jobs. One that
+    has been queued for over settings.SCAN_QUEUE_TIMEOUT seconds, while no
+    worker has claimed any job, fails and gives its key up, so whoever is
+    polling it gets an answer and the next request queues a new scan
+
+    Args:
+        keys (iterable): coalesce_key values
+
+    Returns:
+        dict: The job for each key that has one
+    """
+    def lookup():
+        jobs = ScanJob.objects.filter(coalesce_key__in=set(keys)).select_related('profile')
+        return {job.coalesce_key: job for job in jobs}
+
+    jobs = lookup()
+    now = timezone.now()
+    running_before = now - timedelta(seconds=settings.SCAN_JOB_TIMEOUT)
+    queued_before = now - timedelta(seconds=settings.SCAN_QUEUE_TIMEOUT)
+    changed = False
+    stale = [job for job in jobs.values() if job.status == ScanJob.RUNNING and job.started_at < running_before]
+    if stale:
+        changed = any(reclaim_stale_jobs())
+    unclaimed = [job.pk for job in jobs.values() if job.status == ScanJob.QUEUED and job.created_at < queued_before]
+    if unclaimed and not ScanJob.objects.filter(started_at__gte=queued_before).exists():
+        changed = ScanJob.objects.filter(pk__in=unclaimed, status=ScanJob.QUEUED).update(
+            status=ScanJob.FAILED, finished_at=now, coalesce_key=None,
+            error="No scan worker has picked this job up; try again once the workers are running",
+        ) or changed
+    return lookup() if changed else jobs
+
+
+def enqueue_scan(url, profile=None, user=None):
+    """
+    Queues a URL to be scanned by a scan worker.
+
+    Requests for the same normalized URL, profile and user are coalesced: while one
+    is queued or running, later ones get that job instead of a new scan, and a
+    scan that finished within settings.SCAN_FRESHNESS_SECONDS is returned as
+    it is. A unique coalesce_key on the in-flight job makes this hold across
+    web processes.
+
+    Args:
+        url (str): The URL to scan
+        profile (ScanProfile, optional): The profile to scan with; None runs every check
+        user (User, optional): The signed in user the scan is for
+
+    Returns:
+        ScanJob: The queued job, or the one the request was coalesced with
+    """
+    key = coalesce_key(normalize_url(url), profile, user)
+    fresh = fresh_jobs([key]).get(key)
+    if fresh is not None:
+        metrics_registry.inc('scan_requests_coalesced_total', reason='fresh')
+        return fresh
+
+    while True:
+        existing = in_flight_jobs([key]).get(key)
+        if existing is not None:
+            metrics_registry.inc('scan_requests_coalesced_total', reason='in_flight')
+            return existing
+        try:
+            with transaction.atomic():
+                return ScanJob.objects.create(url=url, profile=profile, user=user, scan_key=key, coalesce_key=key)
+        except IntegrityError:
+            # Another request queued the same scan first, so join it
+            continue
+
+
+def enqueue_scans(urls, profile=None, user=None):
+    """
+    Queues a batch of URLs, coalescing them like enqueue_scan with a few queries for the whole batch
+
+    Args:
+        urls (list): The URLs to scan
+        profile (ScanProfile, optional): The profile to scan them with
+        user (User, optional): The signed in user the scans are for
+
+    Returns:
+        list: A job per URL, in order; repeated URLs share a job
+    """
+    keys = [coalesce_key(normalize_url(url), profile, user) for url in urls]
+    fresh = fresh_jobs(keys)
+    in_flight = in_flight_jobs(keys)
+
+    jobs = []
+    queued = {}
+    for url, key in zip(urls, keys):
+        job = fresh.get(key) or in_flight.get(key) or queued.get(key)
+        if job is None:
+            job = queued[key] = ScanJob(url=url, profile=profile, user=user, scan_key=key, coalesce_key=key)
+        jobs.append(job)
+    metrics_registry.inc('scan_requests_coalesced_total', len(urls) - len(queued), reason='batch')
+
+    try:
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                ScanJob.objects.bulk_create(queued.values())
+            else:
+                for job in queued.values():
+                    job.save()
+    except IntegrityError:
+        # A concurrent request queued some of these first; join them one at a time
+        return [enqueue_scan(url, profile, user) for url in urls]
+    return jobs
+
+
+def enqueue_crawl(url, mode=ScanJob.CRAWL, max_depth=1, max_pages=None, profile=None, user=None):
+    """
+    Queues a site crawl for a scan worker
+
+    Args:
+        url (str): The seed page, or the sitemap when mode is ScanJob.SITEMAP
+        mode (str): ScanJob.CRAWL or ScanJob.SITEMAP
+        max_depth (int): How many links deep to follow from the seed or sitemap pages
+        max_pages (int, optional): The most pages to scan; defaults to settings.CRAWL_MAX_PAGES
+        profile (ScanProfile, optional): The profile to scan each page with
+        user (User, optional): The signed in user the scans are for
+
+    Returns:
+        ScanJob: The queued job
+    """
+    return ScanJob.objects.create(
+        url=url,
+        mode=mode,
+        max_depth=max_depth,
+        max_pages=max_pages or settings.CRAWL_MAX_PAGES,
+        profile=profile,
+        user=user,
+    )
+
+
+def enqueue_upload(upload, base_url=None, profile=None, user=None):
+    """
+    Queues an uploaded HTML file, or zip of a built site, for a scan worker.
+    A zip is saved under settings.LOCAL_SCAN_UPLOAD_DIR until it has been scanned
+
+    Args:
+        upload (UploadedFile): The file from UploadForm
+        base_url (str, optional): The URL the page or site is published under
+        profile (ScanProfile, optional): The profile to scan with
+        user (User, optional): The signed in user the scans are for
+
+    Returns:
+        ScanJob: The queued HTML or archive job
+    """
+    from .documents import RAW_HTML_URL, decode_html
+
+    is_archive = zipfile.is_zipfile(upload)
+    # is_zipfile read from the upload, so start it over
+    upload.seek(0)
+    if not is_archive:
+        return ScanJob.objects.create(
+            url=base_url or RAW_HTML_URL, mode=ScanJob.HTML, html=decode_html(upload.read()),
+            profile=profile, user=user,
+        )
+
+    os.makedirs(settings.LOCAL_SCAN_UPLOAD_DIR, exist_ok=True)
+    handle, path = tempfile.mkstemp(prefix='site-', suffix='.zip', dir=settings.LOCAL_SCAN_UPLOAD_DIR)
+    with os.fdopen(handle, 'wb') as file:
+        for chunk in upload.chunks():
+            file.write(chunk)
+    # Without a base URL the pages are named after the upload
+    return ScanJob.objects.create(
+        url=base_url or f'file:///{upload.name}/', mode=ScanJob.ARCHIVE, archive=path,
+        profile=profile, user=user,
+    )
+
+
+def remove_upload(path):
+    """
+    Deletes the uploaded zip of an archive job, if it is still there
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def reclaim_stale_jobs():
+    """
+    Queues jobs again that were left running by a worker that died.
+
+    A page or HTML job running for over settings.SCAN_JOB_TIMEOUT seconds, or
+    a crawl or archive for over settings.CRAWL_JOB_TIMEOUT, is taken to be abandoned. It
+    goes back on the queue unless it has already been claimed
+    settings.SCAN_JOB_MAX_ATTEMPTS times, in which case it fails, so a page
+    that takes its worker down can't do so forever.
+
+    Returns:
+        tuple: (the number of jobs queued again, the number failed)
+    """
+    now = timezone.now()
+    page_cutoff = now - timedelta(seconds=settings.SCAN_JOB_TIMEOUT)
+    crawl_cutoff = now - timedelta(seconds=settings.CRAWL_JOB_TIMEOUT)
+    stale = ScanJob.objects.filter(
+        Q(mode__in=[ScanJob.PAGE, ScanJob.HTML], started_at__lt=page_cutoff)
+        | Q(mode__in=[ScanJob.CRAWL, ScanJob.SITEMAP, ScanJob.ARCHIVE], started_at__lt=crawl_cutoff),
+        status=ScanJob.RUNNING,
+    )
+    requeued = stale.filter(attempts__lt=settings.SCAN_JOB_MAX_ATTEMPTS).update(
+        status=ScanJob.QUEUED, started_at=None,
+    )
+    # The jobs just queued again are no longer running, so this only fails the rest
+    archives = list(stale.exclude(archive='').values_list('archive', flat=True))
+    failed = stale.update(
+        status=ScanJob.FAILED, finished_at=now, coalesce_key=None, archive='',
+        error=f"The scan worker stopped responding {settings.SCAN_JOB_MAX_ATTEMPTS} times while running this job",
+    )
+    for path in archives:
+        remove_upload(path)
+    if requeued:
+        metrics_registry.inc('scan_jobs_reclaimed_total', requeued, outcome='requeued')
+    if failed:
+        metrics_registry.inc('scan_jobs_reclaimed_total', failed, outcome='failed')
+    return requeued, failed
+
+
+def claim_next_job():
+    """
+    Claims the oldest queued job for this worker, first queueing again any
+    job a dead worker left running, see reclaim_stale_jobs.
+
+    The status is only changed if the job is still queued, so when several
+    workers poll the same database only one of them gets each job.
+
+    Returns:
+        ScanJob: The claimed job, or None if the queue is empty
+    """
+    reclaim_stale_jobs()
+    while True:
+        job = (
+            ScanJob.objects.filter(status=ScanJob.QUEUED)
+            .select_related('profile', 'user')
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        started_at = timezone.now()
+        claimed = ScanJob.objects.filter(pk=job.pk, status=ScanJob.QUEUED).update(
+            status=ScanJob.RUNNING, started_at=started_at, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.status = ScanJob.RUNNING
+            job.started_at = started_at
+            job.attempts += 1
+            return job
+
+
+def prewarm():
+    """
+    Imports the rendering and scanning code and every validator, so a scan
+    worker pays for them when it starts rather than on its first job
+
+    Returns:
+        list: The validator classes loaded
+    """
+    from . import crawler, renderers, wcag_checker  # noqa: F401
+
+    return [load_validator(name) for name in VALIDATORS]
+
+
+def run_scan_job(job):
+    """
+    Renders and scans the job's URL, recording the outcome on the job
+
+    Args:
+        job (ScanJob): A job claimed by this worker
+
+    Returns:
+        ScanJob: The finished job, either done or failed
+    """
+    if job.mode == ScanJob.HTML:
+        return run_html_job(job)
+    if job.mode == ScanJob.ARCHIVE:
+        return run_archive_job(job)
+    if job.mode != ScanJob.PAGE:
+        return run_crawl_job(job)
+
+    import requests
+
+    from .fetcher import previous_result, record_fetch
+    from .renderers import render_page
+    from .wcag_checker import run_access_scan
+
+    metrics = ScanMetrics()
+    try:
+        with metrics.stage('fetch'):
+            # Only the http renderer can answer 304; the others always render the page
+            response = render_page(job.url, conditional=True)
+            if response.status_code == 304:
+                job.result = previous_result(job.url)
+                owner = (job.profile_id, job.user_id)
+                if job.result is not None and (job.result.profile_id, job.result.user_id) != owner:
+                    job.result = None
+                if job.result is None:
+                    # The earlier result has been deleted, used another profile or is another user's,
+                    # so fetch the whole page again
+                    response = render_page(job.url)
+
+        if job.result is not None:
+            # Unchanged since the last scan, so that result is reused
+            job.not_modified = True
+            job.status = ScanJob.DONE
+        elif response.status_code == 200:
+            job.result = run_access_scan(response, metrics=metrics, profile=job.profile, user=job.user)
+            record_fetch(job.url, response, job.result)
+            metrics.finish(job.result)
+            job.status = ScanJob.DONE
+        else:
+            job.error = f"Error with request: {str(response.status_code)}"
+            job.status = ScanJob.FAILED
+    except requests.exceptions.RequestException as err:
+        job.error = f"Could not fetch the URL. Error: {err}"
+        job.status = ScanJob.FAILED
+    except Exception as err:
+        # Keep the worker alive for the next job; the error is shown to the user
+        job.error = f"Scan failed. Error: {err}"
+        job.status = ScanJob.FAILED
+
+    # Unchanged and failed pages keep no timings, but the profiler still has to stop
+    metrics.finish()
+    metrics_registry.inc('scan_jobs_total', status=job.status)
+    job.finished_at = timezone.now()
+    # New requests for the URL now get this result while it is fresh, or a new scan
+    job.coalesce_key = None
+    job.save(update_fields=['status', 'error', 'result', 'not_modified', 'finished_at', 'coalesce_key'])
+    return job
+
+
+def run_html_job(job):
+    """
+    Scans the HTML document submitted with the job, without fetching anything
+
+    Args:
+        job (ScanJob): An HTML job claimed by this worker
+
+    Returns:
+        ScanJob: The finished job, either done or failed
+    """
+    from .documents import HtmlDocument
+    from .wcag_checker import run_access_scan
+
+    metrics = ScanMetrics()
+    try:
+        job.result = run_access_scan(
+            HtmlDocument(job.html, job.url), metrics=metrics, profile=job.profile, user=job.user,
+        )
+        metrics.finish(job.result)
+        job.status = ScanJob.DONE
+    except Exception as err:
+        job.error = f"Scan failed. Error: {err}"
+        job.status = ScanJob.FAILED
+
+    metrics.finish()
+    metrics_registry.inc('scan_jobs_total', status=job.status)
+    # The saved findings are all that is needed, so the document isn't kept
+    job.html = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'result', 'html', 'finished_at'])
+    return job
+
+
+def run_crawl_job(job):
+    """
+    Crawls the job's site, scanning and saving every page that is found.
+
+    Pages are saved in batches of settings.RESULT_SINK_BATCH_SIZE scans.
+
+    Args:
+        job (ScanJob): A crawl or sitemap job claimed by this worker
+
+    Returns:
+        ScanJob: The finished job, either done or failed
+    """
+    from .crawler import Crawler
+    from .wcag_checker import run_access_scan
+
+    sink = get_result_sink(batch_size=settings.RESULT_SINK_BATCH_SIZE)
+    crawler = Crawler(
+        seeds=[job.url] if job.mode == ScanJob.CRAWL else [],
+        sitemaps=[job.url] if job.mode == ScanJob.SITEMAP else [],
+        max_depth=job.max_depth,
+        max_pages=job.max_pages,
+        on_page=partial(run_access_scan, sink=sink, profile=job.profile, user=job.user),
+    )
+    try:
+        try:
+            pages = crawler.run()
+        finally:
+            sink.close()
+        job.pages_scanned = sum(1 for page in pages if not page['error'])
+        if job.pages_scanned:
+            job.status = ScanJob.DONE
+        else:
+            job.error = pages[0]['error'] if pages else "No pages found to scan"
+            job.status = ScanJob.FAILED
+    except Exception as err:
+        job.error = f"Crawl failed. Error: {err}"
+        job.status = ScanJob.FAILED
+
+    metrics_registry.inc('scan_jobs_total', status=job.status)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'pages_scanned', 'finished_at'])
+    return job
+
+
+def run_archive_job(job):
+    """
+    Scans every page of the job's uploaded zip across settings.LOCAL_SCAN_WORKERS
+    processes, then deletes the upload.
+
+    Pages are saved in batches of settings.RESULT_SINK_BATCH_SIZE scans.
+
+    Args:
+        job (ScanJob): An archive job claimed by this worker
+
+    Returns:
+        ScanJob: The finished job, either done or failed
+    """
+    from .documents import open_site
+    from .local_scan import scan_site
+
+    sink = get_result_sink(batch_size=settings.RESULT_SINK_BATCH_SIZE)
+    job.pages_scanned = 0
+    try:
+        try:
+            with open_site(job.archive, job.url) as (site, paths):
+                for url, results, timings in scan_site(site, paths, profile=job.profile):
+                    sink.write(results, url, timings, job.profile, job.user)
+                    job.pages_scanned += 1
+        finally:
+            sink.close()
+        if job.pages_scanned:
+            job.status = ScanJob.DONE
+        else:
+            job.error = "The archive has no HTML pages to scan"
+            job.status = ScanJob.FAILED
+    except (OSError, ValueError, zipfile.BadZipFile) as err:
+        job.error = f"Could not read the archive. Error: {err}"
+        job.status = ScanJob.FAILED
+    except Exception as err:
+        job.error = f"Scan failed. Error: {err}"
+        job.status = ScanJob.FAILED
+
+    metrics_registry.inc('scan_jobs_total', status=job.status)
+    remove_upload(job.archive)
+    job.archive = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'pages_scanned', 'archive', 'finished_at'])
+    return job
@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import ScanMetrics
+from .wcag_script import check_accessibility
+
+
+def scan_page(site, path, profile=None, sections=None, max_failures=None, use_cache=False):
+    """
+    Scans one page of a site; run in the worker processes of scan_site
+
+    Returns:
+        tuple: (the page URL, the results from check_accessibility, the stage timings)
+    """
+    document = site.read(path)
+    metrics = ScanMetrics()
+    # The pages are already spread over the cores, so each one runs its validators in turn
+    results = check_accessibility(
+        document, executor='serial', use_cache=use_cache, metrics=metrics,
+        sections=sections, max_failures=max_failures, profile=profile,
+    )
+    metrics.finish()
+    return document.url, results, metrics.as_dict()
+
+
+def scan_site(site, paths, workers=None, profile=None, sections=None, max_failures=None):
+    """
+    Scans the pages of a site on disk across a pool of processes, without any HTTP requests
+
+    Args:
+        site (SiteDirectory): The site
+        paths (list): The pages to scan, from SiteDirectory.pages
+        workers (int, optional): Worker processes; defaults to settings.LOCAL_SCAN_WORKERS,
+            and 1 scans in this process
+        profile (ScanProfile, optional): The validators, level, techniques and sections to use
+        sections (iterable, optional): The sections to keep
+        max_failures (int, optional): Stop scanning a page after this many failures
+
+    Yields:
+        tuple: (url, results, timings) for each page, in the order of paths
+    """
+    workers = min(workers or settings.LOCAL_SCAN_WORKERS, len(paths) or 1)
+    scan = partial(scan_page, site, profile=profile, sections=sections, max_failures=max_failures)
+    if workers == 1:
+        yield from map(partial(scan, use_cache=settings.RESULT_CACHE_ENABLED), paths)
+        return
+    # Worker processes skip the result cache: many of them writing CachedResult at
+    # once lock a sqlite database. Connections are closed so none is shared by a fork
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Chunks keep the per-task overhead down when there are thousands of small pages
+        yield from pool.map(scan, paths, chunksize=max(1, min(16, len(paths) // (workers * 4))))
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.benchmark import compare_reports, read_report, run_benchmark, write_report
+
+
+class Command(BaseCommand):
+    help = "Times check_accessibility on synthetic pages and writes the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, action='append', dest='sizes', default=None,
+            help='A page size in KB, repeatable; defaults to 10, 100, 1024 and 10240',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic pages')
+        for element in ('images', 'headings', 'tables', 'inline_styles'):
+            parser.add_argument(
+                f"--{element.replace('_', '-')}", type=int, default=None, dest=element,
+                help=f'{element.replace("_", " ").capitalize()} per 10 KB of page',
+            )
+        parser.add_argument(
+            '--executor', choices=['serial', 'thread', 'process'], default=None,
+            help='The validator executor; defaults to settings.SCAN_EXECUTOR',
+        )
+        parser.add_argument(
+            '--startup', action='store_true',
+            help='Also time how long new web and worker processes take to import the app',
+        )
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results')
+        parser.add_argument('--compare', default=None, help='An earlier results file to compare against')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Relative slowdown that counts as a regression when comparing',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        sizes = [size * 1024 for size in options['sizes']] if options['sizes'] else None
+        density = {
+            element: options[element]
+            for element in ('images', 'headings', 'tables', 'inline_styles')
+            if options[element] is not None
+        }
+
+        report = run_benchmark(
+            sizes=sizes,
+            repeat=options['repeat'],
+            density=density,
+            seed=options['seed'],
+            executor=options['executor'],
+            progress=lambda size: self.stdout.write(f"Benchmarking a {size // 1024} KB page"),
+            startup=options['startup'],
+        )
+        write_report(report, options['output'])
+
+        for size, page in report['pages'].items():
+            total = page['total']
+            self.stdout.write(
+                f"{int(size) // 1024} KB: {total['median']:.3f}s median, "
+                f"{total['peak_memory'] / 1024 / 1024:.1f} MB peak"
+            )
+            for name, timing in page['validators'].items():
+                self.stdout.write(f"    {name}: {timing['median']:.3f}s")
+        for name, timing in report.get('startup', {}).items():
+            self.stdout.write(
+                f"{name.capitalize()} startup: {timing['median']:.3f}s median importing {timing['module']}, "
+                f"loads {', '.join(timing['heavy_modules']) or 'no scanning libraries'}"
+            )
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            comparisons = compare_reports(read_report(options['compare']), report, options['threshold'])
+            regressions = [comparison for comparison in comparisons if comparison['regressed']]
+            for comparison in regressions:
+                where = comparison['name']
+                if comparison['size'] is not None:
+                    where = f"{int(comparison['size']) // 1024} KB in {where}"
+                self.stdout.write(
+                    f"Regression at {where} {comparison['metric']}: {comparison['ratio']:.2f}x the baseline"
+                )
+            if regressions:
+                raise CommandError(f"{len(regressions)} measurements regressed past the threshold")
+            self.stdout.write("No regressions against the baseline")
@@ -0,0 +1,67 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from scanner.crawler import Crawler
+from scanner.sinks import get_result_sink
+from scanner.wcag_checker import run_access_scan
+
+
+class Command(BaseCommand):
+    help = "Crawls a site from a seed URL or sitemap and scans every page found"
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='The seed page, or the sitemap with --sitemap')
+        parser.add_argument(
+            '--sitemap', action='store_true',
+            help='Treat the URL as a sitemap.xml (or sitemap index) and scan its pages',
+        )
+        parser.add_argument(
+            '--depth', type=int, default=None,
+            help='How many links deep to follow; defaults to 1 for a seed URL and 0 for a sitemap',
+        )
+        parser.add_argument('--max-pages', type=int, default=None, help='The most pages to scan')
+        parser.add_argument(
+            '--allow-domain', action='append', default=[],
+            help='Another host the crawl may follow links to, repeatable',
+        )
+        parser.add_argument('--concurrency', type=int, default=None, help='Pages fetched at once')
+        parser.add_argument(
+            '--delay', type=float, default=None,
+            help='Seconds between requests to the same host',
+        )
+        parser.add_argument(
+            '--ignore-robots', action='store_true',
+            help='Crawl pages even if robots.txt disallows them',
+        )
+
+    def handle(self, *args, **options):
+        depth = options['depth']
+        if depth is None:
+            depth = 0 if options['sitemap'] else 1
+
+        sink = get_result_sink(batch_size=settings.RESULT_SINK_BATCH_SIZE)
+        crawler = Crawler(
+            seeds=[] if options['sitemap'] else [options['url']],
+            sitemaps=[options['url']] if options['sitemap'] else [],
+            max_depth=depth,
+            max_pages=options['max_pages'],
+            allowed_domains=options['allow_domain'],
+            concurrency=options['concurrency'],
+            host_delay=options['delay'],
+            respect_robots=not options['ignore_robots'],
+            on_page=partial(run_access_scan, sink=sink),
+        )
+        try:
+            pages = crawler.run()
+        finally:
+            sink.close()
+
+        for page in pages:
+            if page['error']:
+                self.stdout.write(f"{page['url']} - {page['error']}")
+            else:
+                self.stdout.write(f"{page['url']} - scanned")
+        scanned = sum(1 for page in pages if not page['error'])
+        self.stdout.write(f"{scanned} of {len(pages)} pages scanned")
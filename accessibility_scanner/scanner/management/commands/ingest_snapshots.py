@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.documents import open_site
+from scanner.renderers import save_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores pages rendered ahead of time, from a directory or zip archive, "
+        "for scans run with SCAN_RENDERER = 'snapshot'"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='A directory, a zip archive or a single HTML file of rendered pages')
+        parser.add_argument(
+            '--base-url', required=True,
+            help='The URL the pages are published under; each file is stored as the snapshot of its URL',
+        )
+        parser.add_argument(
+            '--directory', default=None,
+            help='Where to store the snapshots; defaults to settings.RENDER_SNAPSHOT_DIR',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open_site(options['path'], options['base_url']) as (site, paths):
+                for path in paths:
+                    document = site.read(path)
+                    save_snapshot(document.url, document.text, options['directory'])
+                    self.stdout.write(document.url)
+        except (OSError, ValueError) as err:
+            raise CommandError(str(err))
+        self.stdout.write(f"{len(paths)} snapshots stored")
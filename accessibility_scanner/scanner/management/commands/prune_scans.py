@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.retention import prune_scans
+
+
+class Command(BaseCommand):
+    help = "Rolls scans older than the retention period up into daily summaries and deletes them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=None,
+            help='Days of scans to keep in full; defaults to settings.RETENTION_DAYS',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Scans deleted per transaction; defaults to settings.RETENTION_BATCH_SIZE',
+        )
+        parser.add_argument(
+            '--archive', action='store_true',
+            help='Write the scans to gzipped JSON lines in settings.RETENTION_ARCHIVE_DIR before deleting them',
+        )
+        parser.add_argument(
+            '--archive-dir', default=None,
+            help='Archive to this directory instead; implies --archive',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to wait between batches, to go easy on a busy database',
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_days'] is not None and options['keep_days'] < 0:
+            raise CommandError("--keep-days can't be negative")
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        archive_dir = options['archive_dir']
+        if archive_dir is None and options['archive']:
+            archive_dir = settings.RETENTION_ARCHIVE_DIR
+
+        stats = prune_scans(
+            keep_days=options['keep_days'], batch_size=options['batch_size'],
+            archive_dir=archive_dir, pause=options['pause'],
+        )
+        self.stdout.write(
+            f"{stats['scans']} scans and {stats['findings']} findings deleted, "
+            f"{stats['rollups']} daily rollups updated, {stats['materialized']} incremental scans materialized"
+        )
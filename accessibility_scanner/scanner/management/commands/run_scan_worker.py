@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from scanner.jobs import claim_next_job, prewarm, run_scan_job
+from scanner.renderers import close_renderers, get_renderer
+
+
+class Command(BaseCommand):
+    help = "Runs queued scan jobs from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait before checking an empty queue again',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run until the queue is empty and then exit',
+        )
+        parser.add_argument(
+            '--no-prewarm', action='store_false', dest='prewarm', default=settings.SCAN_WORKER_PREWARM,
+            help='Load the validators on the first job instead of at startup',
+        )
+
+    def handle(self, *args, **options):
+        if options['prewarm']:
+            prewarm()
+        # Start a headless renderer's pool now rather than on the first job
+        renderer = get_renderer()
+        if hasattr(renderer, 'start'):
+            renderer.start()
+        try:
+            while True:
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                job = run_scan_job(job)
+                self.stdout.write(f"Scan {job.id} {job.status}: {job.url}")
+        finally:
+            close_renderers()
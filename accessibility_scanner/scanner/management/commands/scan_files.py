@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.documents import open_site
+from scanner.local_scan import scan_site
+from scanner.models import ScanProfile
+from scanner.sinks import get_result_sink
+
+
+class Command(BaseCommand):
+    help = (
+        "Scans the HTML files of a built site in a directory or zip archive, across every core, "
+        "without fetching anything over HTTP"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='A directory, a zip archive or a single HTML file')
+        parser.add_argument(
+            '--base-url', default=None,
+            help='The URL the site is published under, used to name the pages; defaults to file:// URLs',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Worker processes; defaults to settings.LOCAL_SCAN_WORKERS',
+        )
+        parser.add_argument('--profile', default=None, help='The name of the scan profile to use')
+        parser.add_argument(
+            '--gate', action='store_true',
+            help="Don't save the scans, and fail when any page has accessibility failures, for CI",
+        )
+        parser.add_argument(
+            '--max-failures', type=int, default=None,
+            help='With --gate, stop scanning a page after this many failures',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options['max_failures'] is not None and options['max_failures'] < 1:
+            raise CommandError("--max-failures must be at least 1")
+        profile = None
+        if options['profile']:
+            try:
+                profile = ScanProfile.objects.get(name=options['profile'])
+            except ScanProfile.DoesNotExist:
+                raise CommandError(f"No scan profile named '{options['profile']}'")
+
+        gate = options['gate']
+        # A gate only needs the failures, so the other rows are never built
+        sections = ['failures'] if gate else None
+        sink = None if gate else get_result_sink(batch_size=settings.RESULT_SINK_BATCH_SIZE)
+        failed = []
+        try:
+            with open_site(options['path'], options['base_url']) as (site, paths):
+                if not paths:
+                    raise CommandError(f"No HTML files found in {options['path']}")
+                pages = scan_site(
+                    site, paths, workers=options['workers'], profile=profile, sections=sections,
+                    max_failures=options['max_failures'] if gate else None,
+                )
+                for url, results, timings in pages:
+                    failures = results.get('failures', [])
+                    if gate:
+                        for row in failures:
+                            self.stdout.write(f"{url} - {row['error_code']}: {row['message']}")
+                    else:
+                        sink.write(results, url, timings, profile)
+                    if failures:
+                        failed.append(url)
+                    self.stdout.write(f"{url} - {len(failures)} failures")
+        except (OSError, ValueError) as err:
+            raise CommandError(str(err))
+        finally:
+            if sink is not None:
+                sink.close()
+
+        self.stdout.write(f"{len(paths)} pages scanned, {len(failed)} with failures")
+        if gate and failed:
+            raise CommandError(f"{len(failed)} of {len(paths)} pages have accessibility failures")
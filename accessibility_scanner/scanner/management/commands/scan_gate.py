@@ -0,0 +1,59 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from scanner.models import ScanProfile
+from scanner.renderers import render_page
+from scanner.wcag_script import FindingStream
+
+
+class Command(BaseCommand):
+    help = "Scans pages without saving them and fails when any page has accessibility failures, for CI"
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='The pages to check')
+        parser.add_argument(
+            '--max-failures', type=int, default=None,
+            help='Stop scanning a page after this many failures; defaults to reporting them all',
+        )
+        parser.add_argument('--warnings', action='store_true', help='Report warnings as well as failures')
+        parser.add_argument('--profile', default=None, help='The name of the scan profile to use')
+        parser.add_argument(
+            '--executor', choices=['serial', 'thread', 'process'], default=None,
+            help='The validator executor; defaults to settings.SCAN_EXECUTOR',
+        )
+
+    def handle(self, *args, **options):
+        if options['max_failures'] is not None and options['max_failures'] < 1:
+            raise CommandError("--max-failures must be at least 1")
+        # success and skipped rows are never built, which keeps the gate fast and small
+        sections = ['failures', 'warnings'] if options['warnings'] else ['failures']
+        profile = None
+        if options['profile']:
+            try:
+                profile = ScanProfile.objects.get(name=options['profile'])
+            except ScanProfile.DoesNotExist:
+                raise CommandError(f"No scan profile named '{options['profile']}'")
+
+        failed = []
+        for url in options['urls']:
+            try:
+                response = render_page(url)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as err:
+                raise CommandError(f"Could not fetch {url}: {err}")
+
+            stream = FindingStream(
+                response, executor=options['executor'], sections=sections,
+                max_failures=options['max_failures'], profile=profile,
+            )
+            for row in stream:
+                self.stdout.write(f"{url} - {row.section_type} - {row.error_code}: {row.message}")
+            if stream.failures:
+                failed.append(url)
+                more = ' (stopped early)' if stream.stopped_early else ''
+                self.stdout.write(f"{url} - {stream.failures} failures{more}")
+            else:
+                self.stdout.write(f"{url} - passed")
+
+        if failed:
+            raise CommandError(f"{len(failed)} of {len(options['urls'])} pages have accessibility failures")
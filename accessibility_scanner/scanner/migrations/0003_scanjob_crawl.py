@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0002_scanjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='max_depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='max_pages',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='mode',
+            field=models.CharField(choices=[('page', 'Single page'), ('crawl', 'Crawl from this page'), ('sitemap', 'Pages in this sitemap')], default='page', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='pages_scanned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
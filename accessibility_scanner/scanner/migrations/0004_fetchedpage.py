@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0003_scanjob_crawl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='not_modified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FetchedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+                ('etag', models.CharField(blank=True, max_length=200)),
+                ('last_modified', models.CharField(blank=True, max_length=64)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+                ('result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scanner.accessibilityresult')),
+            ],
+        ),
+    ]
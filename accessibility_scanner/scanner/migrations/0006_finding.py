@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0005_cachedresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Finding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section_type', models.CharField(choices=[('success', 'Success'), ('failures', 'Failures'), ('warnings', 'Warnings'), ('skipped', 'Skipped')], max_length=10)),
+                ('guideline', models.CharField(blank=True, max_length=20, null=True)),
+                ('technique', models.CharField(blank=True, max_length=20, null=True)),
+                ('error_code', models.CharField(blank=True, max_length=40, null=True)),
+                ('xpath', models.TextField(blank=True, null=True)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('classes', models.TextField(blank=True, null=True)),
+                ('element_id', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='serif_font_check',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='accessibilityresult',
+            name='json_response',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='accessibilityresult',
+            index=models.Index(fields=['url', 'timestamp'], name='scanner_acc_url_5f08e1_idx'),
+        ),
+        migrations.AddField(
+            model_name='finding',
+            name='scan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='findings', to='scanner.accessibilityresult'),
+        ),
+        migrations.AddIndex(
+            model_name='finding',
+            index=models.Index(fields=['scan', 'section_type'], name='scanner_fin_scan_id_2d1a42_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+SECTIONS = ['success', 'failures', 'warnings', 'skipped']
+
+
+def load_blob(json_response):
+    # Older rows hold a json.dumps string inside the JSONField
+    data = json_response
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+def blob_to_findings(apps, schema_editor):
+    AccessibilityResult = apps.get_model('scanner', 'AccessibilityResult')
+    Finding = apps.get_model('scanner', 'Finding')
+
+    scans = AccessibilityResult.objects.filter(json_response__isnull=False)
+    for scan in scans.iterator(chunk_size=100):
+        data = load_blob(scan.json_response)
+
+        findings = []
+        for section in SECTIONS:
+            for row in data.get(section) or []:
+                findings.append(Finding(
+                    scan=scan,
+                    section_type=section,
+                    guideline=row.get('guideline'),
+                    technique=row.get('technique'),
+                    error_code=row.get('error_code'),
+                    xpath=row.get('xpath'),
+                    message=row.get('message'),
+                    classes=row.get('classes'),
+                    element_id=row.get('id'),
+                ))
+                if len(findings) >= BATCH_SIZE:
+                    Finding.objects.bulk_create(findings)
+                    findings = []
+        Finding.objects.bulk_create(findings)
+
+        serif_font_check = data.get('serif_font_check') or ['']
+        AccessibilityResult.objects.filter(pk=scan.pk).update(
+            serif_font_check=serif_font_check[0][:100],
+            json_response=None,
+        )
+
+
+def findings_to_blob(apps, schema_editor):
+    AccessibilityResult = apps.get_model('scanner', 'AccessibilityResult')
+    Finding = apps.get_model('scanner', 'Finding')
+
+    for scan in AccessibilityResult.objects.iterator(chunk_size=100):
+        data = {section: [] for section in SECTIONS}
+        for finding in Finding.objects.filter(scan=scan).order_by('id').iterator():
+            data[finding.section_type].append({
+                'datetime': scan.timestamp.isoformat(),
+                'url': scan.url,
+                'section_type': finding.section_type,
+                'guideline': finding.guideline,
+                'technique': finding.technique,
+                'message': finding.message,
+                'error_code': finding.error_code,
+                'xpath': finding.xpath,
+                'classes': finding.classes,
+                'id': finding.element_id,
+            })
+        data['serif_font_check'] = [scan.serif_font_check] if scan.serif_font_check else []
+        AccessibilityResult.objects.filter(pk=scan.pk).update(json_response=json.dumps(data))
+        Finding.objects.filter(scan=scan).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0006_finding'),
+    ]
+
+    operations = [
+        migrations.RunPython(blob_to_findings, findings_to_blob),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0007_move_json_response_to_findings'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='accessibilityresult',
+            name='json_response',
+        ),
+    ]
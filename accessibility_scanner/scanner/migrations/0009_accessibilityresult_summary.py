@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0008_remove_accessibilityresult_json_response'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='failure_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='failure_example',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='skipped_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='skipped_example',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='success_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='success_example',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='warning_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='warning_example',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count
+
+SUMMARY_FIELDS = {
+    'success': ('success_count', 'success_example'),
+    'failures': ('failure_count', 'failure_example'),
+    'warnings': ('warning_count', 'warning_example'),
+    'skipped': ('skipped_count', 'skipped_example'),
+}
+
+
+def fill_summary(apps, schema_editor):
+    AccessibilityResult = apps.get_model('scanner', 'AccessibilityResult')
+    Finding = apps.get_model('scanner', 'Finding')
+
+    for scan in AccessibilityResult.objects.iterator(chunk_size=100):
+        findings = Finding.objects.filter(scan=scan)
+        counts = dict(findings.values_list('section_type').annotate(total=Count('id')).order_by())
+
+        summary = {}
+        for section, (count_field, example_field) in SUMMARY_FIELDS.items():
+            message = findings.filter(section_type=section).order_by('id').values_list('message', flat=True).first()
+            summary[count_field] = counts.get(section, 0)
+            summary[example_field] = message.split(' - ')[0] if message else ''
+        AccessibilityResult.objects.filter(pk=scan.pk).update(**summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0009_accessibilityresult_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0010_fill_accessibilityresult_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0011_accessibilityresult_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='base_scan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scanner.accessibilityresult'),
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='chain_length',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='finding',
+            name='change',
+            field=models.CharField(blank=True, choices=[('', 'Full scan'), ('added', 'Added'), ('resolved', 'Resolved')], default='', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='finding',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,31 @@
+import hashlib
+
+from django.db import migrations
+
+FINGERPRINT_FIELDS = ('guideline', 'technique', 'error_code', 'xpath')
+
+
+def fill_fingerprint(apps, schema_editor):
+    Finding = apps.get_model('scanner', 'Finding')
+
+    last_id = 0
+    while True:
+        # Walk the table by id so the update doesn't disturb an open cursor
+        batch = list(Finding.objects.filter(id__gt=last_id).order_by('id').only('id', *FINGERPRINT_FIELDS)[:1000])
+        if not batch:
+            break
+        for finding in batch:
+            key = '\0'.join(getattr(finding, field) or '' for field in FINGERPRINT_FIELDS)
+            finding.fingerprint = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        Finding.objects.bulk_update(batch, ['fingerprint'])
+        last_id = batch[-1].id
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0012_incremental_scans'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_fingerprint, migrations.RunPython.noop),
+    ]
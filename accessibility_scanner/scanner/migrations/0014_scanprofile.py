@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import scanner.profiles
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0013_fill_finding_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('validators', models.JSONField(default=scanner.profiles.default_validators)),
+                ('level', models.CharField(choices=[('A', 'A'), ('AA', 'AA'), ('AAA', 'AAA')], default='AA', max_length=3)),
+                ('techniques', models.JSONField(blank=True, default=list)),
+                ('sections', models.JSONField(default=scanner.profiles.default_sections)),
+                ('check_fonts', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='profile',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scans', to='scanner.scanprofile'),
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='profile',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scanner.scanprofile'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+PROFILES = [
+    {
+        'name': 'Failures and warnings',
+        'sections': ['failures', 'warnings'],
+    },
+    {
+        'name': 'Level A',
+        'level': 'A',
+        'sections': ['failures', 'warnings'],
+        'check_fonts': False,
+    },
+]
+
+
+def add_profiles(apps, schema_editor):
+    ScanProfile = apps.get_model('scanner', 'ScanProfile')
+    for profile in PROFILES:
+        ScanProfile.objects.get_or_create(name=profile['name'], defaults=profile)
+
+
+def remove_profiles(apps, schema_editor):
+    ScanProfile = apps.get_model('scanner', 'ScanProfile')
+    ScanProfile.objects.filter(name__in=[profile['name'] for profile in PROFILES]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0014_scanprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_profiles, remove_profiles),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0015_default_scan_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='scanjob',
+            name='mode',
+            field=models.CharField(choices=[('page', 'Single page'), ('crawl', 'Crawl from this page'), ('sitemap', 'Pages in this sitemap'), ('html', 'Submitted HTML document')], default='page', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='finding',
+            index=models.Index(fields=['error_code', 'id'], name='scanner_fin_error_c_1aacdc_idx'),
+        ),
+    ]
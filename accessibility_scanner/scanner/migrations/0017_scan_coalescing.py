@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0016_api'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='coalesce_key',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='scanjob',
+            index=models.Index(fields=['url', 'finished_at'], name='scanner_sca_url_d6e2af_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0017_scan_coalescing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField()),
+                ('day', models.DateField()),
+                ('profile_name', models.CharField(blank=True, max_length=100)),
+                ('scan_count', models.PositiveIntegerField(default=0)),
+                ('success_count', models.PositiveBigIntegerField(default=0)),
+                ('failure_count', models.PositiveBigIntegerField(default=0)),
+                ('warning_count', models.PositiveBigIntegerField(default=0)),
+                ('skipped_count', models.PositiveBigIntegerField(default=0)),
+                ('max_failure_count', models.PositiveIntegerField(default=0)),
+                ('serif_font_scans', models.PositiveIntegerField(default=0)),
+                ('first_scan_at', models.DateTimeField()),
+                ('last_scan_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='accessibilityresult',
+            index=models.Index(fields=['timestamp'], name='scanner_acc_timesta_1222e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scanrollup',
+            index=models.Index(fields=['day'], name='scanner_sca_day_0d79e0_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='scanrollup',
+            constraint=models.UniqueConstraint(fields=('url', 'day', 'profile_name'), name='unique_scan_rollup'),
+        ),
+    ]
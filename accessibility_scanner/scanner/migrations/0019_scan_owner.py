@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scanner', '0018_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessibilityresult',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scans', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='accessibilityresult',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='scanner_acc_user_id_3ed162_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accessibilityresult',
+            index=models.Index(fields=['user', 'url', 'timestamp'], name='scanner_acc_user_id_fab8b4_idx'),
+        ),
+    ]
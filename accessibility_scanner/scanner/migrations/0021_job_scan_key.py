@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0020_job_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='scanjob',
+            name='scanner_sca_url_d6e2af_idx',
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='scan_key',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='scanjob',
+            index=models.Index(fields=['scan_key', 'finished_at'], name='scanner_sca_scan_ke_8631fd_idx'),
+        ),
+    ]
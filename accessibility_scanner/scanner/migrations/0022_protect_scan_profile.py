@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0021_job_scan_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accessibilityresult',
+            name='profile',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='scans', to='scanner.scanprofile'),
+        ),
+        migrations.AlterField(
+            model_name='scanjob',
+            name='profile',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='scanner.scanprofile'),
+        ),
+    ]
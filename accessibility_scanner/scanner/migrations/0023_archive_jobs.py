@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0022_protect_scan_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='archive',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='scanjob',
+            name='mode',
+            field=models.CharField(choices=[('page', 'Single page'), ('crawl', 'Crawl from this page'), ('sitemap', 'Pages in this sitemap'), ('html', 'Submitted HTML document'), ('archive', 'Uploaded site archive')], default='page', max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scanner', '0023_archive_jobs'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='scanrollup',
+            name='unique_scan_rollup',
+        ),
+        migrations.AddField(
+            model_name='scanrollup',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='scanrollup',
+            constraint=models.UniqueConstraint(fields=('url', 'day', 'profile_name', 'user'), name='unique_scan_rollup'),
+        ),
+    ]
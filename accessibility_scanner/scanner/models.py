@@ -1,12 +1,378 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.conf import settings
 from django.db import models
 
+from .profiles import (
+    DEFAULT_LEVEL, SECTIONS, VALIDATORS, WCAG_LEVELS, applicable_validators,
+    default_sections, default_validators, load_validator,
+)
+
 # Create your models here.
 
 
+class ScanProfile(models.Model):
+    """
+    Which validators, WCAG level, techniques and sections a scan uses
+    """
+    LEVEL_CHOICES = [(level, level) for level in WCAG_LEVELS]
+
+    name = models.CharField(max_length=100, unique=True)
+    # Validator names from profiles.VALIDATORS
+    validators = models.JSONField(default=default_validators)
+    # Validators for success criteria above this level don't run, and Molerat
+    # checks contrast against the AAA ratios at AAA
+    level = models.CharField(max_length=3, choices=LEVEL_CHOICES, default=DEFAULT_LEVEL)
+    # Technique codes such as H37 to keep; empty keeps every technique
+    techniques = models.JSONField(default=list, blank=True)
+    # The sections kept; rows of the others are never built or saved
+    sections = models.JSONField(default=default_sections)
+    check_fonts = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        unknown = [name for name in self.validators if name not in VALIDATORS]
+        if unknown:
+            raise ValidationError({'validators': f"Unknown validators {', '.join(unknown)}, use {', '.join(VALIDATORS)}"})
+        unknown = [section for section in self.sections if section not in SECTIONS]
+        if unknown:
+            raise ValidationError({'sections': f"Unknown sections {', '.join(unknown)}, use {', '.join(SECTIONS)}"})
+
+    def validator_classes(self):
+        """
+        Imports the validators this profile runs at its level
+
+        Returns:
+            list: The WCAG validator classes in the order scans run them
+        """
+        return [load_validator(name) for name in applicable_validators(self.validators, self.level)]
+
+
 class AccessibilityResult(models.Model):
+    """
+    One scan of a URL. The individual results are rows in Finding
+    """
+    SECTIONS = SECTIONS
+
     timestamp = models.DateTimeField(auto_now_add=True)
     url = models.URLField(max_length=200)
-    json_response = models.JSONField() 
+    serif_font_check = models.CharField(max_length=100, blank=True)
+    # Summary of the findings, filled in when the scan is saved so the dashboard
+    # doesn't have to count them
+    success_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+    warning_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    success_example = models.TextField(blank=True)
+    failure_example = models.TextField(blank=True)
+    warning_example = models.TextField(blank=True)
+    skipped_example = models.TextField(blank=True)
+    # Wall time, CPU time and allocated bytes per stage and validator, from ScanMetrics
+    timings = models.JSONField(null=True, blank=True)
+    # Incremental scans store only the findings added or resolved since base_scan,
+    # the previous scan of the url; chain_length counts the scans back to a full one
+    base_scan = models.ForeignKey('self', null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    chain_length = models.PositiveSmallIntegerField(default=0)
+    # None for a scan with every validator and section. A profile with scans can't be
+    # deleted, as its partial scans would pass for full ones, and serve as their bases
+    profile = models.ForeignKey(ScanProfile, null=True, blank=True, on_delete=models.PROTECT, related_name='scans')
+    # The signed in user who ran the scan; None for anonymous scans and scans from the command line
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='scans',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['url', 'timestamp']),
+            # The dashboard's latest scan and retention's cutoff, without scanning the table
+            models.Index(fields=['timestamp']),
+            # A user's history, newest first, and their scans of one URL
+            models.Index(fields=['user', 'timestamp', 'id']),
+            models.Index(fields=['user', 'url', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp} - {self.url}"
+
+    def as_results(self):
+        """
+        Rebuilds the scan in the shape check_accessibility returns
+
+        Returns:
+            dict: Lists of rows for each section, plus serif_font_check
+        """
+        results = {section: [] for section in self.SECTIONS}
+        datetime_stamp = self.timestamp.isoformat()
+        for finding in self.current_findings():
+            results[finding.section_type].append(finding.as_row(datetime_stamp, self.url))
+        results['serif_font_check'] = [self.serif_font_check] if self.serif_font_check else []
+        return results
+
+    def current_findings(self):
+        """
+        Returns every finding of the scan, replaying the added and resolved
+        findings of an incremental scan over the full scan it builds on
+
+        Returns:
+            iterator: Finding rows in the order they were found
+        """
+        if self.base_scan_id is None:
+            return self.findings.order_by('id').iterator()
+
+        chain = []
+        scan = self
+        while scan.base_scan_id is not None:
+            chain.append(scan)
+            scan = scan.base_scan
+        # The same problem can be reported more than once, so each key holds a list
+        findings = {}
+        for finding in scan.findings.order_by('id').iterator():
+            findings.setdefault(finding.key, []).append(finding)
+        for delta in reversed(chain):
+            for finding in delta.findings.order_by('id').iterator():
+                if finding.change == Finding.RESOLVED:
+                    if findings.get(finding.key):
+                        findings[finding.key].pop(0)
+                else:
+                    findings.setdefault(finding.key, []).append(finding)
+        return iter(sorted((finding for group in findings.values() for finding in group), key=lambda finding: finding.pk))
+
+
+class Finding(models.Model):
+    """
+    A single success, failure, warning or skipped element from a validator
+    """
+    SECTION_CHOICES = [(section, section.title()) for section in AccessibilityResult.SECTIONS]
+    ADDED = 'added'
+    RESOLVED = 'resolved'
+    CHANGE_CHOICES = [('', 'Full scan'), (ADDED, 'Added'), (RESOLVED, 'Resolved')]
+
+    scan = models.ForeignKey(AccessibilityResult, on_delete=models.CASCADE, related_name='findings')
+    section_type = models.CharField(max_length=10, choices=SECTION_CHOICES)
+    guideline = models.CharField(max_length=20, null=True, blank=True)
+    technique = models.CharField(max_length=20, null=True, blank=True)
+    error_code = models.CharField(max_length=40, null=True, blank=True)
+    xpath = models.TextField(null=True, blank=True)
+    message = models.TextField(null=True, blank=True)
+    classes = models.TextField(null=True, blank=True)
+    element_id = models.CharField(max_length=255, null=True, blank=True)
+    # Identifies the same problem across scans, see fingerprint_row
+    fingerprint = models.CharField(max_length=40, blank=True, db_index=True)
+    change = models.CharField(max_length=8, choices=CHANGE_CHOICES, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['scan', 'section_type']),
+            # The API pages through findings of one error code across scans by id
+            models.Index(fields=['error_code', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.section_type} - {self.error_code or self.technique}"
+
+    @staticmethod
+    def fingerprint_row(row):
+        """
+        Hashes the parts of a row that identify a problem on a page, so it can
+        be matched against earlier scans even when its message changes
+
+        Args:
+            row (dict): A check_accessibility row
+
+        Returns:
+            str: A sha1 hex digest of guideline, technique, error_code and xpath
+        """
+        key = '\0'.join(str(row.get(field) or '') for field in ('guideline', 'technique', 'error_code', 'xpath'))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_row(cls, scan, row, change=''):
+        """
+        Builds an unsaved Finding from a check_accessibility row
+
+        Args:
+            scan (AccessibilityResult): The scan the row belongs to
+            row (dict): A row from one of the result sections
+            change (str): Finding.ADDED or Finding.RESOLVED for an incremental scan
+
+        Returns:
+            Finding: The unsaved finding
+        """
+        return cls(
+            scan=scan,
+            section_type=row.get('section_type'),
+            guideline=row.get('guideline'),
+            technique=row.get('technique'),
+            error_code=row.get('error_code'),
+            xpath=row.get('xpath'),
+            message=row.get('message'),
+            classes=row.get('classes'),
+            element_id=row.get('id'),
+            fingerprint=cls.fingerprint_row(row),
+            change=change,
+        )
+
+    @property
+    def key(self):
+        """
+        The section and fingerprint, which match a finding to the same one in another scan
+        """
+        return self.section_type, self.fingerprint
+
+    def as_row(self, datetime_stamp, url):
+        """
+        Returns the finding as a check_accessibility row
+
+        Args:
+            datetime_stamp (str): The scan time in ISO format
+            url (str): The scanned URL
+
+        Returns:
+            dict: The row
+        """
+        return {
+            'datetime': datetime_stamp,
+            'url': url,
+            'section_type': self.section_type,
+            'guideline': self.guideline,
+            'technique': self.technique,
+            'message': self.message,
+            'error_code': self.error_code,
+            'xpath': self.xpath,
+            'classes': self.classes,
+            'id': self.element_id,
+        }
+
+
+class ScanJob(models.Model):
+    """
+    A URL waiting to be scanned, or being scanned, by a scan worker
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    PAGE = 'page'
+    CRAWL = 'crawl'
+    SITEMAP = 'sitemap'
+    HTML = 'html'
+    ARCHIVE = 'archive'
+    MODE_CHOICES = [
+        (PAGE, 'Single page'),
+        (CRAWL, 'Crawl from this page'),
+        (SITEMAP, 'Pages in this sitemap'),
+        (HTML, 'Submitted HTML document'),
+        (ARCHIVE, 'Uploaded site archive'),
+    ]
+
+    url = models.URLField(max_length=200)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default=PAGE)
+    # Crawl limits, links are followed max_depth levels deep from the url
+    max_depth = models.PositiveSmallIntegerField(default=0)
+    max_pages = models.PositiveIntegerField(default=1)
+    pages_scanned = models.PositiveIntegerField(default=0)
+    # Set when the page came back 304 and the previous result was reused
+    not_modified = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # How many times a worker has claimed the job, see jobs.reclaim_stale_jobs
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    result = models.ForeignKey(AccessibilityResult, null=True, blank=True, on_delete=models.SET_NULL)
+    profile = models.ForeignKey(ScanProfile, null=True, blank=True, on_delete=models.PROTECT)
+    # The document of an HTML job, cleared once it has been scanned
+    html = models.TextField(blank=True)
+    # The path of the uploaded zip of an archive job, deleted once it has been scanned
+    archive = models.CharField(max_length=255, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    # The normalized URL, profile and user of a page job, see jobs.coalesce_key. It is
+    # kept as coalesce_key while the job is queued or running, so identical requests
+    # join it, and as scan_key for good, so they find its result while it is fresh
+    scan_key = models.CharField(max_length=40, blank=True, editable=False)
+    coalesce_key = models.CharField(max_length=40, null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Workers pick up the oldest queued job first
+            models.Index(fields=['status', 'created_at']),
+            # Recently finished scans of a URL are served again while fresh
+            models.Index(fields=['scan_key', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.url} - {self.status}"
+
+
+
+class FetchedPage(models.Model):
+    """
+    The ETag and Last-Modified of the last scanned copy of a URL, so it can be
+    re-fetched conditionally and skipped when it hasn't changed
+    """
+    url = models.URLField(max_length=200, unique=True)
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    fetched_at = models.DateTimeField(auto_now=True)
+    result = models.ForeignKey(AccessibilityResult, null=True, blank=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f"{self.url} - {self.etag or self.last_modified}"
+
+
+
+class CachedResult(models.Model):
+    """
+    Validator output for a page, keyed on a hash of its HTML and the validator versions
+    """
+    key = models.CharField(max_length=64, unique=True)
+    results = models.TextField()
+    size = models.PositiveIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(db_index=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key} - {self.size} bytes"
+
+
+class ScanRollup(models.Model):
+    """
+    The scans of a URL on one day, summed up once retention has deleted them
+    """
+    url = models.URLField(max_length=200)
+    day = models.DateField()
+    # The name of the profile the scans used, blank for full scans
+    profile_name = models.CharField(max_length=100, blank=True)
+    # The user who ran the scans; None for anonymous scans
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    scan_count = models.PositiveIntegerField(default=0)
+    success_count = models.PositiveBigIntegerField(default=0)
+    failure_count = models.PositiveBigIntegerField(default=0)
+    warning_count = models.PositiveBigIntegerField(default=0)
+    skipped_count = models.PositiveBigIntegerField(default=0)
+    max_failure_count = models.PositiveIntegerField(default=0)
+    serif_font_scans = models.PositiveIntegerField(default=0)
+    first_scan_at = models.DateTimeField()
+    last_scan_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['url', 'day', 'profile_name', 'user'], name='unique_scan_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
 
     def __str__(self):
-        return f"{self.timestamp} - {self.url}"
\ No newline at end of file
+        return f"{self.day} - {self.url} - {self.scan_count} scans"
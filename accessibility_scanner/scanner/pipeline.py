@@ -0,0 +1,272 @@
+import copy
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from lxml import etree
+from wcag_zoo.utils import Premoler
+
+from .stylesheets import stylesheet_cache
+
+EXECUTOR_BACKENDS = ('serial', 'thread', 'process')
+
+# Pools are kept between scans so the start-up cost is only paid once per worker
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class SharedStylesheetPremoler(Premoler):
+    """
+    Premoler that loads each external stylesheet once per document, so
+    validators with different CSS options don't download the same file again.
+
+    When the page URL is known, links are resolved against it and read
+    through the shared stylesheet cache, so a crawl downloads each of a
+    site's stylesheets once rather than once per page. Pages of a site on
+    disk read them through their SiteDirectory instead. A stylesheet that
+    can't be loaded is treated as empty instead of failing the scan.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.stylesheets = kwargs.pop('stylesheets')
+        self.page_url = kwargs.pop('page_url', None)
+        self.site = kwargs.pop('site', None)
+        super().__init__(*args, **kwargs)
+
+    def _load_external(self, url):
+        if url not in self.stylesheets:
+            if self.page_url:
+                absolute = urljoin(self.page_url, url)
+                load_text = self.site.load_text if self.site is not None else stylesheet_cache.get_text
+                try:
+                    self.stylesheets[url] = load_text(absolute)
+                except (requests.exceptions.RequestException, OSError, ValueError):
+                    self.stylesheets[url] = ''
+            else:
+                self.stylesheets[url] = super()._load_external(url)
+        return self.stylesheets[url]
+
+
+class ParsedDocument:
+    """
+    An HTML document parsed once and shared by every WCAG validator in a scan.
+
+    wcag_zoo validators normally parse the raw bytes themselves and then inline
+    the page CSS with Premailer. Here the lxml tree is built once and the CSS
+    inlining is run once for each distinct set of Premailer options (Glowworm
+    keeps pseudo-classes, the others don't), so a scan does at most two
+    transforms instead of one parse and transform per validator.
+    """
+
+    def __init__(self, html_content, staticpath='.', media_rules=None, base_url=None, site=None):
+        self.html_content = html_content
+        self.base_url = base_url
+        self.site = site
+        # HTML content has to be turned into bytes for the validators to work
+        self.html_bytes = html_content.encode('utf-8')
+        self.staticpath = staticpath
+        self.media_rules = media_rules or []
+        self.stylesheets = {}
+        self._root = None
+        self._styled_trees = {}
+        # Validators may ask for their tree from several threads at once
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        """
+        The untouched lxml root element, parsed on first use
+        """
+        with self._lock:
+            return self._parse()
+
+    def _parse(self):
+        if self._root is None:
+            parser = etree.HTMLParser()
+            self._root = etree.parse(BytesIO(self.html_bytes), parser).getroot()
+        return self._root
+
+    def stylesheet_fingerprints(self):
+        """
+        Hashes the external stylesheets the page links to, for the result cache key,
+        as the contrast and focus checks change with them even when the page doesn't.
+        They are read through the same loaders as the validators use, so the
+        validators find them already loaded
+
+        Returns:
+            list: (absolute URL, sha256 of the CSS) pairs in document order; a
+                stylesheet that can't be loaded hashes as empty, as the validators see it
+        """
+        root = self.root
+        if root is None:
+            return []
+        load_text = self.site.load_text if self.site is not None else stylesheet_cache.get_text
+        fingerprints = []
+        for element in root.iter('link'):
+            if 'stylesheet' not in (element.get('rel') or '').lower().split() or not element.get('href'):
+                continue
+            url = urljoin(self.base_url or '', element.get('href'))
+            text = ''
+            if urlsplit(url).scheme in ('http', 'https', 'file'):
+                try:
+                    text = load_text(url)
+                except (requests.exceptions.RequestException, OSError, ValueError):
+                    pass
+            fingerprints.append((url, hashlib.sha256(text.encode('utf-8')).hexdigest()))
+        return fingerprints
+
+    def premoler_kwargs(self, ValidatorClass):
+        """
+        Builds the Premailer options a validator would use in its own get_tree
+
+        Args:
+            ValidatorClass (class): The WCAG validator
+
+        Returns:
+            dict: Keyword arguments for Premoler
+        """
+        kwargs = dict(
+            exclude_pseudoclasses=True,
+            method='html',
+            preserve_internal_links=True,
+            base_path=self.staticpath,
+            include_star_selectors=True,
+            strip_important=False,
+            disable_validation=True,
+            media_rules=self.media_rules,
+        )
+        kwargs.update(ValidatorClass.premolar_kwargs)
+        return kwargs
+
+    def styled_tree(self, ValidatorClass):
+        """
+        Returns the CSS-inlined tree for a validator, building it only the first
+        time a validator with these Premailer options asks for it
+
+        Args:
+            ValidatorClass (class): The WCAG validator
+
+        Returns:
+            lxml.etree._ElementTree: The tree the validator should run against
+        """
+        kwargs = self.premoler_kwargs(ValidatorClass)
+        key = tuple(sorted((name, repr(value)) for name, value in kwargs.items()))
+
+        with self._lock:
+            if key not in self._styled_trees:
+                # Premailer rewrites the tree in place, so each variant gets its own copy
+                root = copy.deepcopy(self._parse())
+                self._styled_trees[key] = SharedStylesheetPremoler(
+                    root,
+                    stylesheets=self.stylesheets,
+                    page_url=self.base_url,
+                    site=self.site,
+                    **kwargs
+                ).transform()
+            return self._styled_trees[key]
+
+    def prepare(self, validator):
+        """
+        Hands the shared tree to a validator instance so validate_document
+        doesn't parse the HTML again
+
+        Args:
+            validator (WCAGCommand): An instantiated WCAG validator
+        """
+        validator._tree = self.styled_tree(type(validator))
+
+
+class SerialExecutor:
+    """
+    Runs validators one after another on the calling thread, with the same
+    map interface as the concurrent.futures pools. Each call runs when its
+    result is asked for, so a scan that stops early skips the rest
+    """
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def validate_in_process(ValidatorClass, html_content, base_url=None, level=None, site=None):
+    """
+    Runs one validator in a worker process.
+
+    lxml trees can't be sent between processes, so each worker parses its own
+    copy of the page. This trades the single shared parse for running the
+    CPU-heavy validators on separate cores.
+
+    Args:
+        ValidatorClass (class): The WCAG validator to use
+        html_content (str): The HTML content of the webpage
+        base_url (str, optional): The page URL, to resolve linked stylesheets
+        level (str, optional): The WCAG level, 'AA' or 'AAA', for the validators that use it
+        site (SiteDirectory, optional): The site on disk the page belongs to
+
+    Returns:
+        dict: The validation results; (success, failures, warnings, skipped elements)
+    """
+    document = ParsedDocument(html_content, base_url=base_url, site=site)
+    validator = ValidatorClass(level=level) if level else ValidatorClass()
+    document.prepare(validator)
+    return validator.validate_document(document.html_bytes)
+
+
+def get_executor_backend(backend=None):
+    """
+    Returns the validator execution backend, defaulting to settings.SCAN_EXECUTOR
+
+    Args:
+        backend (str, optional): 'serial', 'thread' or 'process'
+
+    Returns:
+        str: The backend name
+    """
+    backend = backend or getattr(settings, 'SCAN_EXECUTOR', 'serial')
+    if backend not in EXECUTOR_BACKENDS:
+        raise ImproperlyConfigured(
+            f"SCAN_EXECUTOR must be one of {', '.join(EXECUTOR_BACKENDS)}, not '{backend}'"
+        )
+    return backend
+
+
+def get_executor(backend=None):
+    """
+    Returns the shared executor used to fan validators out
+
+    Args:
+        backend (str, optional): 'serial', 'thread' or 'process'
+
+    Returns:
+        Executor: An object with a concurrent.futures style map method
+    """
+    backend = get_executor_backend(backend)
+    if backend == 'serial':
+        return SerialExecutor()
+
+    workers = getattr(settings, 'SCAN_EXECUTOR_WORKERS', 5)
+    with _executors_lock:
+        if (backend, workers) not in _executors:
+            if backend == 'thread':
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='validator')
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            _executors[(backend, workers)] = executor
+        return _executors[(backend, workers)]
+
+
+def shutdown_executors():
+    """
+    Shuts down any thread or process pools started for validators
+    """
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+from django.utils.module_loading import import_string
+
+# The wcag_zoo validators by name, in the order scans run them. Each is
+# imported the first time a scan uses it, so a profile that leaves a
+# validator out never loads it
+VALIDATORS = {
+    'Anteater': 'wcag_zoo.validators.anteater.Anteater',
+    'Ayeaye': 'wcag_zoo.validators.ayeaye.Ayeaye',
+    'Glowworm': 'wcag_zoo.validators.glowworm.Glowworm',
+    'Molerat': 'wcag_zoo.validators.molerat.Molerat',
+    'Tarsier': 'wcag_zoo.validators.tarsier.Tarsier',
+}
+
+# The WCAG level of the success criterion each validator checks:
+# 1.1.1 alt text, 2.1.1 keyboard, 2.4.7 focus visible, 1.4.3 contrast, 1.3.1 headings
+VALIDATOR_LEVELS = {
+    'Anteater': 'A',
+    'Ayeaye': 'A',
+    'Glowworm': 'AA',
+    'Molerat': 'AA',
+    'Tarsier': 'A',
+}
+
+WCAG_LEVELS = ['A', 'AA', 'AAA']
+DEFAULT_LEVEL = 'AA'
+
+SECTIONS = ['success', 'failures', 'warnings', 'skipped']
+
+
+@lru_cache(maxsize=None)
+def load_validator(name):
+    """
+    Imports a validator class by name
+
+    Args:
+        name (str): One of VALIDATORS
+
+    Returns:
+        class: The WCAG validator
+    """
+    return import_string(VALIDATORS[name])
+
+
+def default_validators():
+    return list(VALIDATORS)
+
+
+def default_sections():
+    return list(SECTIONS)
+
+
+def applicable_validators(names, level):
+    """
+    Picks the validators that check a success criterion at or below a WCAG level
+
+    Args:
+        names (iterable): Validator names
+        level (str): 'A', 'AA' or 'AAA'
+
+    Returns:
+        list: The names, in the order scans run them
+    """
+    names = set(names)
+    allowed = WCAG_LEVELS[:WCAG_LEVELS.index(level) + 1]
+    return [name for name in VALIDATORS if name in names and VALIDATOR_LEVELS[name] in allowed]
@@ -0,0 +1,350 @@
+import hashlib
+import importlib.util
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .documents import HtmlDocument, decode_html
+from .fetcher import fetch
+from .instrumentation import metrics_registry
+
+RENDERERS = ('http', 'snapshot', 'headless')
+
+# Renderers are kept between scans so a headless pool is only started once per process
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+class RenderUnavailable(requests.exceptions.RequestException):
+    """
+    Raised when a renderer can't produce a page, such as a missing snapshot
+    or a headless render that crashed or timed out
+    """
+
+
+class HttpRenderer:
+    """
+    The server HTML as fetched, without running any JavaScript
+    """
+    name = 'http'
+
+    def render(self, url, conditional=False):
+        """
+        Args:
+            url (str): The page to render
+            conditional (bool): Send the validators of the last fetch, see fetcher.fetch
+
+        Returns:
+            requests.Response: The page
+        """
+        return fetch(url, conditional=conditional)
+
+    def close(self):
+        pass
+
+
+def snapshot_name(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html'
+
+
+def save_snapshot(url, html, directory=None):
+    """
+    Stores a page rendered elsewhere, for the snapshot renderer to scan
+
+    Args:
+        url (str): The URL of the page
+        html (str): The rendered HTML
+        directory (str, optional): Defaults to settings.RENDER_SNAPSHOT_DIR
+
+    Returns:
+        str: The path written
+    """
+    directory = directory or settings.RENDER_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, snapshot_name(url))
+    # Written aside and renamed, so a scan never reads half a snapshot
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        file.write(html)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+class SnapshotRenderer:
+    """
+    Pages rendered ahead of time, by a prerender service or a build step,
+    and stored with save_snapshot or the ingest_snapshots command
+    """
+    name = 'snapshot'
+
+    def __init__(self, directory=None):
+        self.directory = directory or settings.RENDER_SNAPSHOT_DIR
+
+    def render(self, url, conditional=False):
+        path = os.path.join(self.directory, snapshot_name(url))
+        try:
+            with open(path, 'rb') as file:
+                return HtmlDocument(decode_html(file.read()), url)
+        except FileNotFoundError:
+            raise RenderUnavailable(f"No snapshot of {url}")
+
+    def close(self):
+        pass
+
+
+class PlaywrightEngine:
+    """
+    Headless Chromium through Playwright, when it is installed.
+
+    memory_mb caps the JavaScript heap of each page.
+    """
+
+    def __init__(self, memory_mb=None):
+        self.memory_mb = memory_mb
+        self._playwright = None
+        self._browser = None
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec('playwright') is not None
+
+    def start(self):
+        from playwright.sync_api import sync_playwright
+
+        args = [f'--js-flags=--max-old-space-size={self.memory_mb}'] if self.memory_mb else []
+        self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(args=args)
+
+    def render(self, url, timeout):
+        """
+        Loads a page and waits for the network to go quiet
+
+        Returns:
+            tuple: (the final URL, the status code, the rendered HTML)
+        """
+        page = self._browser.new_page()
+        try:
+            response = page.goto(url, timeout=timeout * 1000, wait_until='networkidle')
+            return page.url, response.status if response is not None else 200, page.content()
+        finally:
+            page.close()
+
+    def close(self):
+        if self._browser is not None:
+            self._browser.close()
+        if self._playwright is not None:
+            self._playwright.stop()
+        self._browser = self._playwright = None
+
+
+def process_tree_rss(pid=None):
+    """
+    Returns the resident memory of a process and everything it started, in bytes
+
+    Args:
+        pid (int, optional): Defaults to this process
+
+    Returns:
+        int: The total, or None where /proc isn't available
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    root = pid or os.getpid()
+    parents = {}
+    rss = {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as file:
+                # The command name may hold spaces, so split after its closing bracket
+                fields = file.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(name)] = int(fields[1])
+        rss[int(name)] = int(fields[21]) * page_size
+
+    total = 0
+    pending = [root]
+    while pending:
+        current = pending.pop()
+        total += rss.get(current, 0)
+        pending.extend(child for child, parent in parents.items() if parent == current)
+    return total
+
+
+# The engine of a headless pool worker process, started once and reused for every page
+_engine = None
+
+
+def _start_worker(engine_path, memory_mb):
+    global _engine
+    _engine = import_string(engine_path)(memory_mb=memory_mb)
+    _engine.start()
+
+
+def _warm(index):
+    return os.getpid()
+
+
+def _render_in_worker(url, timeout, memory_mb):
+    page_url, status_code, html = _engine.render(url, timeout)
+    if memory_mb:
+        rss = process_tree_rss()
+        if rss is not None and rss > memory_mb * 1024 * 1024:
+            # Restart a browser that has grown past its cap rather than the whole pool
+            _engine.close()
+            _engine.start()
+    return page_url, status_code, html
+
+
+class HeadlessRenderer:
+    """
+    Renders pages in a locally installed headless browser, running the page's JavaScript.
+
+    The browsers live in a pool of settings.RENDER_WORKERS processes that start
+    their engine once and keep it warm between pages. A page that doesn't
+    finish within settings.RENDER_TIMEOUT seconds, or takes its worker down,
+    raises RenderUnavailable and the pool is restarted. settings.RENDER_MEMORY_MB
+    caps each page's JavaScript heap, and a worker whose browser processes
+    together grow past it restarts its browser after the page.
+    """
+    name = 'headless'
+
+    def __init__(self, engine=None, workers=None, timeout=None, memory_mb=None):
+        self.engine = engine or settings.RENDER_ENGINE
+        self.workers = workers or settings.RENDER_WORKERS
+        self.timeout = timeout or settings.RENDER_TIMEOUT
+        self.memory_mb = settings.RENDER_MEMORY_MB if memory_mb is None else memory_mb
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        """
+        Whether the engine is installed, checked without starting it
+        """
+        try:
+            return import_string(self.engine).available()
+        except ImportError:
+            return False
+
+    def start(self):
+        """
+        Starts the worker pool and its browsers, so the first scans don't wait for them
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_start_worker, initargs=(self.engine, self.memory_mb),
+                )
+            pool = self._pool
+        try:
+            # Each worker runs the initializer before its first task
+            list(pool.map(_warm, range(self.workers)))
+        except BrokenProcessPool as err:
+            self.close()
+            raise RenderUnavailable(f"The headless engine could not start: {err}")
+        return pool
+
+    def render(self, url, conditional=False):
+        pool = self._pool or self.start()
+        try:
+            future = pool.submit(_render_in_worker, url, self.timeout, self.memory_mb)
+            # The engine enforces the timeout itself; this catches a worker that hangs
+            page_url, status_code, html = future.result(timeout=self.timeout + settings.RENDER_TIMEOUT_GRACE)
+        except FutureTimeout:
+            self.close()
+            raise RenderUnavailable(f"Rendering {url} took longer than {self.timeout} seconds")
+        except BrokenProcessPool as err:
+            self.close()
+            raise RenderUnavailable(f"The renderer stopped while rendering {url}: {err}")
+        except Exception as err:
+            raise RenderUnavailable(f"Could not render {url}: {err}")
+
+        document = HtmlDocument(html, page_url)
+        document.status_code = status_code
+        return document
+
+    def close(self):
+        """
+        Stops the pool, killing workers that are stuck on a page
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        # ProcessPoolExecutor has no public way to stop a busy worker
+        for process in list(getattr(pool, '_processes', {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_renderer(name=None):
+    """
+    Returns the shared renderer pages are scanned through
+
+    Args:
+        name (str, optional): 'http', 'snapshot' or 'headless'; defaults to settings.SCAN_RENDERER
+
+    Returns:
+        object: A renderer with render(url, conditional=False) and close(). When the
+            headless engine isn't installed this is the http renderer
+    """
+    name = name or settings.SCAN_RENDERER
+    if name not in RENDERERS:
+        raise ImproperlyConfigured(
+            f"SCAN_RENDERER must be one of {', '.join(RENDERERS)}, not '{name}'"
+        )
+    with _renderers_lock:
+        if name not in _renderers:
+            if name == 'snapshot':
+                renderer = SnapshotRenderer()
+            elif name == 'headless':
+                renderer = HeadlessRenderer()
+                if not renderer.available():
+                    metrics_registry.inc('renderer_fallbacks_total', renderer=name, reason='not_installed')
+                    renderer = HttpRenderer()
+            else:
+                renderer = HttpRenderer()
+            _renderers[name] = renderer
+        return _renderers[name]
+
+
+def render_page(url, conditional=False, renderer=None):
+    """
+    Renders a page to scan with the configured renderer. When it can't, and
+    settings.RENDER_FALLBACK is on, the page is fetched over HTTP instead
+
+    Args:
+        url (str): The page to render
+        conditional (bool): For the http renderer, see fetcher.fetch
+        renderer (str, optional): Overrides settings.SCAN_RENDERER
+
+    Returns:
+        object: A requests.Response or HtmlDocument for check_accessibility
+    """
+    current = get_renderer(renderer)
+    try:
+        return current.render(url, conditional=conditional)
+    except RenderUnavailable:
+        if current.name == 'http' or not settings.RENDER_FALLBACK:
+            raise
+        metrics_registry.inc('renderer_fallbacks_total', renderer=current.name, reason='render_failed')
+        return get_renderer('http').render(url, conditional=conditional)
+
+
+def close_renderers():
+    """
+    Stops any headless pools started for rendering
+    """
+    with _renderers_lock:
+        for renderer in _renderers.values():
+            renderer.close()
+        _renderers.clear()
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import CachedResult
+
+# Bump when the shape of the cached validator output changes
+CACHE_FORMAT = 1
+
+# Packages whose upgrades can change what the validators report
+VERSIONED_PACKAGES = ['wcag-zoo', 'premailer', 'cssutils', 'lxml']
+
+
+def normalize_html(html_content):
+    """
+    Normalizes the parts of a page that don't change the validator output,
+    so the same page served with different line endings shares a cache entry
+
+    Args:
+        html_content (str): The HTML content of the webpage
+
+    Returns:
+        str: The normalized HTML
+    """
+    return html_content.replace('\r\n', '\n').strip()
+
+
+def validator_versions(validators):
+    """
+    Describes the validators and the library versions behind them
+
+    Args:
+        validators (list): The WCAG validator classes in the order they run
+
+    Returns:
+        str: A string that changes whenever the validator output could change
+    """
+    from importlib import metadata
+
+    versions = [f'format={CACHE_FORMAT}']
+    for package in VERSIONED_PACKAGES:
+        try:
+            versions.append(f'{package}=={metadata.version(package)}')
+        except metadata.PackageNotFoundError:
+            versions.append(f'{package}==unknown')
+    versions.extend(f'{Validator.__module__}.{Validator.__name__}' for Validator in validators)
+    return ';'.join(versions)
+
+
+class ResultCache:
+    """
+    Two-tier cache of validator output keyed on the page content.
+
+    A small in-process LRU sits in front of the CachedResult table, which is
+    shared by every worker and trimmed by age and total size.
+    """
+
+    def __init__(self):
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {'memory_hits': 0, 'database_hits': 0, 'misses': 0, 'write_errors': 0}
+
+    def key(self, html_content, validators, level='AA', stylesheets=()):
+        """
+        Returns the cache key for a page run through a list of validators
+
+        Args:
+            html_content (str): The HTML content of the webpage
+            validators (list): The WCAG validator classes in the order they run
+            level (str): The WCAG level the validators ran at
+            stylesheets (iterable): (url, hash) pairs of the linked stylesheets, from
+                ParsedDocument.stylesheet_fingerprints, so a CSS-only change misses
+
+        Returns:
+            str: A sha256 hex digest
+        """
+        digest = hashlib.sha256(f'{validator_versions(validators)};level={level}'.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_html(html_content).encode('utf-8'))
+        for url, fingerprint in stylesheets:
+            digest.update(f'\0{url}={fingerprint}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Looks a key up in memory and then in the database
+
+        Args:
+            key (str): A key from ResultCache.key
+
+        Returns:
+            list: The cached validator results, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return self._memory[key]
+
+        max_age = timezone.now() - timedelta(seconds=settings.RESULT_CACHE_MAX_AGE)
+        entry = CachedResult.objects.filter(key=key, created_at__gte=max_age).first()
+        if entry is None:
+            with self._lock:
+                self.counters['misses'] += 1
+            return None
+
+        CachedResult.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        results = json.loads(entry.results)
+        with self._lock:
+            self.counters['database_hits'] += 1
+            self._remember(key, results)
+        return results
+
+    def set(self, key, results):
+        """
+        Stores validator results in both tiers. The cache is only a shortcut, so
+        a failed database write, such as a locked sqlite file, is counted in
+        write_errors and the results are kept in memory alone
+
+        Args:
+            key (str): A key from ResultCache.key
+            results (list): The results from each validator, in validator order
+        """
+        serialized = json.dumps(results)
+        try:
+            CachedResult.objects.update_or_create(
+                key=key,
+                defaults={
+                    'results': serialized,
+                    'size': len(serialized),
+                    'created_at': timezone.now(),
+                    'last_used_at': timezone.now(),
+                },
+            )
+        except DatabaseError:
+            with self._lock:
+                self.counters['write_errors'] += 1
+                self._remember(key, results)
+            return
+        with self._lock:
+            self._remember(key, results)
+            self._writes += 1
+            evict_now = self._writes % settings.RESULT_CACHE_EVICT_EVERY == 0
+        if evict_now:
+            self.evict()
+
+    def _remember(self, key, results):
+        self._memory[key] = results
+        self._memory.move_to_end(key)
+        while len(self._memory) > settings.RESULT_CACHE_MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def evict(self):
+        """
+        Deletes database entries older than RESULT_CACHE_MAX_AGE, then the least
+        recently used entries until the table fits in RESULT_CACHE_MAX_BYTES
+
+        Returns:
+            int: The number of entries deleted
+        """
+        max_age = timezone.now() - timedelta(seconds=settings.RESULT_CACHE_MAX_AGE)
+        deleted, _ = CachedResult.objects.filter(created_at__lt=max_age).delete()
+
+        total = CachedResult.objects.aggregate(total=Sum('size'))['total'] or 0
+        excess = total - settings.RESULT_CACHE_MAX_BYTES
+        if excess > 0:
+            stale = []
+            for pk, size in CachedResult.objects.order_by('last_used_at').values_list('pk', 'size').iterator():
+                stale.append(pk)
+                excess -= size
+                if excess <= 0:
+                    break
+            for start in range(0, len(stale), 500):
+                deleted += CachedResult.objects.filter(pk__in=stale[start:start + 500]).delete()[0]
+        return deleted
+
+    def clear(self):
+        """
+        Empties both tiers and resets the counters
+        """
+        CachedResult.objects.all().delete()
+        with self._lock:
+            self._memory.clear()
+            self.counters = {key: 0 for key in self.counters}
+
+    def stats(self):
+        """
+        Returns the hit and miss counters for this process with the size of each tier
+
+        Returns:
+            dict: Counters, hit rate and tier sizes
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['database_hits'] + stats['misses']
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0.0
+
+        database = CachedResult.objects.aggregate(total=Sum('size'), hits=Sum('hits'))
+        stats['database_entries'] = CachedResult.objects.count()
+        stats['database_bytes'] = database['total'] or 0
+        stats['database_hits_all_workers'] = database['hits'] or 0
+        return stats
+
+
+result_cache = ResultCache()
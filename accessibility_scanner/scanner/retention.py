@@ -0,0 +1,175 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .exports import scan_json_chunks
+from .models import AccessibilityResult, Finding, ScanRollup
+
+ROLLUP_COUNTS = ['success_count', 'failure_count', 'warning_count', 'skipped_count']
+FINDING_COPY_FIELDS = [
+    'section_type', 'guideline', 'technique', 'message', 'error_code', 'xpath', 'classes', 'element_id',
+    'fingerprint',
+]
+
+
+def materialize(scan):
+    """
+    Stores every finding of an incremental scan on the scan itself, so the
+    scans it builds on can be deleted. Scans that build on this one keep
+    replaying their changes over it. A scan another process materialized
+    first is left as it is
+
+    Args:
+        scan (AccessibilityResult): A scan with a base_scan
+    """
+    findings = list(scan.current_findings())
+    with transaction.atomic():
+        # Claim the scan first, so two processes can't both copy its findings
+        claimed = (
+            AccessibilityResult.objects
+            .filter(pk=scan.pk, base_scan_id=scan.base_scan_id)
+            .update(base_scan=None, chain_length=0)
+        )
+        if claimed:
+            scan.findings.all().delete()
+            copies = (
+                Finding(scan=scan, **{field: getattr(finding, field) for field in FINDING_COPY_FIELDS})
+                for finding in findings
+            )
+            Finding.objects.bulk_create(copies, batch_size=settings.FINDINGS_BATCH_SIZE)
+    scan.base_scan = None
+    scan.chain_length = 0
+
+
+def rollup(scan_ids):
+    """
+    Adds scans to the per-URL, per-day ScanRollup rows
+
+    Args:
+        scan_ids (list): The scans to add; each must only be rolled up once
+
+    Returns:
+        int: The number of rollup rows touched
+    """
+    groups = (
+        AccessibilityResult.objects.filter(id__in=scan_ids)
+        .annotate(day=TruncDate('timestamp'), profile_name=Coalesce('profile__name', Value('')))
+        .values('url', 'day', 'profile_name', 'user')
+        .annotate(
+            scans=Count('id'),
+            max_failures=Max('failure_count'),
+            serif_fonts=Count('id', filter=Q(serif_font_check__startswith='Serif font found')),
+            first_scan=Min('timestamp'),
+            last_scan=Max('timestamp'),
+            **{f'total_{field}': Sum(field) for field in ROLLUP_COUNTS},
+        )
+    )
+    touched = 0
+    for group in groups:
+        summary, created = ScanRollup.objects.select_for_update().get_or_create(
+            url=group['url'], day=group['day'], profile_name=group['profile_name'], user_id=group['user'],
+            defaults={'first_scan_at': group['first_scan'], 'last_scan_at': group['last_scan']},
+        )
+        summary.scan_count += group['scans']
+        for field in ROLLUP_COUNTS:
+            setattr(summary, field, getattr(summary, field) + group[f'total_{field}'])
+        summary.max_failure_count = max(summary.max_failure_count, group['max_failures'])
+        summary.serif_font_scans += group['serif_fonts']
+        summary.first_scan_at = min(summary.first_scan_at, group['first_scan'])
+        summary.last_scan_at = max(summary.last_scan_at, group['last_scan'])
+        summary.save()
+        touched += 1
+    return touched
+
+
+def archive(scans, directory):
+    """
+    Writes scans, with every finding, to a gzipped JSON lines file before they are deleted
+
+    Args:
+        scans (list): AccessibilityResult rows, newest first so the scans they build on still exist
+        directory (str): Where to write the file
+
+    Returns:
+        str: The path written
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"scans-{scans[-1].pk}-{scans[0].pk}-{timezone.now().strftime('%Y%m%dT%H%M%S%f')}.jsonl.gz"
+    path = os.path.join(directory, name)
+    with gzip.open(path, 'wb') as file:
+        for scan in scans:
+            header = {
+                'id': scan.pk,
+                'url': scan.url,
+                'timestamp': scan.timestamp.isoformat(),
+                'profile': scan.profile.name if scan.profile is not None else None,
+                'timings': scan.timings,
+            }
+            # The results are spliced in from the export stream rather than built in memory
+            file.write(json.dumps(header)[:-1].encode('utf-8') + b', "results": ')
+            for chunk in scan_json_chunks(scan):
+                file.write(chunk)
+            file.write(b'}\n')
+    return path
+
+
+def prune_scans(keep_days=None, batch_size=None, archive_dir=None, pause=0):
+    """
+    Rolls scans older than keep_days up into ScanRollup rows and deletes them with their findings.
+
+    Scans are deleted newest first, batch_size at a time, each batch in a
+    transaction of its own so the tables are never locked for long. A kept
+    incremental scan that builds on a scan being deleted is materialized
+    first, as base_scan protects the scans others build on.
+
+    Args:
+        keep_days (int, optional): Days of scans kept in full; defaults to settings.RETENTION_DAYS
+        batch_size (int, optional): Scans per batch; defaults to settings.RETENTION_BATCH_SIZE
+        archive_dir (str, optional): Archive each batch to gzipped JSON lines here before deleting it
+        pause (float): Seconds to sleep between batches, to leave room for other writers
+
+    Returns:
+        dict: The number of scans and findings deleted, rollup rows touched and scans materialized
+    """
+    keep_days = settings.RETENTION_DAYS if keep_days is None else keep_days
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    stats = {'scans': 0, 'findings': 0, 'rollups': 0, 'materialized': 0}
+
+    while True:
+        scans = list(
+            AccessibilityResult.objects.filter(timestamp__lt=cutoff)
+            .select_related('profile')
+            .order_by('-timestamp', '-id')[:batch_size]
+        )
+        if not scans:
+            return stats
+        scan_ids = [scan.pk for scan in scans]
+
+        # Newer scans that build on this batch and aren't in it: the kept scans
+        # at the boundary, or ones saved since this run started
+        for dependent in AccessibilityResult.objects.filter(base_scan_id__in=scan_ids).exclude(id__in=scan_ids):
+            materialize(dependent)
+            stats['materialized'] += 1
+
+        if archive_dir:
+            archive(scans, archive_dir)
+
+        with transaction.atomic():
+            stats['rollups'] += rollup(scan_ids)
+            stats['findings'] += Finding.objects.filter(scan_id__in=scan_ids).delete()[0]
+            # Within the batch, deltas go with the scans they build on
+            AccessibilityResult.objects.filter(id__in=scan_ids).update(base_scan=None)
+            deleted = AccessibilityResult.objects.filter(id__in=scan_ids).delete()[1]
+            stats['scans'] += deleted.get(AccessibilityResult._meta.label, 0)
+
+        if pause:
+            time.sleep(pause)
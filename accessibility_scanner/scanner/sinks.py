@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .findings import json_default
+from .instrumentation import Measurement
+from .utils import save_accessibility_result, save_accessibility_results
+
+RESULT_SINKS = ('database', 'file', 'none')
+
+
+class DatabaseSink:
+    """
+    Saves each scan and its findings as soon as it is written
+    """
+
+    def write(self, results, url, timings=None, profile=None, user=None):
+        """
+        Stores the results of one scan
+
+        Args:
+            results (dict): The results from check_accessibility
+            url (str): The scanned URL
+            timings (dict, optional): The ScanMetrics timings of the scan
+            profile (ScanProfile, optional): The profile the scan used
+            user (User, optional): The user who ran the scan
+
+        Returns:
+            AccessibilityResult: The saved scan
+        """
+        return save_accessibility_result(results, url, timings, profile, user)
+
+    def close(self):
+        pass
+
+
+class BatchedDatabaseSink:
+    """
+    Buffers scans and saves them in one transaction per `batch_size` scans,
+    for crawls where committing every page separately dominates the write time.
+
+    Buffered scans aren't saved until the batch fills or the sink is closed,
+    so write returns None. The crawler writes from several threads, so the
+    buffer is guarded by a lock.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.RESULT_SINK_BATCH_SIZE
+        self.saved = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def write(self, results, url, timings=None, profile=None, user=None):
+        with self._lock:
+            self._buffer.append((results, url, timings, profile, user))
+            if len(self._buffer) < self.batch_size:
+                return None
+            batch, self._buffer = self._buffer, []
+        self._save(batch)
+        return None
+
+    def flush(self):
+        """
+        Saves whatever is buffered
+
+        Returns:
+            list: The AccessibilityResult rows that were saved
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        return self._save(batch)
+
+    def close(self):
+        self.flush()
+
+    def _save(self, batch):
+        if not batch:
+            return []
+        with Measurement({}, 'persist_batch', metric='stage'):
+            scans = save_accessibility_results(batch)
+        with self._lock:
+            self.saved += len(scans)
+        return scans
+
+
+class FileSink:
+    """
+    Writes each scan as a JSON file in `directory` instead of the database
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or settings.RESULT_SINK_DIR
+
+    def write(self, results, url, timings=None, profile=None, user=None):
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = timezone.now()
+        name = f"{timestamp.strftime('%Y%m%dT%H%M%S%f')}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.json"
+        with open(os.path.join(self.directory, name), 'w') as file:
+            json.dump({
+                'url': url,
+                'timestamp': timestamp.isoformat(),
+                'profile': profile.name if profile is not None else None,
+                'user': user.get_username() if user is not None else None,
+                'timings': timings,
+                'results': results,
+            }, file, default=json_default)
+        return None
+
+    def close(self):
+        pass
+
+
+class NullSink:
+    """
+    Discards results, for benchmarks and dry runs
+    """
+
+    def write(self, results, url, timings=None, profile=None, user=None):
+        return None
+
+    def close(self):
+        pass
+
+
+def get_result_sink(name=None, batch_size=None):
+    """
+    Returns the sink scans are persisted through
+
+    Args:
+        name (str, optional): 'database', 'file' or 'none'; defaults to settings.RESULT_SINK
+        batch_size (int, optional): Buffer database writes into batches of this many scans
+
+    Returns:
+        object: A sink with write(results, url, timings, profile, user) and close()
+    """
+    name = name or settings.RESULT_SINK
+    if name not in RESULT_SINKS:
+        raise ImproperlyConfigured(
+            f"RESULT_SINK must be one of {', '.join(RESULT_SINKS)}, not '{name}'"
+        )
+    if name == 'file':
+        return FileSink()
+    if name == 'none':
+        return NullSink()
+    if batch_size:
+        return BatchedDatabaseSink(batch_size)
+    return DatabaseSink()
+
+
+def dump_results(results, scan=None):
+    """
+    Writes a scan's results to settings.SCAN_DEBUG_DUMP_DIR for debugging
+
+    Args:
+        results (dict): The results from check_accessibility
+        scan (AccessibilityResult, optional): The saved scan, whose id names the file
+
+    Returns:
+        str: The path written
+    """
+    os.makedirs(settings.SCAN_DEBUG_DUMP_DIR, exist_ok=True)
+    if scan is not None and scan.pk:
+        name = f'scan-{scan.pk}.json'
+    else:
+        # Not saved yet, e.g. buffered by a batched sink
+        name = f"scan-{timezone.now().strftime('%Y%m%dT%H%M%S%f')}-{threading.get_ident()}.json"
+    path = os.path.join(settings.SCAN_DEBUG_DUMP_DIR, name)
+    with open(path, 'w') as file:
+        json.dump(results, file, default=json_default)
+    return path
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+
+from .fetcher import fetch
+from .fonts import parse_stylesheet
+
+
+# Loads of the same URL are serialized on one of a fixed set of locks, so the
+# locks don't grow with the number of URLs a long-running worker has seen
+URL_LOCK_STRIPES = 64
+
+
+class StylesheetUnavailable(requests.exceptions.RequestException):
+    """
+    Raised for a stylesheet that failed to load recently, without trying it again
+    """
+
+
+class StylesheetCache:
+    """
+    Stylesheets shared by every scan in the process, keyed by absolute URL and ETag.
+
+    Each entry holds the CSS text, which Premailer inlines for the validators,
+    and the rules parsed for the font check. Entries live in an in-memory LRU
+    of at most STYLESHEET_CACHE_MEMORY_BYTES and in one file per URL under
+    STYLESHEET_CACHE_DIR, trimmed oldest-used first to STYLESHEET_CACHE_DISK_BYTES,
+    so worker processes and restarts share the downloads.
+
+    An entry older than STYLESHEET_CACHE_MAX_AGE seconds is revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged stylesheet costs a 304
+    instead of a download and parse. Failed loads are remembered in memory for
+    the same time, so a missing stylesheet linked from every page isn't
+    requested for each one. Concurrent requests for the same URL wait for the
+    first one rather than downloading it again; the URLs share URL_LOCK_STRIPES
+    locks between them.
+    """
+
+    def __init__(self):
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._url_locks = [threading.Lock() for _ in range(URL_LOCK_STRIPES)]
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'revalidated': 0, 'downloads': 0}
+
+    def get_text(self, url):
+        """
+        Returns the text of a stylesheet
+
+        Args:
+            url (str): The absolute stylesheet URL
+
+        Returns:
+            str: The CSS
+        """
+        return self.get(url)['text']
+
+    def get_rules(self, url):
+        """
+        Returns the parsed rules of a stylesheet
+
+        Args:
+            url (str): The absolute stylesheet URL
+
+        Returns:
+            tuple: (rules, imports) as from fonts.parse_stylesheet
+        """
+        entry = self.get(url)
+        return [tuple(rule) for rule in entry['rules']], entry['imports']
+
+    def get(self, url):
+        """
+        Looks a stylesheet up in memory, then on disk, then downloads it
+
+        Args:
+            url (str): The absolute stylesheet URL
+
+        Returns:
+            dict: The entry with url, etag, last_modified, text, rules, imports, checked_at and size
+        """
+        with self._url_locks[hash(url) % URL_LOCK_STRIPES]:
+            entry = self._from_memory(url)
+            if entry is None:
+                entry = self._from_disk(url)
+                if entry is not None:
+                    self._count('disk_hits')
+                    self._remember(entry)
+            else:
+                self._count('memory_hits')
+
+            if entry is not None and time.time() - entry['checked_at'] < settings.STYLESHEET_CACHE_MAX_AGE:
+                if 'error' in entry:
+                    raise StylesheetUnavailable(entry['error'])
+                return entry
+            if entry is not None and 'error' in entry:
+                entry = None
+            try:
+                return self._download(url, entry)
+            except requests.exceptions.RequestException as err:
+                self._remember({'url': url, 'error': str(err), 'checked_at': time.time(), 'size': len(url)})
+                raise
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _download(self, url, entry):
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = fetch(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self._count('revalidated')
+            entry = dict(entry, checked_at=time.time())
+        else:
+            response.raise_for_status()
+            self._count('downloads')
+            text = response.text
+            rules, imports = parse_stylesheet(text)
+            entry = {
+                'url': url,
+                'etag': response.headers.get('ETag', ''),
+                'last_modified': response.headers.get('Last-Modified', ''),
+                'text': text,
+                'rules': rules,
+                'imports': imports,
+                'checked_at': time.time(),
+                'size': len(text.encode('utf-8')) + sum(len(selector) + len(body) for selector, body in rules),
+            }
+        self._remember(entry)
+        self._write_disk(entry)
+        return entry
+
+    def _from_memory(self, url):
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+            return entry
+
+    def _remember(self, entry):
+        with self._lock:
+            previous = self._memory.pop(entry['url'], None)
+            if previous is not None:
+                self._memory_bytes -= previous['size']
+            self._memory[entry['url']] = entry
+            self._memory_bytes += entry['size']
+            while self._memory_bytes > settings.STYLESHEET_CACHE_MEMORY_BYTES and len(self._memory) > 1:
+                url, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted['size']
+
+    def _path(self, url):
+        return os.path.join(settings.STYLESHEET_CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _from_disk(self, url):
+        path = self._path(url)
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+            # Touch the file so disk eviction drops the least recently used first
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def _write_disk(self, entry):
+        os.makedirs(settings.STYLESHEET_CACHE_DIR, exist_ok=True)
+        path = self._path(entry['url'])
+        # Write then rename, so other processes never read a half-written file
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(entry, file)
+        os.replace(temporary, path)
+        self.evict_disk()
+
+    def evict_disk(self):
+        """
+        Deletes the least recently used files until the cache directory fits in STYLESHEET_CACHE_DISK_BYTES
+
+        Returns:
+            int: The number of files deleted
+        """
+        try:
+            files = [
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in os.scandir(settings.STYLESHEET_CACHE_DIR)
+                if entry.name.endswith('.json')
+            ]
+        except OSError:
+            return 0
+
+        excess = sum(size for mtime, size, path in files) - settings.STYLESHEET_CACHE_DISK_BYTES
+        deleted = 0
+        for mtime, size, path in sorted(files):
+            if excess <= 0:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            excess -= size
+            deleted += 1
+        return deleted
+
+    def clear(self, disk=True):
+        """
+        Empties the memory tier, and the disk tier unless disk=False
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self.counters = {key: 0 for key in self.counters}
+        if disk and os.path.isdir(settings.STYLESHEET_CACHE_DIR):
+            for entry in os.scandir(settings.STYLESHEET_CACHE_DIR):
+                if entry.name.endswith('.json'):
+                    os.remove(entry.path)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+        return stats
+
+
+stylesheet_cache = StylesheetCache()
@@ -1,15 +1,63 @@
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.contrib.auth.models import User
 from unittest.mock import patch, MagicMock
-from .models import AccessibilityResult
+from .models import AccessibilityResult, ScanJob, FetchedPage
+from .fetcher import fetch, get_session, record_fetch, ResponseTooLarge
+from .models import CachedResult, Finding, ScanProfile, ScanRollup
+from .forms import UrlForm
+from .result_cache import ResultCache, result_cache
+from .jobs import claim_next_job, run_scan_job, enqueue_crawl, enqueue_scan, enqueue_scans, normalize_url, prewarm
+from .crawler import Crawler, parse_sitemap, extract_links
+from django.core.management import call_command, CommandError
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, OperationalError
+from django.db.models import ProtectedError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import asyncio
 import json
 import requests
 import re
 import unittest
 from unittest.mock import patch, MagicMock
-from datetime import datetime
-from .wcag_script import run_validator, check_accessibility, check_for_serif_fonts
-#from .utils import save_accessibility_result
+from datetime import datetime, timedelta, timezone as dt_timezone
+import csv
+import gzip
+import io
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+import time
+from django.utils import timezone
+from .wcag_script import run_validator, check_accessibility, check_for_serif_fonts, FindingStream
+from .wcag_script import Anteater, Ayeaye, Glowworm, Molerat, Tarsier
+from .pipeline import ParsedDocument, SerialExecutor, get_executor, shutdown_executors
+from django.core.exceptions import ImproperlyConfigured
+from .utils import save_accessibility_result
+from .wcag_checker import run_access_scan
+from .sinks import BatchedDatabaseSink, FileSink, NullSink, get_result_sink
+from .fonts import analyse_fonts, parse_stylesheet
+from .stylesheets import URL_LOCK_STRIPES, StylesheetCache, stylesheet_cache
+from .instrumentation import MetricsRegistry, ScanMetrics, metrics_registry
+from .benchmark import generate_page, run_benchmark, compare_reports, measure_startup
+from .exports import scan_json_chunks
+from .findings import json_default
+from .retention import prune_scans
+from .views import scan_trend
+from .documents import SiteDirectory, open_site
+from .local_scan import scan_site
+from .renderers import (
+    HeadlessRenderer, HttpRenderer, RenderUnavailable, SnapshotRenderer, close_renderers, get_renderer,
+    render_page, save_snapshot,
+)
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 #################################################
 # views.py tests
@@ -19,40 +67,84 @@ class ViewsTestCase(TestCase):
     def setUp(self):
         self.client = Client()
 
-    @patch('scanner.views.requests.get')
-    @patch('scanner.views.run_access_scan')
-    @patch('scanner.wcag_script.save_accessibility_result')
-    def test_check_url_success(self, mock_save_result, mock_run_scan, mock_requests_get):
+    def test_check_url_queues_job(self):
         '''
-        Creates a mock successful request and then checks the functionality of checking the
-        url
+        Posts a url and checks that a scan job is queued and returned straight away
         '''
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_requests_get.return_value = mock_response
-
-        mock_scan_result = {'result': 'scan_data'}
-        mock_run_scan.return_value = mock_scan_result
-
         response = self.client.post(reverse('check_url'), {'url': 'http://example.com'})
+
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'scanner/check_url.html')
-        self.assertIn('results', response.context)
-        self.assertEqual(response.context['results'], mock_scan_result)
+        job = response.context['job']
+        self.assertEqual(job.url, 'http://example.com')
+        self.assertEqual(job.status, ScanJob.QUEUED)
+        self.assertContains(response, reverse('scan_status', args=[job.id]))
 
-    @patch('scanner.views.requests.get')
-    def test_check_url_invalid_request(self, mock_requests_get):
+    def test_scan_status_done(self):
         '''
-        This test creates a mock failed request and then attempts to check the results
+        Checks that the status endpoint returns the results of a finished job
         '''
-        mock_requests_get.side_effect = requests.exceptions.RequestException("Request failed")
+        result = save_accessibility_result({'failures': []}, "http://example.com")
+        job = ScanJob.objects.create(url="http://example.com", status=ScanJob.DONE, result=result)
 
-        response = self.client.post(reverse('check_url'), {'url': 'http://example.com'})
+        response = self.client.get(reverse('scan_status', args=[job.id]))
 
         self.assertEqual(response.status_code, 200)
-        self.assertIn('results', response.context)
-        self.assertIn('error', response.context['results'])
-        self.assertIn("Could not fetch the URL", response.context['results']['error'])
+        self.assertEqual(response.json()['status'], 'done')
+        self.assertEqual(response.json()['results'], {
+            'success': [], 'failures': [], 'warnings': [], 'skipped': [], 'serif_font_check': []
+        })
+
+    def test_scan_status_queued(self):
+        '''
+        Checks that a queued job is reported without results
+        '''
+        job = ScanJob.objects.create(url="http://example.com")
+
+        response = self.client.get(reverse('scan_status', args=[job.id]))
+
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertNotIn('results', response.json())
+        self.assertEqual(response['Retry-After'], '2')
+
+        # The wait is capped, so a poll never holds a web worker for long
+        start = time.monotonic()
+        response = self.client.get(reverse('scan_status', args=[job.id]), {'wait': 60})
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(response.json()['retry_after'], 2)
+
+    def test_scan_status_unknown_job(self):
+        '''
+        Checks that an unknown job id is a 404
+        '''
+        response = self.client.get(reverse('scan_status', args=[999]))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_views_hide_other_users_scans(self):
+        '''
+        Checks job status, changes and exports only show the request's own scans
+        '''
+        owner = User.objects.create_user(username='owner', password='password')
+        rows = [{'section_type': 'failures', 'error_code': 'private', 'xpath': '/img'}]
+        scan = save_accessibility_result({'failures': rows}, 'http://example.com', user=owner)
+        job = ScanJob.objects.create(url='http://example.com', user=owner)
+        other = User.objects.create_user(username='other', password='password')
+
+        for user in (None, other):
+            if user is not None:
+                self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('scan_status', args=[job.id])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('scan_changes_for_scan', args=[scan.id])).status_code, 404)
+            for params in ({}, {'scan': scan.id}):
+                response = self.client.get(reverse('export_results'), params)
+                self.assertNotIn(b'private', b''.join(response.streaming_content))
+
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(reverse('scan_status', args=[job.id])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('scan_changes_for_scan', args=[scan.id])).status_code, 200)
+        response = self.client.get(reverse('export_results'), {'scan': scan.id})
+        self.assertIn(b'private', b''.join(response.streaming_content))
 
     def test_dashboard_no_results(self):
         '''
@@ -75,16 +167,13 @@ class ViewsTestCase(TestCase):
         This test creates a mock entry int eh database and then tests the dashboard view
         with these results
         '''
-        AccessibilityResult.objects.create(
-            url="http://example.com",
-            json_response=json.dumps({
-                "failures": [{"section_type": "failures", "message": "Example failure"}],
-                "warnings": [{"section_type": "warnings", "message": "Example warning"}],
-                "success": [{"section_type": "success", "message": "Example success"}],
-                "skipped": [{"section_type": "skipped", "message": "Example skipped"}],
-                "serif_font_check": ["No serif fonts found in url."]
-            })
-        )
+        save_accessibility_result({
+            "failures": [{"section_type": "failures", "message": "Example failure"}],
+            "warnings": [{"section_type": "warnings", "message": "Example warning"}],
+            "success": [{"section_type": "success", "message": "Example success"}],
+            "skipped": [{"section_type": "skipped", "message": "Example skipped"}],
+            "serif_font_check": ["No serif fonts found in url."]
+        }, "http://example.com")
 
         response = self.client.get(reverse('dashboard'))
 
@@ -99,6 +188,45 @@ class ViewsTestCase(TestCase):
         self.assertEqual(response.context['skipped_example'], "Example skipped")
         self.assertEqual(response.context['serif_font_check'], "No serif fonts found in url.")
 
+    def test_dashboard_reads_stored_summary(self):
+        '''
+        Checks the dashboard renders from the stored counts without loading any findings
+        '''
+        save_accessibility_result({
+            "failures": [{"section_type": "failures", "message": "Missing alt - /html/body/img"}] * 3,
+            "serif_font_check": ["No serif fonts found in url."]
+        }, "http://example.com")
+
+        # The latest scan, the trend scans and the rolled up days before them
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.context['failure_count'], 3)
+        self.assertEqual(response.context['failure_example'], "Missing alt")
+        self.assertEqual(response.context['success_example'], "No successful elements recorded")
+
+    def test_dashboard_trend(self):
+        '''
+        Saves several scans of a url and checks the trend lists them oldest first
+        '''
+        for failures in [3, 1, 2]:
+            save_accessibility_result({
+                "failures": [{"section_type": "failures", "message": "Example failure"}] * failures,
+            }, "http://example.com")
+        save_accessibility_result({}, "http://other.com")
+
+        response = self.client.get(reverse('dashboard_trend'), {'url': 'http://example.com'})
+
+        scans = response.json()['scans']
+        self.assertEqual([scan['failure_count'] for scan in scans], [3, 1, 2])
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['trend']), 1)
+
+        # Limits are clamped to at least one scan
+        response = self.client.get(reverse('dashboard_trend'), {'url': 'http://example.com', 'limit': '-5'})
+        self.assertEqual([scan['failure_count'] for scan in response.json()['scans']], [2])
+
     def test_download_json_no_results(self):
         '''
         This test checks that attempting to download a json file with no results creates
@@ -114,203 +242,2459 @@ class ViewsTestCase(TestCase):
         Creates mock results in the database and then tests the functionality of downloading
         the json file
         '''
-        AccessibilityResult.objects.create(
-            url="http://example.com",
-            json_response=json.dumps({
-                "failures": [{"section_type": "failures", "message": "Example failure"}]
-            })
-        )
+        save_accessibility_result({
+            "failures": [{"section_type": "failures", "message": "Example failure"}]
+        }, "http://example.com")
 
         response = self.client.get(reverse('download_json'))
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Disposition'], 'attachment; filename="accessibility_results.json"')
         self.assertEqual(response['Content-Type'], 'application/json')
-        self.assertIn("Example failure", response.content.decode('utf-8'))
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn("Example failure", content)
+        self.assertEqual(json.loads(content)['failures'][0]['message'], "Example failure")
+
+    def test_scans_belong_to_user(self):
+        '''
+        Checks a signed in user's scans are queued and saved as theirs, and that the
+        dashboard and download only show a visitor their own scans
+        '''
+        user = User.objects.create_user('alice', password='password')
+        save_accessibility_result({}, "http://anonymous.com")
+        self.client.force_login(user)
+
+        response = self.client.post(reverse('check_url'), {'url': 'http://example.com'})
+        job = response.context['job']
+        self.assertEqual(job.user, user)
+        # The same page for another user is a scan of its own
+        self.assertNotEqual(enqueue_scan('http://example.com').pk, job.pk)
+
+        save_accessibility_result({}, "http://example.com", user=user)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['url'], "http://example.com")
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('dashboard')).context['url'], "http://anonymous.com")
+
+    def test_scan_history(self):
+        '''
+        Checks the history lists only the user's scans, newest first, and pages through them
+        '''
+        user = User.objects.create_user('alice', password='password')
+        other = User.objects.create_user('bob', password='password')
+        for index in range(5):
+            save_accessibility_result({}, f"http://example.com/{index % 2}", user=user)
+        save_accessibility_result({}, "http://example.com/0", user=other)
+
+        self.assertRedirects(self.client.get(reverse('scan_history')), reverse('login') + '?next=/history/')
+        self.client.force_login(user)
+
+        with override_settings(HISTORY_PAGE_SIZE=2):
+            urls = []
+            response = self.client.get(reverse('scan_history'))
+            while True:
+                urls.extend(scan['url'] for scan in response.context['scans'])
+                if not response.context['next_page']:
+                    break
+                response = self.client.get(reverse('scan_history') + response.context['next_page'])
+
+        self.assertEqual(urls, [f"http://example.com/{index % 2}" for index in reversed(range(5))])
+        response = self.client.get(reverse('scan_history'), {'url': 'http://example.com/0'})
+        self.assertEqual(len(response.context['scans']), 3)
 
 ###############################
-# wcag_script.py tests
+# utils.py tests
 
-class AccessibilityTests(unittest.TestCase):
+class SaveAccessibilityResultTestCase(TestCase):
 
-    @patch('scanner.wcag_script.Anteater')
-    def test_run_validator_success(self, MockAnteater):
+    @override_settings(FINDINGS_BATCH_SIZE=2)
+    def test_findings_saved_in_batches(self):
         '''
-        Testing Anteater validator
+        Saves a scan with more rows than the batch size and checks every row becomes a Finding
         '''
-        mock_validator_instance = MockAnteater.return_value
-        mock_validator_instance.validate_document.return_value = {
-            'failures': {
-                'guideline1': {
-                    'technique1': [
-                        {'message': 'Example failure', 'error_code': 'E1'}
-                    ]
-                }
-            }
+        results = {
+            'success': [{'section_type': 'success', 'guideline': '1.3.1', 'technique': 'H42',
+                         'xpath': '/html/body/h%d' % level} for level in range(1, 6)],
+            'failures': [{'section_type': 'failures', 'guideline': '1.1.1', 'technique': 'H37',
+                          'message': 'Missing alt', 'error_code': 'anteater-1', 'xpath': '/html/body/img',
+                          'classes': 'logo', 'id': 'main-logo'}],
+            'serif_font_check': ['Serif font found in url.'],
         }
 
-        html_content = "<html><body>Test</body></html>"
-        result = run_validator(MockAnteater, html_content)
+        with patch('scanner.models.Finding.objects.bulk_create', wraps=Finding.objects.bulk_create) as mock_bulk_create:
+            scan = save_accessibility_result(results, 'http://example.com')
 
-        self.assertIn('failures', result)
-        self.assertEqual(result['failures']['guideline1']['technique1'][0]['message'], 'Example failure')
-        mock_validator_instance.validate_document.assert_called_once()
+        self.assertEqual(mock_bulk_create.call_count, 3)
+        self.assertEqual(scan.findings.count(), 6)
+        self.assertEqual(scan.findings.filter(section_type='failures').get().element_id, 'main-logo')
 
-    @patch('scanner.wcag_script.requests.get')
-    @patch('scanner.wcag_script.save_accessibility_result')
-    @patch('scanner.wcag_script.run_validator')
-    def test_check_accessibility_with_issues(self, mock_run_validator, mock_save_accessibility_result, mock_requests_get):
+    def test_as_results_round_trip(self):
         '''
-        Creating a bad validator response and checking the function returns the expected result
+        Checks a saved scan rebuilds the rows check_accessibility produced
         '''
-        mock_response = MagicMock()
-        mock_response.text = "<html><body>Example content</body></html>"
-        mock_response.url = "http://example.com"
+        row = {'section_type': 'warnings', 'guideline': '2.1.1', 'technique': 'G202', 'message': 'No keys',
+               'error_code': 'ayeaye-3-warning', 'xpath': '/html/body', 'classes': None, 'id': None}
 
-        mock_requests_get.return_value = mock_response
+        scan = save_accessibility_result({'warnings': [row], 'serif_font_check': ['x']}, 'http://example.com')
+        results = scan.as_results()
 
-        mock_run_validator.return_value = {
-            'failures': {
-                'guideline1': {
-                    'technique1': [
-                        {'message': 'Failure message', 'error_code': 'F1', 'xpath': '//div'}
-                    ]
-                }
-            },
-            'warnings': {},
-            'skipped': {}
-        }
+        self.assertEqual(results['warnings'][0], dict(row, datetime=scan.timestamp.isoformat(), url='http://example.com'))
+        self.assertEqual(results['serif_font_check'], ['x'])
+        self.assertEqual(results['failures'], [])
 
-        result = check_accessibility(mock_response)
-        #print(json.dumps(result, indent=2))
+###############################
+# sinks.py tests
 
+class ResultSinkTestCase(TestCase):
 
-        self.assertIn('failures', result)
-        self.assertEqual(len(result['failures']), 5)
-        self.assertEqual(result['failures'][0]['message'], 'Failure message')
+    results = {
+        'failures': [{'section_type': 'failures', 'message': 'Missing alt', 'error_code': 'anteater-1'}],
+        'serif_font_check': ['No serif fonts found in url.'],
+    }
 
+    @patch('scanner.wcag_checker.check_accessibility')
+    def test_run_access_scan_saves_once(self, mock_check_accessibility):
+        '''
+        Checks a scan is saved once through the sink and no debug dump is written by default
+        '''
+        mock_check_accessibility.return_value = self.results
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(SCAN_DEBUG_DUMP_DIR=directory):
+                scan = run_access_scan(MagicMock(url='http://example.com'))
+            self.assertEqual(os.listdir(directory), [])
 
-        mock_save_accessibility_result.assert_called_once_with(result, "http://example.com")
+        self.assertEqual(AccessibilityResult.objects.get(), scan)
+        self.assertEqual(scan.findings.get().error_code, 'anteater-1')
+        self.assertFalse(os.path.exists('sample.json'))
 
-    @patch('scanner.wcag_script.save_accessibility_result')
-    def test_check_accessibility_no_issues(self, mock_save_accessibility_result):
-        """
-        Test the accessibility check when no issues are found in the response.
-        """
-        # Create a mock response with valid HTML content and a URL
-        mock_response = MagicMock()
-        mock_response.text = "<html><body>No issues here</body></html>"
-        mock_response.url = "http://example.com"
+    @patch('scanner.wcag_checker.check_accessibility')
+    def test_debug_dump_per_scan(self, mock_check_accessibility):
+        '''
+        Checks the opt-in debug dump is written to a file named after the scan id
+        '''
+        mock_check_accessibility.return_value = self.results
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(SCAN_DEBUG_DUMP=True, SCAN_DEBUG_DUMP_DIR=directory):
+                scan = run_access_scan(MagicMock(url='http://example.com'))
 
-        # Mock run_validator to return empty results for all validators
-        with patch('scanner.wcag_script.run_validator') as mock_run_validator:
-            mock_run_validator.return_value = {
-                'success': {},
-                'failures': {},
-                'warnings': {},
-                'skipped': {}
-            }
+            with open(os.path.join(directory, f'scan-{scan.pk}.json')) as file:
+                self.assertEqual(json.load(file), self.results)
 
-            # Call the function under test
-            result = check_accessibility(mock_response)
+    def test_batched_sink(self):
+        '''
+        Checks the batched sink saves full batches as they fill and the rest on close
+        '''
+        sink = BatchedDatabaseSink(batch_size=2)
 
-            # Define the expected result, including the serif_font_check key
-            expected_result = {
-                'success': [],
-                'failures': [],
-                'warnings': [],
-                'skipped': [],
-                'serif_font_check': ['No serif fonts found in url.']
-            }
+        sink.write(self.results, 'http://example.com/1')
+        self.assertFalse(AccessibilityResult.objects.exists())
+        sink.write(self.results, 'http://example.com/2', {'stages': {}})
+        sink.write(self.results, 'http://example.com/3')
+        self.assertEqual(AccessibilityResult.objects.count(), 2)
+        sink.close()
 
-            # Assertions
-            self.assertEqual(result, expected_result)
-            mock_save_accessibility_result.assert_called_once_with(expected_result, "http://example.com")
+        self.assertEqual(sink.saved, 3)
+        scan = AccessibilityResult.objects.get(url='http://example.com/2')
+        self.assertEqual(scan.failure_count, 1)
+        self.assertEqual(scan.timings, {'stages': {}})
+        self.assertEqual(Finding.objects.filter(scan__url='http://example.com/3').count(), 1)
+
+    def test_file_and_null_sinks(self):
+        '''
+        Checks the file sink writes a JSON file per scan and the null sink writes nothing
+        '''
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(FileSink(directory).write(self.results, 'http://example.com'))
+            [name] = os.listdir(directory)
+            with open(os.path.join(directory, name)) as file:
+                self.assertEqual(json.load(file)['results'], self.results)
+
+        self.assertIsNone(NullSink().write(self.results, 'http://example.com'))
+        self.assertFalse(AccessibilityResult.objects.exists())
+
+    def test_get_result_sink(self):
+        '''
+        Checks the configured sink is returned and unknown sinks are rejected
+        '''
+        self.assertIsInstance(get_result_sink(batch_size=10), BatchedDatabaseSink)
+        with override_settings(RESULT_SINK='none'):
+            self.assertIsInstance(get_result_sink(batch_size=10), NullSink)
+        with self.assertRaises(ImproperlyConfigured):
+            get_result_sink('s3')
 
+###############################
+# exports.py tests
 
+class ExportTestCase(TestCase):
 
+    def setUp(self):
+        self.first = save_accessibility_result({
+            'failures': [{'section_type': 'failures', 'message': 'Missing alt, "quoted"', 'error_code': 'anteater-1'}],
+            'success': [{'section_type': 'success', 'guideline': '1.3.1'}] * 3,
+        }, 'http://example.com/a')
+        self.second = save_accessibility_result({
+            'warnings': [{'section_type': 'warnings', 'message': 'No keys'}],
+        }, 'http://other.com/')
+        AccessibilityResult.objects.filter(pk=self.first.pk).update(timestamp=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
 
-    def test_run_validator_empty_html(self):
+    def export(self, **params):
+        response = self.client.get(reverse('export_results'), params)
+        return response, b''.join(response.streaming_content)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_ndjson(self):
         '''
-        Testing an empty html response
+        Checks every finding is streamed as one JSON object per line
         '''
-        html_content = ""
-        with patch('scanner.wcag_script.Ayeaye') as MockAyeaye:
-            mock_validator_instance = MockAyeaye.return_value
-            mock_validator_instance.validate_document.return_value = {}
+        response, content = self.export(format='ndjson')
 
-            result = run_validator(MockAyeaye, html_content)
+        rows = [json.loads(line) for line in content.decode('utf-8').splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), 5)
+        failures = [row for row in rows if row['section_type'] == 'failures']
+        self.assertEqual(failures[0]['message'], 'Missing alt, "quoted"')
+        self.assertEqual(rows[-1]['url'], 'http://other.com/')
 
+    def test_export_csv_for_one_scan(self):
+        '''
+        Checks a single scan exports as CSV with a header row
+        '''
+        response, content = self.export(format='csv', scan=self.first.id)
 
-            self.assertEqual(result, {})
-            mock_validator_instance.validate_document.assert_called_once_with(b"")
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8'))))
+        self.assertEqual(rows[0][:3], ['scan_id', 'datetime', 'url'])
+        self.assertEqual(len(rows), 5)
+        self.assertIn(['failures', 'Missing alt, "quoted"'], [[row[3], row[6]] for row in rows[1:]])
 
-    @patch('scanner.wcag_script.run_validator')
-    def test_check_accessibility_handles_wrong_format_results(self, mock_run_validator):
+    def test_export_filters(self):
         '''
-        Testing a wrong-format response
+        Checks the date range and url prefix filters
         '''
-        mock_response = MagicMock()
-        mock_response.text = "<html><body>wrong format results</body></html>"
-        mock_response.url = "http://example.com"
+        response, content = self.export(start='2024-06-01')
+        self.assertEqual(len(content.splitlines()), 1)
 
-        mock_run_validator.return_value = {'failures': "This is not a dictionary"}
+        response, content = self.export(end='2024-06-01T00:00:00')
+        self.assertEqual(len(content.splitlines()), 4)
 
-        with self.assertRaises(AttributeError):
-            check_accessibility(mock_response)
+        response, content = self.export(url_prefix='http://other.com')
+        self.assertEqual(json.loads(content)['message'], 'No keys')
 
+    def test_export_gzip(self):
+        '''
+        Checks the export can be gzipped as it streams
+        '''
+        response, content = self.export(format='csv', compress='gzip')
 
-class CheckForSerifFontsTests(unittest.TestCase):
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('accessibility_findings.csv.gz', response['Content-Disposition'])
+        self.assertEqual(len(gzip.decompress(content).decode('utf-8').splitlines()), 6)
 
-    def test_check_for_serif_fonts_with_serif(self):
+    def test_export_parquet(self):
         '''
-        Tests the function when serif fonts are present in the content.
+        Checks the Parquet export when pyarrow is installed, and the error when it isn't
         '''
-        content = """
-        <html>
-            <style>
-                body { font-family: "Times New Roman", serif; }
-                p { font-family: Georgia, serif; }
-            </style>
-        </html>
-        """
-        result = check_for_serif_fonts(content)
-        self.assertEqual(result, "Serif font found in url.")
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            response = self.client.get(reverse('export_results'), {'format': 'parquet'})
+            self.assertEqual(response.status_code, 501)
+            return
 
-    def test_check_for_serif_fonts_without_serif(self):
+        response, content = self.export(format='parquet')
+
+        table = pq.read_table(io.BytesIO(content))
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column('scan_id').to_pylist()[0], self.first.id)
+
+    @override_settings(INCREMENTAL_SCANS=True, EXPORT_CHUNK_SIZE=2)
+    def test_export_incremental_scan(self):
         '''
-        Tests the function when no serif fonts are present in the content.
+        Checks one incremental scan exports its current findings, and a wider export its marked changes
         '''
-        content = """
-        <html>
-            <style>
-                body { font-family: Arial, sans-serif; }
-                p { font-family: Helvetica, sans-serif; }
-            </style>
-        </html>
-        """
-        result = check_for_serif_fonts(content)
-        self.assertEqual(result, "No serif fonts found in url.")
+        rows = [{'section_type': 'failures', 'error_code': 'code', 'xpath': f'/p[{n}]'} for n in range(3)]
+        save_accessibility_result({'failures': rows}, 'http://example.com/b')
+        scan = save_accessibility_result({'failures': rows[1:] + [{'section_type': 'failures', 'xpath': '/p[3]'}]},
+                                         'http://example.com/b')
+        self.assertIsNotNone(scan.base_scan_id)
 
-    def test_check_for_serif_fonts_mixed_fonts(self):
+        response, content = self.export(scan=scan.id)
+        rows = [json.loads(line) for line in content.decode('utf-8').splitlines()]
+        self.assertEqual([row['xpath'] for row in rows], ['/p[1]', '/p[2]', '/p[3]'])
+        self.assertEqual({(row['scan_id'], row['change']) for row in rows}, {(scan.id, '')})
+        response, content = self.export(scan=scan.id, url_prefix='http://other.com')
+        self.assertEqual(content, b'')
+
+        response, content = self.export(url_prefix='http://example.com/b')
+        rows = [json.loads(line) for line in content.decode('utf-8').splitlines() if json.loads(line)['scan_id'] == scan.id]
+        self.assertEqual(sorted((row['xpath'], row['change']) for row in rows),
+                         [('/p[0]', Finding.RESOLVED), ('/p[3]', Finding.ADDED)])
+
+    def test_export_bad_requests(self):
         '''
-        Tests the function when both serif and sans-serif fonts are present in the content.
+        Checks unknown formats and invalid filters are rejected
         '''
-        content = """
-        <html>
-            <style>
-                body { font-family: "Times New Roman", serif; }
-                p { font-family: Arial, sans-serif; }
-            </style>
-        </html>
-        """
-        result = check_for_serif_fonts(content)
-        self.assertEqual(result, "Serif font found in url.")
+        self.assertEqual(self.client.get(reverse('export_results'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_results'), {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_results'), {'scan': 'abc'}).status_code, 400)
 
-    def test_check_for_serif_fonts_empty_content(self):
+###############################
+# incremental.py tests
+
+def _row(section, error_code, xpath, message='Problem'):
+    return {'section_type': section, 'guideline': '1.1.1', 'technique': 'H37', 'message': message,
+            'error_code': error_code, 'xpath': xpath, 'classes': None, 'id': None}
+
+
+@override_settings(INCREMENTAL_SCANS=True, INCREMENTAL_FULL_EVERY=3)
+class IncrementalScanTestCase(TestCase):
+
+    url = 'http://example.com/'
+
+    def scan(self, failures, success=()):
+        return save_accessibility_result({'failures': list(failures), 'success': list(success)}, self.url)
+
+    def test_rescan_stores_only_changes(self):
         '''
-        Tests the function with empty content.
+        Checks a rescan stores the added and resolved findings and still rebuilds every row
         '''
-        content = ""
-        result = check_for_serif_fonts(content)
-        self.assertEqual(result, "No serif fonts found in url.")
+        first = self.scan([_row('failures', 'a', '/img[1]'), _row('failures', 'b', '/img[2]')], [_row('success', 's', '/p')])
+        second_failures = [_row('failures', 'b', '/img[2]', message='Reworded'), _row('failures', 'c', '/img[3]')]
+        second = self.scan(second_failures, [_row('success', 's', '/p')])
+
+        self.assertEqual(first.findings.count(), 3)
+        self.assertEqual(second.base_scan, first)
+        self.assertEqual(
+            sorted(second.findings.values_list('error_code', 'change')),
+            [('a', Finding.RESOLVED), ('c', Finding.ADDED)],
+        )
+        self.assertEqual(second.failure_count, 2)
+        results = second.as_results()
+        self.assertEqual([row['error_code'] for row in results['failures']], ['b', 'c'])
+        self.assertEqual([row['error_code'] for row in results['success']], ['s'])
+
+        chunks = json.loads(b''.join(scan_json_chunks(second)))
+        self.assertEqual([row['error_code'] for row in chunks['failures']], ['b', 'c'])
+
+    def test_unchanged_rescan_and_full_snapshots(self):
+        '''
+        Checks an unchanged page stores no findings and a full copy is kept every INCREMENTAL_FULL_EVERY scans
+        '''
+        failures = [_row('failures', 'a', '/img[1]'), _row('failures', 'a', '/img[1]')]
+        scans = [self.scan(failures) for _ in range(4)]
+
+        self.assertEqual([scan.chain_length for scan in scans], [0, 1, 2, 0])
+        self.assertEqual([scan.findings.count() for scan in scans], [2, 0, 0, 2])
+        self.assertIsNone(scans[3].base_scan)
+        self.assertEqual(len(scans[2].as_results()['failures']), 2)
+
+    def test_incremental_scans_off(self):
+        '''
+        Checks every scan is stored in full when INCREMENTAL_SCANS is off
+        '''
+        with override_settings(INCREMENTAL_SCANS=False):
+            self.scan([_row('failures', 'a', '/img[1]')])
+            second = self.scan([_row('failures', 'a', '/img[1]')])
+
+        self.assertIsNone(second.base_scan)
+        self.assertEqual(second.findings.count(), 1)
+
+    def test_changes_view(self):
+        '''
+        Checks the changes endpoint by scan id and by URL, including full scans
+        '''
+        first = self.scan([_row('failures', 'a', '/img[1]')])
+        second = self.scan([_row('failures', 'b', '/img[2]')])
+        with override_settings(INCREMENTAL_SCANS=False):
+            third = self.scan([_row('failures', 'c', '/img[3]')])
+
+        data = self.client.get(reverse('scan_changes_for_scan', args=[second.pk])).json()
+        self.assertEqual(data['previous_scan_id'], first.pk)
+        self.assertEqual([row['error_code'] for row in data['added']], ['b'])
+        self.assertEqual([row['error_code'] for row in data['resolved']], ['a'])
+
+        data = self.client.get(reverse('scan_changes'), {'url': self.url}).json()
+        self.assertEqual(data['scan_id'], third.pk)
+        self.assertEqual([row['error_code'] for row in data['added']], ['c'])
+        self.assertEqual([row['error_code'] for row in data['resolved']], ['b'])
+
+        data = self.client.get(reverse('scan_changes_for_scan', args=[first.pk])).json()
+        self.assertIsNone(data['previous_scan_id'])
+        self.assertEqual(self.client.get(reverse('scan_changes'), {'url': 'http://other.com/'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('scan_changes')).status_code, 400)
+
+###############################
+# retention.py tests
+
+@override_settings(INCREMENTAL_SCANS=True, INCREMENTAL_FULL_EVERY=10)
+class RetentionTestCase(TestCase):
+
+    url = 'http://example.com/'
+
+    def scan(self, failures, days_ago):
+        scan = save_accessibility_result({'failures': list(failures)}, self.url)
+        timestamp = timezone.now() - timedelta(days=days_ago)
+        AccessibilityResult.objects.filter(pk=scan.pk).update(timestamp=timestamp)
+        scan.timestamp = timestamp
+        return scan
+
+    def test_prune_rolls_up_and_keeps_incremental_chains(self):
+        '''
+        Deletes a chain of old scans one batch at a time, rolls them up by day and
+        materializes the kept scan that built on them
+        '''
+        old = [
+            self.scan([_row('failures', 'a', '/img[1]')], days_ago=100),
+            self.scan([_row('failures', 'a', '/img[1]'), _row('failures', 'b', '/img[2]')], days_ago=100),
+            self.scan([_row('failures', 'b', '/img[2]')], days_ago=95),
+        ]
+        kept = self.scan([_row('failures', 'b', '/img[2]'), _row('failures', 'c', '/img[3]')], days_ago=1)
+        newest = self.scan([_row('failures', 'c', '/img[3]')], days_ago=0)
+        self.assertEqual(kept.base_scan, old[-1])
+        before = [row['error_code'] for row in kept.as_results()['failures']]
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, True)
+
+        stats = prune_scans(keep_days=90, batch_size=1, archive_dir=archive_dir)
+
+        self.assertEqual(stats['scans'], 3)
+        self.assertEqual(stats['materialized'], 1)
+        self.assertEqual(list(AccessibilityResult.objects.order_by('id')), [kept, newest])
+        kept.refresh_from_db()
+        self.assertIsNone(kept.base_scan_id)
+        self.assertEqual([row['error_code'] for row in kept.as_results()['failures']], before)
+        self.assertEqual([row['error_code'] for row in newest.as_results()['failures']], ['c'])
+
+        rollups = ScanRollup.objects.order_by('day')
+        self.assertEqual([(rollup.scan_count, rollup.failure_count, rollup.max_failure_count) for rollup in rollups],
+                         [(2, 3, 2), (1, 1, 1)])
+
+        archived = []
+        for name in sorted(os.listdir(archive_dir)):
+            with gzip.open(os.path.join(archive_dir, name)) as file:
+                archived.extend(json.loads(line) for line in file)
+        self.assertEqual(sorted(scan['id'] for scan in archived), sorted(scan.id for scan in old))
+        second = next(scan for scan in archived if scan['id'] == old[1].id)
+        self.assertEqual([row['error_code'] for row in second['results']['failures']], ['a', 'b'])
+
+        # Nothing is left to prune or roll up twice
+        self.assertEqual(prune_scans(keep_days=90)['scans'], 0)
+        self.assertEqual(ScanRollup.objects.get(day=rollups[0].day).scan_count, 2)
+
+    def test_prune_scans_command(self):
+        '''
+        Runs the command with the default retention and reports what it did
+        '''
+        self.scan([_row('failures', 'a', '/img[1]')], days_ago=400)
+        self.scan([_row('failures', 'a', '/img[1]')], days_ago=2)
+        out = io.StringIO()
+        with override_settings(RETENTION_DAYS=30):
+            call_command('prune_scans', stdout=out)
+
+        self.assertIn('1 scans and 1 findings deleted', out.getvalue())
+        self.assertEqual(AccessibilityResult.objects.count(), 1)
+        self.assertEqual(ScanRollup.objects.get().url, self.url)
+
+
+    def test_trend_and_api_serve_rollups(self):
+        '''
+        Charts the days retention rolled up before the kept scans, and lists them
+        through the API for their own user only
+        '''
+        user = User.objects.create_user(username='owner', password='password')
+        for failures, days_ago in [(3, 100), (1, 100), (4, 2)]:
+            scan = self.scan([_row('failures', 'a', f'/img[{n}]') for n in range(failures)], days_ago)
+            AccessibilityResult.objects.filter(pk=scan.pk).update(user=user)
+        self.scan([_row('failures', 'a', '/img[1]')], days_ago=100)
+        prune_scans(keep_days=90)
+
+        trend = scan_trend(self.url, limit=5, user=user)
+        self.assertEqual([(scan['failure_count'], scan['scan_count']) for scan in trend], [(2, 2), (4, 1)])
+        self.assertIsNone(trend[0]['id'])
+        self.assertEqual(len(scan_trend(self.url, limit=1, user=user)), 1)
+
+        # Scans with another profile are charted separately, rolled up or not
+        profile = ScanProfile.objects.create(name='Failures only', sections=['failures'])
+        for days_ago in (100, 1):
+            scan = self.scan([_row('failures', 'a', f'/img[{n}]') for n in range(9)], days_ago)
+            AccessibilityResult.objects.filter(pk=scan.pk).update(user=user, profile=profile)
+        prune_scans(keep_days=90)
+        trend = scan_trend(self.url, limit=5, user=user)
+        self.assertEqual([(scan['failure_count'], scan['scan_count']) for scan in trend], [(2, 2), (4, 1)])
+        trend = scan_trend(self.url, limit=5, user=user, profile=profile)
+        self.assertEqual([(scan['failure_count'], scan['scan_count']) for scan in trend], [(9, 1), (9, 1)])
+        self.assertIsNone(trend[0]['id'])
+
+        data = self.client.get(reverse('api_rollups'), {'url': self.url}).json()
+        self.assertEqual([item['scan_count'] for item in data['items']], [1])
+        self.client.force_login(user)
+        data = self.client.get(reverse('api_rollups'), {'url': self.url}).json()
+        self.assertEqual(sorted((item['scan_count'], item['failure_count']) for item in data['items']), [(1, 9), (2, 4)])
+
+        data = self.client.get(reverse('dashboard_trend'), {'url': self.url, 'profile': 'Failures only'}).json()
+        self.assertEqual([scan['failure_count'] for scan in data['scans']], [9, 9])
+        self.assertEqual(self.client.get(reverse('dashboard_trend'), {'url': self.url, 'profile': 'Nope'}).status_code, 400)
+
+
+###############################
+# profiles.py tests
+
+class ScanProfileTestCase(TestCase):
+
+    validator_result = {
+        'success': {'1.3.1': {'H42': [{'message': 'Heading', 'xpath': '/h1'}]}},
+        'failures': {'1.1.1': {'H37': [{'message': 'Missing alt', 'error_code': 'anteater-1', 'xpath': '/img'}]},
+                     '1.4.3': {'G18': [{'message': 'Low contrast', 'error_code': 'molerat-1', 'xpath': '/p'}]}},
+        'skipped': {'skipped': {'skipped': [{'message': 'Hidden', 'xpath': '/div'}]}},
+    }
+
+    def response(self):
+        return MagicMock(text="<html><body>Example content</body></html>", url="http://example.com", status_code=200)
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_profile_picks_validators_level_techniques_and_sections(self, mock_run_validator):
+        '''
+        Checks a profile limits the validators to its level, passes the level on and keeps only its techniques and sections
+        '''
+        mock_run_validator.return_value = self.validator_result
+        profile = ScanProfile(name='Alt text', level='A', techniques=['H37'], sections=['failures', 'skipped'], check_fonts=False)
+
+        results = check_accessibility(self.response(), executor='serial', profile=profile)
+
+        ran = [call.args[0].__name__ for call in mock_run_validator.call_args_list]
+        self.assertEqual(ran, ['Anteater', 'Ayeaye', 'Tarsier'])
+        self.assertEqual({call.args[3] for call in mock_run_validator.call_args_list}, {'A'})
+        self.assertEqual([row['error_code'] for row in results['failures']], ['anteater-1'] * 3)
+        self.assertEqual(len(results['skipped']), 3)
+        self.assertEqual(results['success'], [])
+        self.assertEqual(results['serif_font_check'], [])
+
+    def test_profile_with_scans_cannot_be_deleted(self):
+        '''
+        Checks deleting a profile doesn't turn its partial scans into full ones
+        '''
+        profile = ScanProfile.objects.create(name='Failures only', sections=['failures'])
+        scan = save_accessibility_result({'failures': []}, 'http://example.com', profile=profile)
+
+        with self.assertRaises(ProtectedError):
+            profile.delete()
+        scan.delete()
+        profile.delete()
+
+    def test_molerat_checks_aaa_contrast(self):
+        '''
+        Checks an AAA profile runs Molerat against the AAA contrast ratio
+        '''
+        html = '<html><body><p style="color: #767676; background-color: #ffffff">Grey text</p></body></html>'
+        response = MagicMock(text=html, url='http://example.com')
+        rows = {}
+        for level in ('AA', 'AAA'):
+            profile = ScanProfile(name=level, validators=['Molerat'], level=level, check_fonts=False)
+            rows[level] = check_accessibility(response, executor='serial', profile=profile)
+
+        self.assertEqual(rows['AA']['failures'], [])
+        self.assertEqual(rows['AAA']['failures'][0]['technique'], 'G17')
+
+    def test_unused_validators_never_imported(self):
+        '''
+        Checks a scan with a one-validator profile imports only that validator
+        '''
+        script = (
+            "import sys, django; django.setup()\n"
+            "from unittest.mock import MagicMock\n"
+            "from scanner.models import ScanProfile\n"
+            "from scanner.wcag_script import check_accessibility\n"
+            "profile = ScanProfile(name='Headings', validators=['Tarsier'], check_fonts=False)\n"
+            "check_accessibility(MagicMock(text='<html><body><h1>Hi</h1></body></html>', url='http://example.com'), "
+            "executor='serial', profile=profile)\n"
+            "print(sorted(name for name in sys.modules if name.startswith('wcag_zoo.validators.')))\n"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='accessibility_scanner.settings')
+        output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+
+        self.assertEqual(output.stdout.strip(), "['wcag_zoo.validators.tarsier']")
+
+    @patch('scanner.wcag_checker.check_accessibility')
+    @patch('scanner.renderers.fetch')
+    def test_profile_selected_in_form(self, mock_fetch, mock_check_accessibility):
+        '''
+        Checks the profile picked in UrlForm is stored on the job and on the saved scan
+        '''
+        profile = ScanProfile.objects.get(name='Failures and warnings')
+        mock_fetch.return_value = MagicMock(status_code=200, url='http://example.com', headers={})
+        mock_check_accessibility.return_value = {'failures': [], 'serif_font_check': []}
+
+        self.client.post(reverse('check_url'), {'url': 'http://example.com', 'profile': profile.name})
+        job = run_scan_job(ScanJob.objects.get())
+
+        self.assertEqual(job.profile, profile)
+        self.assertEqual(job.result.profile, profile)
+        self.assertEqual(mock_check_accessibility.call_args.kwargs['profile'], profile)
+        self.assertFalse(UrlForm({'url': 'http://example.com', 'profile': 'Nope'}).is_valid())
+
+###############################
+# api.py tests
+
+class ApiTestCase(TestCase):
+
+    def post(self, body):
+        return self.client.post(reverse('api_submit_scans'), json.dumps(body), content_type='application/json')
+
+    def test_submit_batch_and_run_html_job(self):
+        '''
+        Checks a batch of URLs and documents is queued in order and an HTML job scans its document
+        '''
+        html = '<html lang="en"><head><title>T</title></head><body><img src="a.png"></body></html>'
+        response = self.post({
+            'urls': ['http://example.com/a', 'http://example.com/b'],
+            'documents': [{'html': html, 'url': 'http://example.com/built.html'}, {'html': html}],
+            'profile': 'Failures and warnings',
+        })
+
+        self.assertEqual(response.status_code, 202)
+        scans = response.json()['scans']
+        self.assertEqual([scan['mode'] for scan in scans], ['page', 'page', 'html', 'html'])
+        self.assertEqual(scans[3]['url'], 'about:blank')
+
+        job = run_scan_job(ScanJob.objects.get(pk=scans[2]['id']))
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertEqual(job.html, '')
+        self.assertEqual(job.result.url, 'http://example.com/built.html')
+        self.assertEqual(job.result.profile.name, 'Failures and warnings')
+        self.assertEqual(job.result.findings.filter(section_type='success').count(), 0)
+        self.assertEqual(self.client.get(scans[2]['status_url']).json()['result_id'], job.result.id)
+
+    def test_submit_needs_csrf_token_when_signed_in(self):
+        '''
+        Checks a cross-site POST without a CSRF token can't queue scans for the signed in user
+        '''
+        user = User.objects.create_user(username='owner', password='password')
+        client = Client(enforce_csrf_checks=True)
+        body = json.dumps({'urls': ['http://example.com/']})
+
+        response = client.post(reverse('api_submit_scans'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(ScanJob.objects.get().user)
+
+        client.force_login(user)
+        response = client.post(reverse('api_submit_scans'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ScanJob.objects.filter(user=user).exists())
+
+        client.get(reverse('check_url'))
+        token = client.cookies['csrftoken'].value
+        response = client.post(reverse('api_submit_scans'), body, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ScanJob.objects.get(user=user).url, 'http://example.com/')
+
+    @override_settings(API_MAX_BATCH=2)
+    def test_submit_rejects_bad_batches(self):
+        '''
+        Checks oversized, malformed and invalid batches are rejected without queueing anything
+        '''
+        self.assertIn('at most 2', self.post({'urls': ['http://a.com', 'http://b.com', 'http://c.com']}).json()['error'])
+        self.assertEqual(self.post({'urls': ['http://a.com', 'not a url']}).status_code, 400)
+        self.assertEqual(self.post({'documents': [{'url': 'http://a.com'}]}).status_code, 400)
+        self.assertEqual(self.post({'urls': ['http://a.com'], 'profile': 'Nope'}).status_code, 400)
+        self.assertEqual(self.post({}).status_code, 400)
+        bad_json = self.client.post(reverse('api_submit_scans'), 'nope', content_type='application/json')
+        self.assertEqual(bad_json.status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_submit_scans')).status_code, 405)
+        self.assertFalse(ScanJob.objects.exists())
+
+    def test_results_pagination_and_filters(self):
+        '''
+        Checks results are listed newest first, filtered, and paged with a next link
+        '''
+        failure = {'section_type': 'failures', 'message': 'Missing alt', 'error_code': 'anteater-1'}
+        first = save_accessibility_result({'failures': [failure]}, 'http://example.com/a')
+        second = save_accessibility_result({'success': [{'section_type': 'success'}]}, 'http://example.com/b')
+        third = save_accessibility_result({'failures': [failure]}, 'http://other.com/')
+
+        data = self.client.get(reverse('api_results'), {'limit': 2}).json()
+        self.assertEqual([item['id'] for item in data['items']], [third.id, second.id])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([item['id'] for item in data['items']], [first.id])
+        self.assertIsNone(data['next'])
+
+        data = self.client.get(reverse('api_results'), {'url_prefix': 'http://example.com', 'has_failures': '1'}).json()
+        self.assertEqual([item['id'] for item in data['items']], [first.id])
+        self.assertEqual(self.client.get(reverse('api_results'), {'limit': 'x'}).status_code, 400)
+
+        detail = self.client.get(reverse('api_result', args=[first.id])).json()
+        self.assertEqual(detail['failure_count'], 1)
+        self.assertEqual(self.client.get(reverse('api_result', args=[999])).status_code, 404)
+
+    def test_endpoints_hide_other_users_scans(self):
+        '''
+        Checks every read endpoint only shows the request's own scans, jobs and findings
+        '''
+        owner = User.objects.create_user(username='owner', password='password')
+        rows = [{'section_type': 'failures', 'error_code': 'private', 'xpath': '/img'}]
+        scan = save_accessibility_result({'failures': rows}, 'http://example.com', user=owner)
+        job = ScanJob.objects.create(url='http://example.com', user=owner, result=scan)
+        other = User.objects.create_user(username='other', password='password')
+
+        for user in (None, other):
+            if user is not None:
+                self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('api_scan', args=[job.id])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('api_result', args=[scan.id])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('api_result_findings', args=[scan.id])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('api_results')).json()['items'], [])
+            self.assertEqual(self.client.get(reverse('api_findings')).json()['items'], [])
+            self.assertEqual(self.client.get(reverse('api_findings'), {'scan': scan.id}).json()['items'], [])
+
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(reverse('api_scan', args=[job.id])).json()['result_id'], scan.id)
+        self.assertEqual(self.client.get(reverse('api_result', args=[scan.id])).json()['id'], scan.id)
+        data = self.client.get(reverse('api_result_findings', args=[scan.id])).json()
+        self.assertEqual([item['error_code'] for item in data['items']], ['private'])
+        self.assertEqual([item['id'] for item in self.client.get(reverse('api_results')).json()['items']], [scan.id])
+        self.assertEqual(len(self.client.get(reverse('api_findings')).json()['items']), 1)
+
+    def test_findings_endpoints(self):
+        '''
+        Checks the findings of a scan and across scans are filtered and paged by id
+        '''
+        rows = [{'section_type': 'failures', 'error_code': f'code-{n % 2}', 'xpath': f'/p[{n}]'} for n in range(5)]
+        scan = save_accessibility_result({'failures': rows, 'success': [{'section_type': 'success'}]}, 'http://example.com')
+        save_accessibility_result({'failures': rows[:1]}, 'http://other.com/')
+
+        url = reverse('api_result_findings', args=[scan.id])
+        data = self.client.get(url, {'section': 'failures', 'limit': 2}).json()
+        self.assertEqual([item['xpath'] for item in data['items']], ['/p[0]', '/p[1]'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([item['xpath'] for item in data['items']], ['/p[2]', '/p[3]'])
+
+        data = self.client.get(reverse('api_findings'), {'error_code': 'code-0'}).json()
+        self.assertEqual([item['url'] for item in data['items']], ['http://example.com'] * 3 + ['http://other.com/'])
+        data = self.client.get(reverse('api_findings'), {'error_code': 'code-0', 'url': 'http://other.com/'}).json()
+        self.assertEqual(len(data['items']), 1)
+
+    @override_settings(INCREMENTAL_SCANS=True)
+    def test_incremental_scan_findings_paged_without_writes(self):
+        '''
+        Checks an incremental scan's findings are paged from its rebuilt chain, leaving the stored rows alone
+        '''
+        rows = [{'section_type': 'failures', 'error_code': 'code', 'xpath': f'/p[{n}]'} for n in range(5)]
+        save_accessibility_result({'failures': rows}, 'http://example.com')
+        scan = save_accessibility_result({'failures': rows[1:] + [{'section_type': 'failures', 'xpath': '/p[5]'}]},
+                                         'http://example.com')
+        base_id = scan.base_scan_id
+        self.assertIsNotNone(base_id)
+        stored = Finding.objects.count()
+
+        url = reverse('api_result_findings', args=[scan.id])
+        data = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual([item['xpath'] for item in data['items']], ['/p[1]', '/p[2]', '/p[3]'])
+        self.assertEqual({item['scan_id'] for item in data['items']}, {scan.id})
+        data = self.client.get(data['next']).json()
+        self.assertEqual([item['xpath'] for item in data['items']], ['/p[4]', '/p[5]'])
+        self.assertIsNone(data['next'])
+        data = self.client.get(url, {'error_code': 'code'}).json()
+        self.assertEqual([item['xpath'] for item in data['items']], ['/p[1]', '/p[2]', '/p[3]', '/p[4]'])
+
+        self.assertEqual(AccessibilityResult.objects.get(pk=scan.pk).base_scan_id, base_id)
+        self.assertEqual(Finding.objects.count(), stored)
+
+###############################
+# documents.py and local_scan.py tests
+
+def write_site(directory, pages, files=None):
+    for name, html in dict(pages, **(files or {})).items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(html)
+
+
+SITE_PAGES = {
+    'index.html': '<html lang="en"><head><title>Home</title><link rel="stylesheet" href="/css/site.css"></head>'
+                  '<body><p>Welcome</p></body></html>',
+    'about/index.html': '<html lang="en"><head><title>About</title></head><body><img src="a.png"></body></html>',
+}
+SITE_FILES = {'css/site.css': 'p { font-family: Georgia, serif; }', 'notes.txt': 'not a page'}
+
+
+class DocumentsTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        write_site(self.directory, SITE_PAGES, SITE_FILES)
+
+    def test_site_directory_maps_urls_to_files(self):
+        '''
+        Lists the HTML pages and maps them to URLs under the base URL and back,
+        without letting links climb out of the directory
+        '''
+        site = SiteDirectory(self.directory, 'https://example.com/docs')
+        pages = site.pages()
+
+        self.assertEqual([site.url_for(path) for path in pages], [
+            'https://example.com/docs/index.html', 'https://example.com/docs/about/index.html',
+        ])
+        self.assertEqual(site.path_for('https://example.com/docs/css/site.css?v=2'),
+                         os.path.join(site.root, 'css', 'site.css'))
+        self.assertIsNone(site.path_for('https://example.com/docs/../secret.css'))
+        self.assertIsNone(site.path_for('https://example.com/docs/missing.css'))
+        self.assertIsNone(site.path_for('https://cdn.example.com/site.css'))
+
+    def test_scan_site_reads_stylesheets_from_disk(self):
+        '''
+        Scans every page without any HTTP request, resolving root-relative
+        stylesheet links to the site's files
+        '''
+        site = SiteDirectory(self.directory, 'https://example.com/')
+        with patch('scanner.stylesheets.fetch', side_effect=AssertionError('fetched')):
+            pages = list(scan_site(site, site.pages(), workers=1))
+
+        self.assertEqual([url for url, results, timings in pages],
+                         ['https://example.com/index.html', 'https://example.com/about/index.html'])
+        home, about = pages[0][1], pages[1][1]
+        self.assertEqual(home['serif_font_check'], ['Serif font found in url.'])
+        self.assertEqual(home['success'][0]['url'], 'https://example.com/index.html')
+        self.assertTrue(any(row['error_code'] == 'anteater-1' for row in about['failures']))
+        self.assertIn('fonts', pages[0][2]['stages'])
+
+    def test_scan_site_in_parallel_matches_serial(self):
+        '''
+        Spreads the pages over worker processes and returns them in order
+        '''
+        site = SiteDirectory(self.directory)
+        serial = [(url, json.dumps(results, default=json_default)) for url, results, timings in
+                  scan_site(site, site.pages(), workers=1, sections=['failures'])]
+        cached = CachedResult.objects.count()
+        parallel = [(url, json.dumps(results, default=json_default)) for url, results, timings in
+                    scan_site(site, site.pages(), workers=2, sections=['failures'])]
+        # The worker processes leave the result cache alone
+        self.assertEqual(CachedResult.objects.count(), cached)
+
+        self.assertEqual([url for url, results in parallel], [url for url, results in serial])
+        self.assertTrue(parallel[0][0].startswith('file:///'))
+        # Each page is scanned with its own timestamp, so compare the findings only
+        strip = lambda text: re.sub(r'"datetime": "[^"]*"', '', text)
+        self.assertEqual([strip(results) for url, results in parallel], [strip(results) for url, results in serial])
+
+    def test_open_site_extracts_zip(self):
+        '''
+        Unpacks a zip of a site into a temporary directory that is removed afterwards,
+        and refuses archives that expand past the limit
+        '''
+        archive = os.path.join(self.directory, 'site.zip')
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            for name, html in dict(SITE_PAGES, **SITE_FILES).items():
+                zip_file.writestr(name, html)
+
+        with open_site(archive, 'https://example.com/') as (site, paths):
+            self.assertEqual([site.url_for(path) for path in paths],
+                             ['https://example.com/index.html', 'https://example.com/about/index.html'])
+            root = site.root
+        self.assertFalse(os.path.exists(root))
+
+        with override_settings(LOCAL_SCAN_MAX_ARCHIVE_BYTES=10):
+            with self.assertRaisesRegex(ValueError, 'over the limit'):
+                with open_site(archive):
+                    pass
+
+    def test_scan_files_command(self):
+        '''
+        Saves a scan per page, or with --gate fails when a page has failures without saving anything
+        '''
+        out = io.StringIO()
+        call_command('scan_files', self.directory, '--base-url', 'https://example.com/', '--workers', '1', stdout=out)
+
+        self.assertEqual(
+            sorted(AccessibilityResult.objects.values_list('url', flat=True)),
+            ['https://example.com/about/index.html', 'https://example.com/index.html'],
+        )
+        self.assertIn('2 pages scanned', out.getvalue())
+
+        with self.assertRaisesRegex(CommandError, '1 of 2 pages have accessibility failures'):
+            call_command('scan_files', self.directory, '--gate', '--workers', '1', stdout=io.StringIO())
+        self.assertEqual(AccessibilityResult.objects.count(), 2)
+
+    def test_scan_upload_view(self):
+        '''
+        Queues an uploaded HTML file and an uploaded zip for the scan workers, for signed in users only
+        '''
+        page = SimpleUploadedFile('page.html', SITE_PAGES['about/index.html'].encode('utf-8'))
+        response = self.client.post(reverse('scan_upload'), {'file': page})
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('scan_upload')}", fetch_redirect_response=False)
+        self.assertFalse(ScanJob.objects.exists())
+
+        user = User.objects.create_user(username='uploader', password='password')
+        self.client.force_login(user)
+        page.seek(0)
+        response = self.client.post(reverse('scan_upload'), {'file': page, 'base_url': 'https://example.com/page'})
+        self.assertEqual(response.status_code, 200)
+        job = response.context['job']
+        self.assertEqual((job.mode, job.status, job.url), (ScanJob.HTML, ScanJob.QUEUED, 'https://example.com/page'))
+        self.assertContains(response, reverse('scan_status', args=[job.id]))
+        self.assertFalse(AccessibilityResult.objects.exists())
+        job = run_scan_job(claim_next_job())
+        self.assertGreater(job.result.failure_count, 0)
+        self.assertEqual(job.result.user, user)
+
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as zip_file:
+            for name, html in SITE_PAGES.items():
+                zip_file.writestr(name, html)
+        archive = SimpleUploadedFile('site.zip', data.getvalue(), content_type='application/zip')
+        uploads = os.path.join(self.directory, 'uploads')
+        with override_settings(LOCAL_SCAN_UPLOAD_DIR=uploads):
+            response = self.client.post(reverse('scan_upload'), {'file': archive})
+        job = response.context['job']
+        self.assertEqual((job.mode, job.url), (ScanJob.ARCHIVE, 'file:///site.zip/'))
+        self.assertTrue(os.path.isfile(job.archive))
+
+        with override_settings(LOCAL_SCAN_WORKERS=1):
+            job = run_scan_job(claim_next_job())
+        self.assertEqual((job.status, job.pages_scanned), (ScanJob.DONE, 2))
+        self.assertEqual(os.listdir(uploads), [])
+        self.assertEqual(
+            sorted(AccessibilityResult.objects.filter(user=user).values_list('url', flat=True)),
+            ['file:///site.zip/about/index.html', 'file:///site.zip/index.html', 'https://example.com/page'],
+        )
+
+
+###############################
+# renderers.py tests
+
+class FakeEngine:
+    '''
+    A headless engine for the pool tests, rendering each URL as a page that
+    names the worker process and how many times its engine was started
+    '''
+    starts = 0
+
+    def __init__(self, memory_mb=None):
+        self.memory_mb = memory_mb
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def start(self):
+        FakeEngine.starts += 1
+
+    def render(self, url, timeout):
+        if url.endswith('/slow'):
+            time.sleep(30)
+        status_code = 404 if url.endswith('/missing') else 200
+        html = f'<html lang="en"><head><title>{os.getpid()}:{FakeEngine.starts}</title></head><body></body></html>'
+        return url, status_code, html
+
+    def close(self):
+        pass
+
+
+class MissingEngine(FakeEngine):
+
+    @classmethod
+    def available(cls):
+        return False
+
+
+class RendererTestCase(TestCase):
+
+    def setUp(self):
+        close_renderers()
+        self.addCleanup(close_renderers)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_snapshot_renderer_falls_back_to_http(self):
+        '''
+        Scans a stored snapshot without any request, and fetches pages that have no snapshot
+        '''
+        save_snapshot('http://example.com/app', '<html lang="en"><body><img src="a.png"></body></html>', self.directory)
+        with override_settings(SCAN_RENDERER='snapshot', RENDER_SNAPSHOT_DIR=self.directory), \
+                patch('scanner.renderers.fetch') as mock_fetch:
+            page = render_page('http://example.com/app')
+            self.assertIn('<img src="a.png">', page.text)
+            self.assertEqual(page.url, 'http://example.com/app')
+            mock_fetch.assert_not_called()
+
+            self.assertIs(render_page('http://example.com/other'), mock_fetch.return_value)
+            mock_fetch.assert_called_once_with('http://example.com/other', conditional=False)
+
+            with override_settings(RENDER_FALLBACK=False):
+                with self.assertRaises(RenderUnavailable):
+                    render_page('http://example.com/other')
+
+    def test_scan_job_uses_renderer(self):
+        '''
+        Queued scans go through the configured renderer
+        '''
+        save_snapshot('http://example.com/app', '<html lang="en"><body><img src="a.png"></body></html>', self.directory)
+        job = ScanJob.objects.create(url='http://example.com/app')
+        with override_settings(SCAN_RENDERER='snapshot', RENDER_SNAPSHOT_DIR=self.directory), \
+                patch('scanner.renderers.fetch', side_effect=AssertionError('fetched')):
+            job = run_scan_job(job)
+
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertGreater(job.result.failure_count, 0)
+
+    def test_headless_falls_back_when_engine_missing(self):
+        '''
+        Uses the http renderer when the headless engine isn't installed
+        '''
+        with override_settings(RENDER_ENGINE='scanner.tests.MissingEngine'):
+            self.assertIsInstance(get_renderer('headless'), HttpRenderer)
+        with override_settings(RENDER_ENGINE='scanner.no_such_module.Engine'):
+            close_renderers()
+            self.assertIsInstance(get_renderer('headless'), HttpRenderer)
+        with self.assertRaises(ImproperlyConfigured):
+            get_renderer('browser')
+
+    @override_settings(RENDER_TIMEOUT_GRACE=0.5)
+    def test_headless_pool_stays_warm_and_recovers(self):
+        '''
+        Starts each worker's engine once for many pages, and restarts the pool
+        when a page outlives its timeout
+        '''
+        renderer = HeadlessRenderer(engine='scanner.tests.FakeEngine', workers=2, timeout=1, memory_mb=0)
+        self.addCleanup(renderer.close)
+        renderer.start()
+
+        titles = {renderer.render(f'http://example.com/{index}').text for index in range(10)}
+        workers = {re.search(r'<title>(\d+):(\d+)</title>', title).groups() for title in titles}
+        self.assertLessEqual(len(workers), 2)
+        self.assertEqual({starts for pid, starts in workers}, {'1'})
+
+        with self.assertRaisesRegex(RenderUnavailable, 'longer than 1 seconds'):
+            renderer.render('http://example.com/slow')
+        page = renderer.render('http://example.com/missing')
+        with self.assertRaises(requests.exceptions.HTTPError):
+            page.raise_for_status()
+
+    def test_ingest_snapshots_command(self):
+        '''
+        Stores every page of a rendered site as the snapshot of its URL
+        '''
+        site = os.path.join(self.directory, 'site')
+        write_site(site, SITE_PAGES)
+        snapshots = os.path.join(self.directory, 'snapshots')
+        call_command('ingest_snapshots', site, '--base-url', 'https://example.com/', '--directory', snapshots,
+                     stdout=io.StringIO())
+
+        page = SnapshotRenderer(snapshots).render('https://example.com/about/index.html')
+        self.assertEqual(page.text, SITE_PAGES['about/index.html'])
+
+
+###############################
+# jobs.py tests
+
+class ScanJobTestCase(TestCase):
+
+    def test_normalize_url(self):
+        '''
+        Normalizes the parts of a URL that don't change the page
+        '''
+        self.assertEqual(normalize_url('HTTP://Example.COM:80#top'), 'http://example.com/')
+        self.assertEqual(normalize_url('https://example.com:8443/a/?b=2&a=1'), 'https://example.com:8443/a/?b=2&a=1')
+        self.assertEqual(normalize_url('https://user:pw@Example.com/A'), 'https://user:pw@example.com/A')
+
+    def test_enqueue_scan_coalesces_identical_requests(self):
+        '''
+        Joins a queued or running scan of the same URL and profile, and serves a fresh result
+        '''
+        profile = ScanProfile.objects.create(name='Failures only', sections=['failures'])
+        first = enqueue_scan('http://Example.com')
+        self.assertEqual(enqueue_scan('http://example.com/#main'), first)
+        # The job scans the URL as it was submitted
+        self.assertEqual(first.url, 'http://Example.com')
+        self.assertNotEqual(enqueue_scan('http://example.com/', profile=profile), first)
+
+        # Once it finishes, the result is shared until it is no longer fresh
+        first.status = ScanJob.DONE
+        first.result = save_accessibility_result({'failures': []}, first.url)
+        first.finished_at = timezone.now()
+        first.coalesce_key = None
+        first.save()
+        self.assertEqual(enqueue_scan('http://example.com'), first)
+        with override_settings(SCAN_FRESHNESS_SECONDS=0):
+            second = enqueue_scan('http://example.com')
+        self.assertNotEqual(second, first)
+        self.assertEqual(second.status, ScanJob.QUEUED)
+
+        # A job stuck running on a dead worker is requeued and still takes requests
+        ScanJob.objects.filter(pk=second.pk).update(
+            status=ScanJob.RUNNING, started_at=timezone.now() - timedelta(hours=1), attempts=1
+        )
+        with override_settings(SCAN_FRESHNESS_SECONDS=0):
+            self.assertEqual(enqueue_scan('http://example.com'), second)
+        second.refresh_from_db()
+        self.assertEqual(second.status, ScanJob.QUEUED)
+
+        # Until it has run out of attempts, when it fails and a new scan is queued
+        ScanJob.objects.filter(pk=second.pk).update(
+            status=ScanJob.RUNNING, started_at=timezone.now() - timedelta(hours=1), attempts=3
+        )
+        with override_settings(SCAN_FRESHNESS_SECONDS=0):
+            third = enqueue_scan('http://example.com')
+        self.assertNotIn(third.pk, [first.pk, second.pk])
+        second.refresh_from_db()
+        self.assertEqual(second.status, ScanJob.FAILED)
+
+    def test_enqueue_scan_fails_jobs_no_worker_picks_up(self):
+        '''
+        Fails a long queued job when no worker has claimed anything since, and queues a new one
+        '''
+        job = enqueue_scan('http://example.com')
+        ScanJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        # A worker that is busy elsewhere will get to it
+        busy = ScanJob.objects.create(url='http://example.org', status=ScanJob.RUNNING, started_at=timezone.now())
+        self.assertEqual(enqueue_scan('http://example.com'), job)
+
+        ScanJob.objects.filter(pk=busy.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        retry = enqueue_scan('http://example.com')
+        self.assertNotEqual(retry, job)
+        self.assertEqual(retry.status, ScanJob.QUEUED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.FAILED)
+        self.assertIn('No scan worker', job.error)
+
+    def test_enqueue_scan_joins_a_concurrent_request(self):
+        '''
+        Joins the job of a request that queued the same scan between the lookup and the insert
+        '''
+        other = enqueue_scan('http://example.com/')
+        with patch('scanner.jobs.in_flight_jobs', side_effect=[{}, {other.coalesce_key: other}]):
+            self.assertEqual(enqueue_scan('http://example.com/'), other)
+        self.assertEqual(ScanJob.objects.count(), 1)
+
+    @patch('scanner.renderers.fetch')
+    @patch('scanner.wcag_checker.check_accessibility')
+    def test_finished_job_releases_coalesce_key(self, mock_run_scan, mock_fetch):
+        '''
+        Runs a coalesced job and checks the next request after the freshness window queues a new scan
+        '''
+        mock_fetch.return_value = MagicMock(status_code=200, url='http://example.com/', headers={})
+        mock_run_scan.return_value = {'failures': [], 'serif_font_check': []}
+        job = run_scan_job(enqueue_scan('http://example.com'))
+
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertIsNone(ScanJob.objects.get(pk=job.pk).coalesce_key)
+        with override_settings(SCAN_FRESHNESS_SECONDS=0):
+            self.assertNotEqual(enqueue_scan('http://example.com'), job)
+
+    def test_enqueue_scans_coalesces_a_batch(self):
+        '''
+        Queues one job per distinct URL and joins the ones already in flight
+        '''
+        queued = enqueue_scan('http://example.com/a')
+        jobs = enqueue_scans(['http://example.com/a', 'http://example.com/b', 'HTTP://EXAMPLE.com/b#x'])
+
+        self.assertEqual(jobs[0], queued)
+        self.assertEqual(jobs[1].pk, jobs[2].pk)
+        self.assertEqual(ScanJob.objects.count(), 2)
+
+    @patch('scanner.renderers.fetch')
+    @patch('scanner.wcag_checker.check_accessibility')
+    def test_run_scan_job_success(self, mock_run_scan, mock_fetch):
+        '''
+        Creates a mock successful request and checks the job is marked done with its results
+        '''
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.url = 'http://example.com'
+        mock_response.headers = {'ETag': '"v1"'}
+        mock_fetch.return_value = mock_response
+
+        mock_scan_result = {
+            'failures': [{'section_type': 'failures', 'guideline': '1.1.1', 'technique': 'H37',
+                          'message': 'Missing alt', 'error_code': 'anteater-1', 'xpath': '/html/body/img'}],
+            'serif_font_check': ['No serif fonts found in url.'],
+        }
+        mock_run_scan.return_value = mock_scan_result
+
+        job = run_scan_job(ScanJob.objects.create(url='http://example.com'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertEqual(job.result.findings.get().error_code, 'anteater-1')
+        self.assertEqual(job.result.serif_font_check, 'No serif fonts found in url.')
+        self.assertIsNotNone(job.finished_at)
+        mock_fetch.assert_called_once_with('http://example.com', conditional=True)
+        self.assertEqual(FetchedPage.objects.get(url='http://example.com').etag, '"v1"')
+        self.assertEqual(set(job.result.timings['stages']), {'fetch'})
+        # Saved once, by the result sink
+        self.assertEqual(AccessibilityResult.objects.count(), 1)
+
+    @patch('scanner.renderers.fetch')
+    def test_run_scan_job_invalid_request(self, mock_fetch):
+        '''
+        Creates a mock failed request and checks the error is recorded on the job
+        '''
+        mock_fetch.side_effect = requests.exceptions.RequestException("Request failed")
+
+        job = run_scan_job(ScanJob.objects.create(url='http://example.com'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.FAILED)
+        self.assertIn("Could not fetch the URL", job.error)
+        self.assertIsNone(job.result)
+
+    @patch('scanner.renderers.fetch')
+    @patch('scanner.wcag_checker.run_access_scan')
+    def test_run_scan_job_not_modified(self, mock_run_scan, mock_fetch):
+        '''
+        Checks a 304 response reuses the previous result without scanning again
+        '''
+        result = AccessibilityResult.objects.create(url='http://example.com')
+        FetchedPage.objects.create(url='http://example.com', etag='"v1"', result=result)
+        mock_fetch.return_value = MagicMock(status_code=304)
+
+        job = run_scan_job(ScanJob.objects.create(url='http://example.com'))
+
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertTrue(job.not_modified)
+        self.assertEqual(job.result, result)
+        mock_run_scan.assert_not_called()
+
+    def test_claim_next_job(self):
+        '''
+        Checks jobs are claimed oldest first and only once
+        '''
+        first = ScanJob.objects.create(url='http://example.com/1')
+        second = ScanJob.objects.create(url='http://example.com/2')
+
+        self.assertEqual(claim_next_job().id, first.id)
+        self.assertEqual(claim_next_job().id, second.id)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(ScanJob.objects.filter(status=ScanJob.RUNNING).count(), 2)
+
+    def test_reclaim_stale_jobs(self):
+        '''
+        Checks a job left running by a dead worker is queued again, and failed
+        once it has used up its attempts
+        '''
+        long_ago = timezone.now() - timedelta(hours=1)
+        page = ScanJob.objects.create(url='http://example.com/1', status=ScanJob.RUNNING, started_at=long_ago, attempts=1)
+        poison = ScanJob.objects.create(url='http://example.com/2', status=ScanJob.RUNNING, started_at=long_ago, attempts=3)
+        crawl = ScanJob.objects.create(
+            url='http://example.com/3', mode=ScanJob.CRAWL, status=ScanJob.RUNNING, started_at=long_ago, attempts=1,
+        )
+
+        claimed = claim_next_job()
+
+        self.assertEqual((claimed.id, claimed.attempts), (page.id, 2))
+        poison.refresh_from_db()
+        self.assertEqual(poison.status, ScanJob.FAILED)
+        self.assertIn('stopped responding', poison.error)
+        crawl.refresh_from_db()
+        self.assertEqual(crawl.status, ScanJob.RUNNING)
+
+    @patch('scanner.management.commands.run_scan_worker.run_scan_job')
+    def test_worker_runs_queued_jobs(self, mock_run_scan_job):
+        '''
+        Checks the worker command works through the queue and exits with --once
+        '''
+        mock_run_scan_job.side_effect = lambda job: job
+        ScanJob.objects.create(url='http://example.com/1')
+        ScanJob.objects.create(url='http://example.com/2')
+
+        call_command('run_scan_worker', '--once', stdout=MagicMock())
+
+        self.assertEqual(mock_run_scan_job.call_count, 2)
+
+    @patch('scanner.management.commands.run_scan_worker.prewarm')
+    def test_worker_prewarms(self, mock_prewarm):
+        '''
+        Checks the worker loads the validators at startup unless told not to
+        '''
+        call_command('run_scan_worker', '--once', stdout=MagicMock())
+        call_command('run_scan_worker', '--once', '--no-prewarm', stdout=MagicMock())
+
+        self.assertEqual(mock_prewarm.call_count, 1)
+        self.assertEqual(
+            [Validator.__name__ for Validator in prewarm()], ['Anteater', 'Ayeaye', 'Glowworm', 'Molerat', 'Tarsier'],
+        )
+
+###############################
+# crawler.py tests
+
+class LocalSite:
+    '''
+    Serves a dict of {path: html} from a local HTTP server in a background thread,
+    answering an int value with that status instead
+    '''
+
+    def __init__(self, pages):
+        self.requests = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append(self.path)
+                if self.path not in pages:
+                    self.send_error(404)
+                    return
+                if isinstance(pages[self.path], int):
+                    self.send_error(pages[self.path])
+                    return
+                body = pages[self.path].encode('utf-8')
+                etag = f'"{len(body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                content_type = 'application/xml' if self.path.endswith('.xml') else 'text/html'
+                if self.path.endswith('.txt'):
+                    content_type = 'text/plain'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CrawlerTestCase(TestCase):
+
+    pages = {
+        '/robots.txt': "User-agent: *\nDisallow: /private",
+        '/': '<html><body><a href="/a">A</a> <a href="/private">P</a> <a href="http://example.com/">Ext</a></body></html>',
+        '/a': '<html><body><a href="/b#top">B</a> <a href="/">Home</a></body></html>',
+        '/b': '<html><body>Too deep</body></html>',
+        '/private': '<html><body>Hidden</body></html>',
+    }
+
+    def crawl(self, site, **kwargs):
+        scanned = []
+        kwargs.setdefault('seeds', [site.url + '/'])
+        crawler = Crawler(host_delay=0, on_page=lambda response: scanned.append(response.url), **kwargs)
+        pages = crawler.run()
+        return pages, sorted(url[len(site.url):] for url in scanned)
+
+    def test_crawl_follows_links_to_depth(self):
+        '''
+        Crawls a local site and checks only same-domain pages within the depth are scanned
+        '''
+        with LocalSite(self.pages) as site:
+            pages, scanned = self.crawl(site, max_depth=1)
+
+        self.assertEqual(scanned, ['/', '/a'])
+        self.assertNotIn('/b', site.requests)
+        self.assertEqual(len(pages), 3)
+
+    def test_crawl_renders_pages_with_the_scan_renderer(self):
+        '''
+        Checks crawled pages come from SCAN_RENDERER, while robots.txt is still fetched over HTTP
+        '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        close_renderers()
+        self.addCleanup(close_renderers)
+        with LocalSite(self.pages) as site:
+            save_snapshot(site.url + '/', f'<html><body><a href="{site.url}/b">B</a></body></html>', directory)
+            save_snapshot(site.url + '/b', '<html><body>Rendered</body></html>', directory)
+            with override_settings(SCAN_RENDERER='snapshot', RENDER_SNAPSHOT_DIR=directory, RENDER_FALLBACK=False):
+                pages, scanned = self.crawl(site, max_depth=1)
+
+        self.assertEqual(scanned, ['/', '/b'])
+        self.assertEqual(site.requests, ['/robots.txt'])
+
+    def test_crawl_respects_robots(self):
+        '''
+        Checks pages disallowed by robots.txt are reported but never fetched
+        '''
+        with LocalSite(self.pages) as site:
+            pages, scanned = self.crawl(site, max_depth=1)
+
+        blocked = [page for page in pages if page['url'].endswith('/private')]
+        self.assertEqual(blocked[0]['error'], "Blocked by robots.txt")
+        self.assertNotIn('/private', site.requests)
+        self.assertEqual(site.requests.count('/robots.txt'), 1)
+
+    def test_crawl_blocked_when_robots_refused(self):
+        '''
+        Checks a robots.txt answering 401 or 403 blocks the whole site, while a missing one allows it
+        '''
+        for status, allowed in [(401, False), (403, False), (404, True)]:
+            with LocalSite(dict(self.pages, **{'/robots.txt': status})) as site:
+                pages, scanned = self.crawl(site, max_depth=0)
+
+            self.assertEqual(scanned, ['/'] if allowed else [])
+            self.assertEqual(site.requests, ['/robots.txt'] + (['/'] if allowed else []))
+            if not allowed:
+                self.assertEqual(pages[0]['error'], "Blocked by robots.txt")
+
+    def test_crawl_max_pages(self):
+        '''
+        Checks the crawl stops once max_pages pages have been queued
+        '''
+        with LocalSite(self.pages) as site:
+            pages, scanned = self.crawl(site, max_depth=5, max_pages=2)
+
+        self.assertEqual(len(pages), 2)
+
+    def test_crawl_sitemap(self):
+        '''
+        Crawls the pages listed in a local sitemap without following their links
+        '''
+        pages = dict(self.pages)
+        with LocalSite(pages) as site:
+            pages['/sitemap.xml'] = (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f'<url><loc>{site.url}/a</loc></url><url><loc>{site.url}/b</loc></url>'
+                '</urlset>'
+            )
+            crawled, scanned = self.crawl(site, seeds=[], sitemaps=[site.url + '/sitemap.xml'], max_depth=0)
+
+        self.assertEqual(scanned, ['/a', '/b'])
+
+    def test_parse_sitemap_index(self):
+        '''
+        Checks a sitemap index returns the nested sitemaps instead of pages
+        '''
+        content = (
+            b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            b'<sitemap><loc>http://example.com/pages.xml</loc></sitemap></sitemapindex>'
+        )
+        self.assertEqual(parse_sitemap(content), ([], ['http://example.com/pages.xml']))
+
+    def test_extract_links(self):
+        '''
+        Checks links are made absolute and non-http links are dropped
+        '''
+        html_content = '<a href="/x#frag">x</a><a href="mailto:a@b.c">m</a><link href="/style.css">'
+        self.assertEqual(extract_links(html_content, 'http://example.com/page'), ['http://example.com/x'])
+
+    @override_settings(CRAWL_HOST_DELAY=0)
+    @patch('scanner.wcag_checker.run_access_scan')
+    def test_crawl_job(self, mock_run_scan):
+        '''
+        Runs a queued crawl job through the worker and checks the pages scanned are recorded
+        '''
+        with LocalSite(self.pages) as site:
+            job = run_scan_job(enqueue_crawl(site.url + '/', max_depth=1, max_pages=10))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.DONE)
+        self.assertEqual(job.pages_scanned, 2)
+        self.assertEqual(mock_run_scan.call_count, 2)
+
+    def test_crawl_view_queues_job(self):
+        '''
+        Posts the crawl form and checks a crawl job is queued
+        '''
+        response = self.client.post(reverse('crawl_site'), {
+            'url': 'http://example.com/sitemap.xml', 'mode': 'sitemap', 'max_depth': 0, 'max_pages': 50,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        job = response.context['job']
+        self.assertEqual(job.mode, ScanJob.SITEMAP)
+        self.assertEqual(job.max_pages, 50)
+
+###############################
+# fetcher.py tests
+
+class FetcherTestCase(TestCase):
+
+    pages = {'/': '<html><body>Hello</body></html>'}
+
+    def test_fetch_reads_body(self):
+        '''
+        Fetches a page from a local site and checks the body and validators
+        '''
+        with LocalSite(self.pages) as site:
+            response = fetch(site.url + '/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, self.pages['/'])
+        self.assertEqual(response.headers['ETag'], '"31"')
+
+    def test_fetch_conditional_not_modified(self):
+        '''
+        Checks the stored ETag is sent so an unchanged page comes back 304
+        '''
+        with LocalSite(self.pages) as site:
+            url = site.url + '/'
+            response = fetch(url, conditional=True)
+            self.assertEqual(response.status_code, 200)
+
+            result = AccessibilityResult.objects.create(url=url)
+            record_fetch(url, response, result)
+            response = fetch(url, conditional=True)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(FETCH_MAX_BYTES=10)
+    def test_fetch_too_large(self):
+        '''
+        Checks pages over FETCH_MAX_BYTES are abandoned
+        '''
+        with LocalSite(self.pages) as site:
+            with self.assertRaises(ResponseTooLarge):
+                fetch(site.url + '/')
+
+    def test_session_is_shared(self):
+        '''
+        Checks every fetch uses the same pooled session
+        '''
+        self.assertIs(get_session(), get_session())
+        self.assertIn('gzip', get_session().headers['Accept-Encoding'])
+
+###############################
+# wcag_script.py tests
+
+class AccessibilityTests(unittest.TestCase):
+
+    @patch('scanner.wcag_script.Anteater')
+    def test_run_validator_success(self, MockAnteater):
+        '''
+        Testing Anteater validator
+        '''
+        mock_validator_instance = MockAnteater.return_value
+        mock_validator_instance.validate_document.return_value = {
+            'failures': {
+                'guideline1': {
+                    'technique1': [
+                        {'message': 'Example failure', 'error_code': 'E1'}
+                    ]
+                }
+            }
+        }
+
+        html_content = "<html><body>Test</body></html>"
+        result = run_validator(MockAnteater, html_content)
+
+        self.assertIn('failures', result)
+        self.assertEqual(result['failures']['guideline1']['technique1'][0]['message'], 'Example failure')
+        mock_validator_instance.validate_document.assert_called_once()
+
+    @patch('scanner.wcag_script.fetch')
+    @patch('scanner.wcag_script.run_validator')
+    def test_check_accessibility_with_issues(self, mock_run_validator, mock_requests_get):
+        '''
+        Creating a bad validator response and checking the function returns the expected result
+        '''
+        mock_response = MagicMock()
+        mock_response.text = "<html><body>Example content</body></html>"
+        mock_response.url = "http://example.com"
+
+        mock_requests_get.return_value = mock_response
+
+        mock_run_validator.return_value = {
+            'failures': {
+                'guideline1': {
+                    'technique1': [
+                        {'message': 'Failure message', 'error_code': 'F1', 'xpath': '//div'}
+                    ]
+                }
+            },
+            'warnings': {},
+            'skipped': {}
+        }
+
+        result = check_accessibility(mock_response)
+        #print(json.dumps(result, indent=2))
+
+
+        self.assertIn('failures', result)
+        self.assertEqual(len(result['failures']), 5)
+        self.assertEqual(result['failures'][0]['message'], 'Failure message')
+
+    def test_check_accessibility_no_issues(self):
+        """
+        Test the accessibility check when no issues are found in the response.
+        """
+        # Create a mock response with valid HTML content and a URL
+        mock_response = MagicMock()
+        mock_response.text = "<html><body>No issues here</body></html>"
+        mock_response.url = "http://example.com"
+
+        # Mock run_validator to return empty results for all validators
+        with patch('scanner.wcag_script.run_validator') as mock_run_validator:
+            mock_run_validator.return_value = {
+                'success': {},
+                'failures': {},
+                'warnings': {},
+                'skipped': {}
+            }
+
+            # Call the function under test
+            result = check_accessibility(mock_response)
+
+            # Define the expected result, including the serif_font_check key
+            expected_result = {
+                'success': [],
+                'failures': [],
+                'warnings': [],
+                'skipped': [],
+                'serif_font_check': ['No serif fonts found in url.']
+            }
+
+            # Assertions
+            self.assertEqual(result, expected_result)
+
+
+
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_check_accessibility_compact_rows(self, mock_run_validator):
+        '''
+        Checks rows share the url and timestamp, intern repeated strings and serialize to the row dict
+        '''
+        mock_response = MagicMock()
+        mock_response.text = "<html><body>Example content</body></html>"
+        mock_response.url = "http://example.com"
+        mock_run_validator.return_value = {'success': {'1.3.1': {'H42': [
+            {'guideline': '1.3.1', 'technique': ''.join(['H', '42']), 'message': 'Heading - /h1', 'xpath': '/h1'},
+            {'guideline': '1.3.1', 'technique': ''.join(['H', '42']), 'message': 'Heading - /h2', 'xpath': '/h2'},
+        ]}}}
+
+        result = check_accessibility(mock_response)
+        first, second = result['success'][:2]
+
+        self.assertIs(first.technique, second.technique)
+        self.assertIs(first['datetime'], second['datetime'])
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertEqual(first['xpath'], '/h1')
+        self.assertIsNone(first.get('id'))
+        self.assertEqual(json.loads(json.dumps(result, default=json_default))['success'][0], dict(first))
+        self.assertEqual(dict(first), {
+            'datetime': first['datetime'], 'url': 'http://example.com', 'section_type': 'success',
+            'guideline': '1.3.1', 'technique': 'H42', 'message': 'Heading - /h1', 'error_code': None,
+            'xpath': '/h1', 'classes': None, 'id': None,
+        })
+
+    def test_run_validator_empty_html(self):
+        '''
+        Testing an empty html response
+        '''
+        html_content = ""
+        with patch('scanner.wcag_script.Ayeaye') as MockAyeaye:
+            mock_validator_instance = MockAyeaye.return_value
+            mock_validator_instance.validate_document.return_value = {}
+
+            result = run_validator(MockAyeaye, html_content)
+
+
+            self.assertEqual(result, {})
+            mock_validator_instance.validate_document.assert_called_once_with(b"")
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_check_accessibility_handles_wrong_format_results(self, mock_run_validator):
+        '''
+        Testing a wrong-format response
+        '''
+        mock_response = MagicMock()
+        mock_response.text = "<html><body>wrong format results</body></html>"
+        mock_response.url = "http://example.com"
+
+        mock_run_validator.return_value = {'failures': "This is not a dictionary"}
+
+        with self.assertRaises(AttributeError):
+            check_accessibility(mock_response)
+
+
+class FindingStreamTests(TestCase):
+
+    validator_result = {
+        'success': {'1.3.1': {'H42': [{'message': 'Heading', 'xpath': '/h1'}]}},
+        'failures': {'1.1.1': {'H37': [
+            {'message': 'Missing alt - /img[%d]' % n, 'error_code': 'anteater-1', 'xpath': '/img[%d]' % n}
+            for n in range(3)
+        ]}},
+    }
+
+    def response(self):
+        mock_response = MagicMock()
+        mock_response.text = "<html><body>Example content</body></html>"
+        mock_response.url = "http://example.com"
+        mock_response.status_code = 200
+        return mock_response
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_stops_after_max_failures(self, mock_run_validator):
+        '''
+        Checks the stream stops after max_failures without running the other validators or the font check
+        '''
+        mock_run_validator.return_value = self.validator_result
+        stream = FindingStream(self.response(), executor='serial', max_failures=2)
+        rows = list(stream)
+
+        self.assertEqual([row.section_type for row in rows], ['success', 'failures', 'failures'])
+        self.assertEqual(mock_run_validator.call_count, 1)
+        self.assertTrue(stream.stopped_early)
+        self.assertEqual(stream.failures, 2)
+        self.assertEqual(stream.serif_font_check, [])
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_sections_and_async_iteration(self, mock_run_validator):
+        '''
+        Checks skipped sections are left out and async iteration yields the same rows
+        '''
+        mock_run_validator.return_value = self.validator_result
+        results = check_accessibility(self.response(), sections=['failures'])
+
+        self.assertEqual(results['success'], [])
+        self.assertEqual(len(results['failures']), 15)
+        self.assertEqual(results['serif_font_check'], ['No serif fonts found in url.'])
+
+        async def collect():
+            return [row async for row in FindingStream(self.response(), sections=['failures'])]
+        self.assertEqual([dict(row, datetime=None) for row in asyncio.run(collect())],
+                         [dict(row, datetime=None) for row in results['failures']])
+
+    @patch('scanner.wcag_script.run_validator')
+    @patch('scanner.renderers.fetch')
+    def test_stream_view(self, mock_fetch, mock_run_validator):
+        '''
+        Checks the stream view writes a line per finding and a summary, and rejects bad options
+        '''
+        mock_fetch.return_value = self.response()
+        mock_run_validator.return_value = self.validator_result
+        self.client.force_login(User.objects.create_user(username='streamer', password='password'))
+
+        response = self.client.get(reverse('stream_scan'), {'url': 'http://example.com', 'max_failures': 4})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(lines[0]['message'], 'Heading')
+        self.assertEqual(lines[-1], {'done': True, 'failures': 4, 'stopped_early': True, 'serif_font_check': []})
+        self.assertEqual(self.client.get(reverse('stream_scan'), {'url': 'http://example.com', 'sections': 'all'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('stream_scan')).status_code, 400)
+
+    @override_settings(STREAM_SCAN_MAX_CONCURRENT=1)
+    @patch('scanner.wcag_script.run_validator')
+    @patch('scanner.renderers.fetch')
+    def test_stream_view_needs_login_and_caps_concurrent_scans(self, mock_fetch, mock_run_validator):
+        '''
+        Checks anonymous requests never fetch, and a scan past the cap is turned away until one finishes
+        '''
+        mock_fetch.return_value = self.response()
+        mock_run_validator.return_value = self.validator_result
+        params = {'url': 'http://example.com'}
+
+        response = self.client.get(reverse('stream_scan'), params)
+        self.assertEqual(response.status_code, 302)
+        mock_fetch.assert_not_called()
+
+        self.client.force_login(User.objects.create_user(username='streamer', password='password'))
+        first = self.client.get(reverse('stream_scan'), params)
+        busy = self.client.get(reverse('stream_scan'), params)
+        self.assertEqual(busy.status_code, 429)
+        self.assertIn('Retry-After', busy)
+        # Closing the first response frees its slot even though it was never read
+        first.close()
+        second = self.client.get(reverse('stream_scan'), params)
+        self.assertEqual(second.status_code, 200)
+        b''.join(second.streaming_content)
+        second.close()
+
+    @patch('scanner.wcag_script.run_validator')
+    @patch('scanner.renderers.fetch')
+    def test_scan_gate_command(self, mock_fetch, mock_run_validator):
+        '''
+        Checks the CI gate fails on failures and passes a clean page
+        '''
+        mock_fetch.return_value = self.response()
+        mock_run_validator.return_value = self.validator_result
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('scan_gate', 'http://example.com', '--max-failures', '1', stdout=out)
+        self.assertIn('1 failures (stopped early)', out.getvalue())
+        self.assertFalse(AccessibilityResult.objects.exists())
+
+        mock_run_validator.return_value = {'success': self.validator_result['success']}
+        out = io.StringIO()
+        call_command('scan_gate', 'http://example.com', stdout=out)
+        self.assertIn('http://example.com - passed', out.getvalue())
+
+class CheckForSerifFontsTests(unittest.TestCase):
+
+    def test_check_for_serif_fonts_with_serif(self):
+        '''
+        Tests the function when serif fonts are present in the content.
+        '''
+        content = """
+        <html>
+            <style>
+                body { font-family: "Times New Roman", serif; }
+                p { font-family: Georgia, serif; }
+            </style>
+        </html>
+        """
+        result = check_for_serif_fonts(content)
+        self.assertEqual(result, "Serif font found in url.")
+
+    def test_check_for_serif_fonts_without_serif(self):
+        '''
+        Tests the function when no serif fonts are present in the content.
+        '''
+        content = """
+        <html>
+            <style>
+                body { font-family: Arial, sans-serif; }
+                p { font-family: Helvetica, sans-serif; }
+            </style>
+        </html>
+        """
+        result = check_for_serif_fonts(content)
+        self.assertEqual(result, "No serif fonts found in url.")
+
+    def test_check_for_serif_fonts_mixed_fonts(self):
+        '''
+        Tests the function when both serif and sans-serif fonts are present in the content.
+        '''
+        content = """
+        <html>
+            <style>
+                body { font-family: "Times New Roman", serif; }
+                p { font-family: Arial, sans-serif; }
+            </style>
+        </html>
+        """
+        result = check_for_serif_fonts(content)
+        self.assertEqual(result, "Serif font found in url.")
+
+    def test_check_for_serif_fonts_empty_content(self):
+        '''
+        Tests the function with empty content.
+        '''
+        content = ""
+        result = check_for_serif_fonts(content)
+        self.assertEqual(result, "No serif fonts found in url.")
+
+
+class FontAnalysisTests(unittest.TestCase):
+
+    def test_parse_stylesheet(self):
+        '''
+        Checks rules are read through comments, strings, @media and skipped at-rules
+        '''
+        css = '''@import url("print.css"); /* p { font-family: serif } */
+            @media screen { h1, h2 { font: bold 2em/1.2 Georgia, serif } }
+            @font-face { font-family: Lora; src: url(lora.woff) }
+            p::before { content: "}" } .a { color: red }'''
+
+        rules, imports = parse_stylesheet(css)
+
+        self.assertEqual(imports, ['print.css'])
+        self.assertEqual([selector for selector, body in rules], ['h1, h2', 'p::before', '.a'])
+
+    def test_effective_font_per_element(self):
+        '''
+        Checks the cascade, inline styles and inheritance decide each element's font
+        '''
+        html_content = '''<html><head><style>
+            body { font-family: "Times New Roman", serif }
+            .sans { font-family: Arial, sans-serif }
+            #main p { font: italic 12px Georgia, serif }
+            .forced { font-family: Verdana !important }
+            </style></head><body>
+            <h1>Serif from body</h1>
+            <div class="sans"><p>Serif from #main? no</p><span>Sans</span></div>
+            <div id="main"><p class="sans">More specific id rule wins</p>
+            <p style="font-family: Helvetica">Inline wins</p>
+            <p class="forced" style="font-family: Georgia">Important wins</p></div>
+            </body></html>'''
+
+        analysis = analyse_fonts(html_content)
+
+        self.assertEqual(
+            [element['xpath'] for element in analysis.elements],
+            ['/html/body/h1', '/html/body/div[2]/p[1]'],
+        )
+        finding = analysis.elements[0]
+        self.assertEqual(finding['error_code'], 'fonts-serif')
+        self.assertEqual(finding['guideline'], '1.4.8')
+        self.assertEqual(analysis.summary, "Serif font found in url.")
+
+    def test_text_after_child_elements(self):
+        '''
+        Checks text following a child element is judged by its parent's font, not the child's
+        '''
+        html_content = '''<html><head><style>
+            p { font-family: Georgia, serif } b, i { font-family: Arial }
+            div { font-family: Arial } em { font-family: Georgia }
+            </style></head><body>
+            <p><b>Sans</b> serif tail</p>
+            <p><i>Sans only</i> </p>
+            <div><em>Serif</em> sans tail<!-- note --> more</div>
+            <div>Sans<script>var a;</script></div>
+            </body></html>'''
+
+        analysis = analyse_fonts(html_content)
+
+        self.assertEqual(
+            [element['xpath'] for element in analysis.elements],
+            ['/html/body/p[1]', '/html/body/div[1]/em'],
+        )
+
+    def test_linked_stylesheets(self):
+        '''
+        Checks linked and imported stylesheets are applied and failures are reported as skipped
+        '''
+        sheets = {
+            'http://example.com/css/site.css': '@import "fonts.css"; p { color: red }',
+            'http://example.com/css/fonts.css': 'p { font-family: Garamond }',
+        }
+
+        def load(url):
+            if url not in sheets:
+                raise requests.exceptions.HTTPError("404 Client Error")
+            return parse_stylesheet(sheets[url])
+
+        html_content = '''<html><head><link rel="stylesheet" href="/css/site.css">
+            <link rel="stylesheet" href="/css/missing.css"></head><body><p>Text</p></body></html>'''
+        analysis = analyse_fonts(html_content, base_url='http://example.com/page', load_stylesheet=load)
+
+        self.assertEqual(len(analysis.elements), 1)
+        skipped = analysis.as_validator_result()['skipped']['1.4.8']['C22']
+        self.assertIn('missing.css', skipped[0]['message'])
+
+    def test_pathological_input_is_fast(self):
+        '''
+        Checks input that made the old regex backtrack is handled in linear time
+        '''
+        content = '<p style="font-family:' + ' serif-ish' * 20000 + '">x</p>' + '<b>font-family: a</b>' * 2000
+
+        start = time.perf_counter()
+        check_for_serif_fonts(content)
+        self.assertLess(time.perf_counter() - start, 2)
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_check_accessibility_reports_serif_elements(self, mock_run_validator):
+        '''
+        Checks serif text elements are reported as warning rows alongside the validators
+        '''
+        mock_run_validator.return_value = {}
+        mock_response = MagicMock()
+        mock_response.text = '<html><body><p style="font-family: Georgia, serif">Serif</p></body></html>'
+        mock_response.url = "http://example.com"
+
+        result = check_accessibility(mock_response)
+
+        self.assertEqual(result['serif_font_check'], ["Serif font found in url."])
+        self.assertEqual(result['warnings'][0]['xpath'], '/html/body/p')
+        self.assertEqual(result['warnings'][0]['url'], 'http://example.com')
+
+
+###############################
+# stylesheets.py tests
+
+class StylesheetCacheTestCase(TestCase):
+
+    pages = {
+        '/site.css': 'body { font-family: Georgia, serif } .faint { color: #eeeeee }',
+        '/other.css': 'p { color: red }',
+        '/a': '<html><head><link rel="stylesheet" href="/site.css"></head><body><p class="faint">A</p></body></html>',
+        '/b': '<html><head><link rel="stylesheet" href="site.css"><link rel="stylesheet" href="/gone.css"></head><body><p>B</p></body></html>',
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(STYLESHEET_CACHE_DIR=directory.name, RESULT_CACHE_ENABLED=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory.name
+
+    def test_downloads_once(self):
+        '''
+        Checks a stylesheet is downloaded and parsed once, then served from memory and from disk
+        '''
+        cache = StylesheetCache()
+        with LocalSite(self.pages) as site:
+            rules, imports = cache.get_rules(site.url + '/site.css')
+            self.assertEqual(cache.get_text(site.url + '/site.css'), self.pages['/site.css'])
+
+            # A new process finds it on disk
+            other = StylesheetCache()
+            other.get_text(site.url + '/site.css')
+
+        self.assertEqual(rules[0], ('body', ' font-family: Georgia, serif '))
+        self.assertEqual(site.requests.count('/site.css'), 1)
+        self.assertEqual(cache.stats()['memory_hits'], 1)
+        self.assertEqual(other.stats()['disk_hits'], 1)
+
+    @override_settings(STYLESHEET_CACHE_MAX_AGE=0)
+    def test_revalidates_with_etag(self):
+        '''
+        Checks a stale entry is revalidated with its ETag instead of downloaded again
+        '''
+        cache = StylesheetCache()
+        with LocalSite(self.pages) as site:
+            cache.get_text(site.url + '/site.css')
+            cache.get_text(site.url + '/site.css')
+
+        self.assertEqual(site.requests.count('/site.css'), 2)
+        self.assertEqual(cache.stats()['downloads'], 1)
+        self.assertEqual(cache.stats()['revalidated'], 1)
+
+    def test_memory_and_disk_budgets(self):
+        '''
+        Checks the least recently used stylesheets are dropped to stay within each byte budget
+        '''
+        cache = StylesheetCache()
+        with LocalSite(self.pages) as site:
+            with override_settings(STYLESHEET_CACHE_MEMORY_BYTES=100, STYLESHEET_CACHE_DISK_BYTES=300):
+                cache.get_text(site.url + '/site.css')
+                cache.get_text(site.url + '/other.css')
+
+        self.assertEqual(cache.stats()['memory_entries'], 1)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        # The per-URL locks don't grow with the URLs seen
+        self.assertEqual(len(cache._url_locks), URL_LOCK_STRIPES)
+
+    def test_validators_share_stylesheets_across_scans(self):
+        '''
+        Scans two pages linking the same stylesheet and checks it is fetched once,
+        and that a missing stylesheet doesn't fail the scan
+        '''
+        stylesheet_cache.clear()
+        with LocalSite(self.pages) as site:
+            first = check_accessibility(fetch(site.url + '/a'))
+            second = check_accessibility(fetch(site.url + '/b'))
+
+        self.assertEqual(site.requests.count('/site.css'), 1)
+        self.assertEqual(site.requests.count('/gone.css'), 1)
+        self.assertEqual(first['serif_font_check'], ["Serif font found in url."])
+        self.assertTrue(any(row['error_code'] == 'fonts-stylesheet' for row in second['skipped']))
+
+
+###############################
+# pipeline.py tests
+
+class ParsedDocumentTests(unittest.TestCase):
+
+    html_content = """
+    <html>
+        <head>
+            <style>
+                p { color: #777777; background-color: #888888; }
+                a:focus { outline: none; }
+            </style>
+        </head>
+        <body>
+            <h1>Title</h1>
+            <h3>Skipped a level</h3>
+            <img src="logo.png">
+            <p accesskey="a">Low contrast text</p>
+            <a href="#" accesskey="a">Link</a>
+        </body>
+    </html>
+    """
+
+    def test_shared_document_matches_separate_parses(self):
+        '''
+        Tests that validators sharing one parsed document give the same results as
+        each validator parsing the page itself
+        '''
+        document = ParsedDocument(self.html_content)
+
+        for ValidatorClass in [Anteater, Ayeaye, Glowworm, Molerat, Tarsier]:
+            self.assertEqual(
+                run_validator(ValidatorClass, self.html_content, document),
+                run_validator(ValidatorClass, self.html_content)
+            )
+
+    def test_styled_tree_built_once_per_css_options(self):
+        '''
+        Tests that only Glowworm, which keeps pseudo-classes, needs its own styled tree
+        '''
+        document = ParsedDocument(self.html_content)
+
+        shared_tree = document.styled_tree(Anteater)
+        for ValidatorClass in [Ayeaye, Molerat, Tarsier]:
+            self.assertIs(document.styled_tree(ValidatorClass), shared_tree)
+        self.assertIsNot(document.styled_tree(Glowworm), shared_tree)
+        self.assertEqual(len(document._styled_trees), 2)
+
+    def test_check_accessibility_parses_once(self):
+        '''
+        Tests that check_accessibility hands the same parsed document to every validator
+        '''
+        mock_response = MagicMock()
+        mock_response.text = self.html_content
+        mock_response.url = "http://example.com"
+
+        with patch('scanner.wcag_script.run_validator', return_value={}) as mock_run_validator:
+            check_accessibility(mock_response)
+
+        documents = {id(call.args[2]) for call in mock_run_validator.call_args_list}
+        self.assertEqual(mock_run_validator.call_count, 5)
+        self.assertEqual(len(documents), 1)
+
+
+class ValidatorExecutorTests(unittest.TestCase):
+
+    html_content = ParsedDocumentTests.html_content
+
+    def scan(self, executor):
+        mock_response = MagicMock()
+        mock_response.text = self.html_content
+        mock_response.url = "http://example.com"
+        result = check_accessibility(mock_response, executor=executor)
+        # Drop the timestamps so scans run at different times compare equal
+        for section in ['success', 'failures', 'warnings', 'skipped']:
+            result[section] = [dict(row, datetime=None) for row in result[section]]
+        return result
+
+    def test_thread_and_process_backends_match_serial(self):
+        '''
+        Tests that fanning the validators out keeps the same results in the same order
+        '''
+        serial_result = self.scan('serial')
+
+        self.assertTrue(serial_result['failures'])
+        self.assertEqual(self.scan('thread'), serial_result)
+        self.assertEqual(self.scan('process'), serial_result)
+
+    def test_unknown_backend(self):
+        '''
+        Tests that an unknown executor name is reported as a configuration error
+        '''
+        with self.assertRaises(ImproperlyConfigured):
+            get_executor('cluster')
+
+    def test_pools_are_reused(self):
+        '''
+        Tests that pools are kept between scans instead of being started every time
+        '''
+        self.assertIs(get_executor('thread'), get_executor('thread'))
+        self.assertIsInstance(get_executor('serial'), SerialExecutor)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_executors()
+        super().tearDownClass()
+
+
+
+###############################
+# result_cache.py tests
+
+class ResultCacheTestCase(TestCase):
+
+    def setUp(self):
+        result_cache.clear()
+
+    def scan(self, html_content):
+        mock_response = MagicMock()
+        mock_response.text = html_content
+        mock_response.url = "http://example.com"
+        return check_accessibility(mock_response, use_cache=True)
+
+    @patch('scanner.wcag_script.run_validator')
+    def test_identical_pages_hit_the_cache(self, mock_run_validator):
+        '''
+        Scans the same page twice and checks the validators only run the first time
+        '''
+        mock_run_validator.return_value = {
+            'failures': {'1.1.1': {'H37': [{'message': 'Missing alt', 'error_code': 'anteater-1'}]}}
+        }
+
+        first = self.scan("<html><body><img></body></html>")
+        second = self.scan("<html><body><img></body></html>\r\n")
+
+        self.assertEqual(mock_run_validator.call_count, 5)
+        self.assertEqual(len(second['failures']), len(first['failures']))
+        self.assertEqual(result_cache.counters['memory_hits'], 1)
+        self.assertEqual(result_cache.counters['misses'], 1)
+
+    @patch('scanner.wcag_script.run_validator', return_value={})
+    def test_changed_page_misses(self, mock_run_validator):
+        '''
+        Checks a changed page is validated again
+        '''
+        self.scan("<html><body>One</body></html>")
+        self.scan("<html><body>Two</body></html>")
+
+        self.assertEqual(mock_run_validator.call_count, 10)
+
+    @patch('scanner.wcag_script.run_validator', return_value={})
+    def test_changed_stylesheet_misses(self, mock_run_validator):
+        '''
+        Checks a page is validated again when only a stylesheet it links to changed
+        '''
+        page = '<html><head><link rel="stylesheet" href="/site.css"></head><body>One</body></html>'
+        with patch.object(stylesheet_cache, 'get_text', return_value='p { color: #000 }') as mock_get_text:
+            self.scan(page)
+            self.scan(page)
+            mock_get_text.return_value = 'p { color: #eee }'
+            self.scan(page)
+
+        mock_get_text.assert_called_with('http://example.com/site.css')
+        self.assertEqual(mock_run_validator.call_count, 10)
+        self.assertEqual(result_cache.counters['memory_hits'], 1)
+
+    def test_database_tier(self):
+        '''
+        Checks a new process with an empty memory tier finds results in the database
+        '''
+        result_cache.set('abc', [{'failures': {}}])
+
+        cache = ResultCache()
+        self.assertEqual(cache.get('abc'), [{'failures': {}}])
+        self.assertEqual(cache.counters['database_hits'], 1)
+        self.assertEqual(CachedResult.objects.get(key='abc').hits, 1)
+
+    def test_failed_database_write_is_not_fatal(self):
+        '''
+        Checks a locked database only costs the database tier its entry
+        '''
+        with patch.object(CachedResult.objects, 'update_or_create', side_effect=OperationalError('database is locked')):
+            result_cache.set('abc', [])
+
+        self.assertEqual(result_cache.get('abc'), [])
+        self.assertEqual(result_cache.counters['write_errors'], 1)
+        self.assertFalse(CachedResult.objects.exists())
+
+    @override_settings(RESULT_CACHE_MEMORY_ENTRIES=1)
+    def test_memory_tier_is_lru(self):
+        '''
+        Checks the memory tier only keeps the most recently used entries
+        '''
+        result_cache.set('first', [])
+        result_cache.set('second', [])
+
+        self.assertEqual(list(result_cache._memory), ['second'])
+
+    @override_settings(RESULT_CACHE_MAX_BYTES=15)
+    def test_evict_by_size(self):
+        '''
+        Checks the least recently used entries are deleted to fit the byte budget
+        '''
+        result_cache.set('old', ['aaaaaaa'])
+        result_cache.set('new', ['bbbbbbb'])
+        CachedResult.objects.filter(key='old').update(last_used_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(result_cache.evict(), 1)
+        self.assertEqual(list(CachedResult.objects.values_list('key', flat=True)), ['new'])
+
+    def test_evict_by_age(self):
+        '''
+        Checks entries older than RESULT_CACHE_MAX_AGE are deleted
+        '''
+        result_cache.set('old', [])
+        CachedResult.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(result_cache.evict(), 1)
+        self.assertIsNone(ResultCache().get('old'))
+
+    def test_cache_stats_view(self):
+        '''
+        Checks the counters are exposed as JSON
+        '''
+        result_cache.get('missing')
+
+        response = self.client.get(reverse('cache_stats'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['misses'], 1)
+        self.assertEqual(response.json()['database_entries'], 0)
+
+###############################
+# instrumentation.py tests
+
+@override_settings(RESULT_CACHE_ENABLED=False)
+class InstrumentationTestCase(TestCase):
+
+    html_content = '<html lang="en"><head><title>T</title></head><body><h1>Hi</h1><img src="a.png"></body></html>'
+
+    def setUp(self):
+        metrics_registry.clear()
+
+    def scan(self):
+        response = MagicMock(text=self.html_content, url='http://example.com')
+        return run_access_scan(response)
+
+    def test_registry_render(self):
+        '''
+        Checks counters and histograms are rendered in the Prometheus text format
+        '''
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.describe('jobs_total', 'Jobs run')
+        registry.inc('jobs_total', status='done')
+        registry.inc('jobs_total', status='done')
+        registry.observe('stage_seconds', 0.5, stage='fetch')
+        registry.observe('stage_seconds', 2.0, stage='fetch')
+
+        text = registry.render()
+
+        self.assertIn('# HELP jobs_total Jobs run\n# TYPE jobs_total counter', text)
+        self.assertIn('jobs_total{status="done"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="fetch",le="0.1"} 0', text)
+        self.assertIn('stage_seconds_bucket{stage="fetch",le="1.0"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="fetch",le="+Inf"} 2', text)
+        self.assertIn('stage_seconds_sum{stage="fetch"} 2.5', text)
+
+    def test_scan_records_timings(self):
+        '''
+        Checks each stage and validator is timed and stored on the scan, in the one write
+        '''
+        with CaptureQueriesContext(connection) as queries:
+            scan = self.scan()
+
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "scanner_accessibilityresult"') for query in queries.captured_queries
+        ))
+
+        self.assertEqual(set(scan.timings['stages']), {'parse', 'validate', 'fonts'})
+        self.assertEqual(AccessibilityResult.objects.get().timings, scan.timings)
+        self.assertIn('scan_stage_seconds_count{stage="persist"} 1', metrics_registry.render())
+        self.assertEqual(set(scan.timings['validators']), {'Anteater', 'Ayeaye', 'Glowworm', 'Molerat', 'Tarsier'})
+        self.assertGreater(scan.timings['validators']['Molerat']['wall'], 0)
+        self.assertIsNone(scan.timings['stages']['parse']['allocated'])
+        self.assertIn('scan_validator_seconds_count{validator="Molerat"} 1', metrics_registry.render())
+
+    @override_settings(SCAN_TRACE_ALLOCATIONS=True)
+    def test_scan_traces_allocations(self):
+        '''
+        Checks allocated bytes are recorded when tracing is switched on
+        '''
+        scan = self.scan()
+
+        self.assertGreater(scan.timings['stages']['validate']['allocated'], 0)
+        self.assertGreater(scan.timings['validators']['Anteater']['allocated'], 0)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @override_settings(SCAN_TRACE_ALLOCATIONS=True)
+    def test_tracing_outlives_the_first_scan_to_finish(self):
+        '''
+        Checks a scan that finishes first leaves tracemalloc running for the scans still going
+        '''
+        first, second = ScanMetrics(), ScanMetrics()
+        self.assertTrue(tracemalloc.is_tracing())
+        first.finish()
+        self.assertTrue(tracemalloc.is_tracing())
+        second.finish()
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @patch('scanner.crawler.Crawler.run')
+    def test_crawl_jobs_counted(self, mock_run):
+        '''
+        Checks finished crawl jobs are counted in scan_jobs_total like page jobs
+        '''
+        mock_run.return_value = [{'url': 'http://example.com/', 'depth': 0, 'status_code': 200, 'error': ''}]
+        run_scan_job(enqueue_crawl('http://example.com/'))
+        mock_run.return_value = []
+        run_scan_job(enqueue_crawl('http://example.com/sitemap.xml', mode=ScanJob.SITEMAP))
+
+        rendered = metrics_registry.render()
+        self.assertIn('scan_jobs_total{status="done"} 1', rendered)
+        self.assertIn('scan_jobs_total{status="failed"} 1', rendered)
+
+    def test_scan_profile(self):
+        '''
+        Checks a profile and memory summary are written per scan when profiling is on
+        '''
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(SCAN_PROFILE=True, SCAN_PROFILE_DIR=directory):
+                scan = self.scan()
+
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                [f'scan-{scan.pk}-memory.txt', f'scan-{scan.pk}.prof'],
+            )
+            pstats.Stats(os.path.join(directory, f'scan-{scan.pk}.prof'))
+
+    def test_metrics_view(self):
+        '''
+        Checks the metrics endpoint serves the registry as plain text
+        '''
+        metrics_registry.inc('scan_jobs_total', status='done')
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('scan_jobs_total{status="done"} 1', response.content.decode('utf-8'))
+        self.assertIn('result_cache_misses_total', response.content.decode('utf-8'))
+
+###############################
+# benchmark.py tests
+
+class BenchmarkTestCase(TestCase):
+
+    def test_generate_page_is_deterministic(self):
+        '''
+        Checks the same arguments give the same page and the size is close to the target
+        '''
+        page = generate_page(50 * 1024, seed=3)
+
+        self.assertEqual(page, generate_page(50 * 1024, seed=3))
+        self.assertNotEqual(page, generate_page(50 * 1024, seed=4))
+        self.assertGreaterEqual(len(page), 50 * 1024)
+        self.assertLess(len(page), 60 * 1024)
+
+    def test_generate_page_density(self):
+        '''
+        Checks the element counts scale with the density per block
+        '''
+        page = generate_page(20 * 1024, density={'images': 2, 'tables': 0})
+
+        self.assertEqual(page.count('<img'), 4)
+        self.assertNotIn('<table', page)
+
+    def test_run_benchmark(self):
+        '''
+        Checks the report has timings and peak memory per validator and in total,
+        and that the benchmark scans leave nothing in the database
+        '''
+        report = run_benchmark(sizes=[4 * 1024], repeat=1)
+
+        page = report['pages'][str(4 * 1024)]
+        self.assertEqual(set(page['validators']), {'Anteater', 'Ayeaye', 'Glowworm', 'Molerat', 'Tarsier'})
+        self.assertEqual(len(page['total']['runs']), 1)
+        self.assertGreater(page['total']['peak_memory'], 0)
+        self.assertFalse(AccessibilityResult.objects.exists())
+        json.dumps(report)
+
+    def test_compare_reports(self):
+        '''
+        Checks a slowdown past the threshold is flagged as a regression
+        '''
+        def report(median):
+            timing = {'median': median, 'peak_memory': 100}
+            return {'pages': {'1024': {'total': timing, 'validators': {'Anteater': timing}}}}
+
+        comparisons = compare_reports(report(1.0), report(1.5), threshold=0.2)
+
+        self.assertEqual(len(comparisons), 4)
+        self.assertEqual(
+            {(c['name'], c['metric']) for c in comparisons if c['regressed']},
+            {('total', 'median'), ('Anteater', 'median')},
+        )
+        self.assertFalse(any(c['regressed'] for c in compare_reports(report(1.0), report(1.1))))
+
+        baseline, current = report(1.0), report(1.0)
+        baseline['startup'] = {'web': {'median': 0.05}}
+        current['startup'] = {'web': {'median': 0.2}}
+        regressed = [c['name'] for c in compare_reports(baseline, current) if c['regressed']]
+        self.assertEqual(regressed, ['web startup'])
+
+    def test_web_startup_skips_scanning_libraries(self):
+        '''
+        Starts a fresh interpreter and checks serving the app doesn't import the
+        validators, lxml or requests until a view scans a page
+        '''
+        startup = measure_startup('accessibility_scanner.urls', repeat=1)
+
+        self.assertEqual(startup['heavy_modules'], [])
+        self.assertEqual(len(startup['runs']), 1)
@@ -1,11 +1,29 @@
 from django.urls import path
-from . import views
+from . import api, views
 from .views import dashboard
 
 urlpatterns = [
     path('', views.check_url, name='check_url'),
+    path('crawl/', views.crawl_site, name='crawl_site'),
+    path('upload/', views.scan_upload, name='scan_upload'),
+    path('scan_status/<int:job_id>/', views.scan_status, name='scan_status'),
     path('dashboard/', dashboard, name='dashboard'),
+    path('dashboard/trend/', views.dashboard_trend, name='dashboard_trend'),
+    path('history/', views.scan_history, name='scan_history'),
+    path('cache_stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics, name='metrics'),
     path('download_json/', views.download_json, name='download_json'),
+    path('export/', views.export_results, name='export_results'),
+    path('stream/', views.stream_scan, name='stream_scan'),
+    path('changes/', views.scan_changes, name='scan_changes'),
+    path('changes/<int:scan_id>/', views.scan_changes, name='scan_changes_for_scan'),
+    path('api/scans/', api.submit_scans, name='api_submit_scans'),
+    path('api/scans/<int:job_id>/', api.scan_detail, name='api_scan'),
+    path('api/results/', api.result_list, name='api_results'),
+    path('api/results/<int:scan_id>/', api.result_detail, name='api_result'),
+    path('api/results/<int:scan_id>/findings/', api.result_findings, name='api_result_findings'),
+    path('api/findings/', api.finding_list, name='api_findings'),
+    path('api/rollups/', api.rollup_list, name='api_rollups'),
     path("login/", views.sign_in, name="login"),
     path("logout/", views.sign_out, name="logout"),
     path("register/", views.register, name="register"),
@@ -4,22 +4,126 @@
 
 #from .models import AccessibilityResult
 
-from .models import AccessibilityResult
+from itertools import islice
+
+from .incremental import plan_findings
+from .models import AccessibilityResult, Finding
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
-import json
 
-def save_accessibility_result(results, url):
+SUMMARY_FIELDS = {
+    'success': ('success_count', 'success_example'),
+    'failures': ('failure_count', 'failure_example'),
+    'warnings': ('warning_count', 'warning_example'),
+    'skipped': ('skipped_count', 'skipped_example'),
+}
+
 
+def summarize_results(results):
     """
-    Save the accessibility results to the AccessibilityResult model using Django's ORM.
+    Counts the rows in each section and takes the first message as an example
+
+    Args:
+        results (dict): The results from check_accessibility
+
+    Returns:
+        dict: AccessibilityResult summary field values
+    """
+    summary = {}
+    for section, (count_field, example_field) in SUMMARY_FIELDS.items():
+        rows = results.get(section) or []
+        message = rows[0].get('message') if rows else None
+        summary[count_field] = len(rows)
+        summary[example_field] = message.split(' - ')[0] if message else ''
+    return summary
+
+
+def build_accessibility_result(results, url, timings=None, profile=None, user=None):
     """
-    # Prepare the data as JSON
-    json_results = json.dumps(results)
+    Builds an unsaved AccessibilityResult with its summary filled in
 
-    # Create a new AccessibilityResult entry
-    AccessibilityResult.objects.create(
-        url=url,  # Extract URL from results if available
-        json_response=json_results,
-        timestamp=timezone.now()
+    Args:
+        results (dict): The results from check_accessibility
+        url (str): The scanned URL
+        timings (dict, optional): The ScanMetrics timings of the scan
+        profile (ScanProfile, optional): The profile the scan used
+        user (User, optional): The user who ran the scan
+
+    Returns:
+        AccessibilityResult: The unsaved result
+    """
+    serif_font_check = results.get('serif_font_check') or ['']
+    return AccessibilityResult(
+        url=url,
+        serif_font_check=serif_font_check[0],
+        timestamp=timezone.now(),
+        timings=timings,
+        profile=profile,
+        user=user,
+        **summarize_results(results)
+    )
+
+
+def save_findings(scans_and_changes):
+    """
+    Writes the findings of saved scans with bulk_create in batches of settings.FINDINGS_BATCH_SIZE
+
+    Args:
+        scans_and_changes (iterable): (AccessibilityResult, rows) pairs, where rows
+            are the (row, change) pairs from plan_findings
+    """
+    findings = (
+        Finding.from_row(scan, row, change)
+        for scan, changes in scans_and_changes
+        for row, change in changes
     )
-    
\ No newline at end of file
+    while True:
+        batch = list(islice(findings, settings.FINDINGS_BATCH_SIZE))
+        if not batch:
+            break
+        Finding.objects.bulk_create(batch)
+
+
+def save_accessibility_result(results, url, timings=None, profile=None, user=None):
+
+    """
+    Save the accessibility results to the AccessibilityResult model using Django's ORM.
+
+    Each row in the result sections becomes a Finding, written with bulk_create
+    in batches of settings.FINDINGS_BATCH_SIZE. With settings.INCREMENTAL_SCANS
+    on, only the findings that changed since the last scan of the URL are written.
+
+    Returns:
+        AccessibilityResult: The saved result
+    """
+    with transaction.atomic():
+        # Create a new AccessibilityResult entry
+        scan = build_accessibility_result(results, url, timings, profile, user)
+        changes = plan_findings(scan, results)
+        scan.save()
+        save_findings([(scan, changes)])
+
+    return scan
+
+
+def save_accessibility_results(batch):
+    """
+    Saves several scans and their findings in one transaction
+
+    Args:
+        batch (list): (results, url, timings, profile, user) tuples
+
+    Returns:
+        list: The saved AccessibilityResult rows, in batch order
+    """
+    scans = [build_accessibility_result(*item) for item in batch]
+    with transaction.atomic():
+        changes = [plan_findings(scan, item[0]) for scan, item in zip(scans, batch)]
+        if connection.features.can_return_rows_from_bulk_insert:
+            AccessibilityResult.objects.bulk_create(scans)
+        else:
+            for scan in scans:
+                scan.save()
+        save_findings(zip(scans, changes))
+    return scans
@@ -1,81 +1,201 @@
-from django.shortcuts import render, redirect
-import requests
-from .forms import UrlForm, LoginForm, RegisterForm
-from .wcag_checker import run_access_scan
-from .models import AccessibilityResult
-from .utils import save_accessibility_result
-from django.http import JsonResponse, HttpResponse, FileResponse
-import pandas as pd
+from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from .forms import UrlForm, CrawlForm, UploadForm, LoginForm, RegisterForm
+from .jobs import enqueue_scan, enqueue_crawl, enqueue_upload
+from .models import AccessibilityResult, ScanJob, ScanProfile, ScanRollup
+from .result_cache import result_cache
+from .instrumentation import metrics_registry
+from .profiles import SECTIONS
+from . import incremental
+from .incremental import previous_scan
+from django.db.models import Q
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .exports import EXPORT_FORMATS, ExportUnavailable, export_chunks, export_findings, scan_json_chunks
 import json
 import tempfile
 import os
+import threading
+import time
+from datetime import datetime
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
+# The scanning code, with the validators, lxml and requests under it, is only
+# imported by the views that scan, so signing in or reading results doesn't load it
+
+
+def request_user(request):
+    """
+    Returns the signed in user a request's scans belong to, or None for anonymous requests
+    """
+    return request.user if request.user.is_authenticated else None
+
+
+def owned_scans(request):
+    """
+    Returns the scans a request may see: the signed in user's own, or the anonymous ones
+    """
+    return AccessibilityResult.objects.filter(user=request_user(request))
+
+
+def owned_jobs(request):
+    """
+    Returns the scan jobs a request may see, like owned_scans
+    """
+    return ScanJob.objects.filter(user=request_user(request))
 
 
 def check_url(request):
-    results = None
+    job = None
     if request.method == 'POST':
         form = UrlForm(request.POST)
         if form.is_valid():
             url = form.cleaned_data['url']
-            # Send GET request and run scanning script
-            try:
-
-                response = requests.get(url)
-                # with open("response.txt", "w") as file:
-                #     file.write(response.text)
-                if response.status_code == 200:
-                    results = run_access_scan(response)
-                    save_accessibility_result(results, url)
-                else:
-                    results = {'error': f"Error with request: {str(response.status_code)}"}
-                    save_accessibility_result(results, url)
-            except requests.exceptions.RequestException as err:
-                results = {'error': f"Could not fetch the URL. Error: {err}"}
+            # Queue the scan for a scan worker; the page polls scan_status for the result
+            job = enqueue_scan(url, profile=form.cleaned_data['profile'], user=request_user(request))
     else:
         form = UrlForm()
 
-    return render(request, 'scanner/check_url.html', {'form': form, 'results': results})
+    return render(request, 'scanner/check_url.html', {'form': form, 'job': job})
+
+
+def crawl_site(request):
+    job = None
+    if request.method == 'POST':
+        form = CrawlForm(request.POST)
+        if form.is_valid():
+            job = enqueue_crawl(user=request_user(request), **form.cleaned_data)
+    else:
+        form = CrawlForm()
+
+    return render(request, 'scanner/crawl_site.html', {'form': form, 'job': job})
+
+
+@login_required
+def scan_upload(request):
+    """
+    Queues an uploaded HTML file, or every page of an uploaded zip of a built
+    site, for a scan worker; nothing is fetched
+
+    Args:
+        request (HttpRequest): A POST of UploadForm queues the upload
+
+    Returns:
+        HttpResponse: The upload page, which polls scan_status for the queued job
+    """
+    job = None
+    if request.method == 'POST':
+        form = UploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            job = enqueue_upload(
+                form.cleaned_data['file'], form.cleaned_data['base_url'], form.cleaned_data['profile'],
+                user=request_user(request),
+            )
+    else:
+        form = UploadForm()
+
+    return render(request, 'scanner/scan_upload.html', {'form': form, 'job': job})
+
+
+def scan_status(request, job_id):
+    """
+    Returns the state of a scan job, and its results once it is done
+
+    Args:
+        request (HttpRequest): The HTTP request object, ?wait=<seconds> holds the request
+            until the job finishes, for at most settings.SCAN_STATUS_MAX_WAIT seconds
+        job_id (int): The id of the scan job
+
+    Returns:
+        JsonResponse: The job id, url, status, and error or results. An unfinished
+            job comes with retry_after, and a Retry-After header, for the next poll
+    """
+    job = get_object_or_404(owned_jobs(request), pk=job_id)
+
+    try:
+        wait = min(float(request.GET.get('wait', 0)), settings.SCAN_STATUS_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    deadline = time.monotonic() + wait
+    while job.status in (ScanJob.QUEUED, ScanJob.RUNNING) and time.monotonic() < deadline:
+        time.sleep(0.5)
+        job.refresh_from_db()
+
+    data = {
+        'id': job.id,
+        'url': job.url,
+        'mode': job.mode,
+        'status': job.status,
+        'error': job.error,
+        'pages_scanned': job.pages_scanned,
+        'not_modified': job.not_modified,
+        'profile': job.profile.name if job.profile else None,
+    }
+    if job.status == ScanJob.DONE and job.result:
+        data['results'] = job.result.as_results()
+        data['timings'] = job.result.timings
+    if job.status in (ScanJob.QUEUED, ScanJob.RUNNING):
+        data['retry_after'] = settings.SCAN_STATUS_RETRY_AFTER
+        response = JsonResponse(data)
+        response['Retry-After'] = str(settings.SCAN_STATUS_RETRY_AFTER)
+        return response
+    return JsonResponse(data)
+
+
+def cache_stats(request):
+    """
+    Returns the result cache hit and miss counters, for sizing the cache
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        JsonResponse: The counters for this process and the size of each cache tier,
+            with the stylesheet cache counters under 'stylesheets'
+    """
+    from .stylesheets import stylesheet_cache
+
+    stats = result_cache.stats()
+    stats['stylesheets'] = stylesheet_cache.stats()
+    return JsonResponse(stats)
+
+
+def metrics(request):
+    """
+    Serves the scan counters and timing histograms for Prometheus to scrape
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        HttpResponse: The metrics of this process in the Prometheus text format
+    """
+    for name, value in result_cache.counters.items():
+        metrics_registry.set_counter(f'result_cache_{name}_total', value)
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 def dashboard(request):
-   # Retrieve the most recent result
-    recent_result = AccessibilityResult.objects.order_by('-timestamp').first()
+   # Retrieve the most recent result of this user
+    recent_result = owned_scans(request).order_by('-timestamp').first()
 
     if recent_result:
-        json_data = json.loads(recent_result.json_response)
-
-        failures_df = pd.DataFrame(json_data['failures'])
-        warnings_df = pd.DataFrame(json_data['warnings'])
-        success_df = pd.DataFrame(json_data['success'])
-        skipped_df = pd.DataFrame(json_data['skipped']) 
-        serif_result = json_data['serif_font_check'][0]     
-
-        failures_count = len(failures_df)
-        warnings_count = len(warnings_df)
-        success_count = len(success_df)
-        skipped_count = len(skipped_df)
-
-        #failure_example = failures_df['message'].iloc[0].split(' - ')[0] if failures_count > 0 else 'No failures recorded'
-        failure_example = (failures_df['message'].iloc[0].split(' - ')[0] 
-                   if failures_count > 0 and failures_df['message'].iloc[0] 
-                   else 'No failures recorded')
-        warning_example = (warnings_df['message'].iloc[0].split(' - ')[0] 
-                   if warnings_count > 0 and warnings_df['message'].iloc[0] 
-                   else 'No warnings recorded')
-        skipped_example = (skipped_df['message'].iloc[0].split(' - ')[0] 
-                   if skipped_count > 0 and skipped_df['message'].iloc[0] 
-                   else 'Individual elements recorded for each skipped record')
-        success_example = (success_df['message'].iloc[0].split(' - ')[0] 
-                   if success_count > 0 and success_df['message'].iloc[0] 
-                   else 'No successful elements recorded')
-        #warning_example = warnings_df['message'].iloc[0].split(' - ')[0] if warnings_count > 0 else 'No warnings recorded'
-        #skipped_example = skipped_df['message'].iloc[0].split(' - ')[0] if skipped_count > 0 else 'No skipped elements recorded'
-        #success_example = success_df['message'].iloc[0].split(' - ')[0] if success_count > 0 else 'No successful elements recorded'
+        # Counts and examples are stored on the scan when it is saved
+        failures_count = recent_result.failure_count
+        warnings_count = recent_result.warning_count
+        success_count = recent_result.success_count
+        skipped_count = recent_result.skipped_count
+
+        failure_example = recent_result.failure_example or 'No failures recorded'
+        warning_example = recent_result.warning_example or 'No warnings recorded'
+        skipped_example = recent_result.skipped_example or 'Individual elements recorded for each skipped record'
+        success_example = recent_result.success_example or 'No successful elements recorded'
+        serif_result = recent_result.serif_font_check
 
+        trend = scan_trend(recent_result.url, user=recent_result.user, profile=recent_result.profile)
     else:
         failures_count = warnings_count = skipped_count = success_count = 0
         failure_example = "No failures recorded"
@@ -83,6 +203,7 @@ def dashboard(request):
         skipped_example = "No skipped elements recorded"
         success_example = "No successful elements recorded"
         serif_result = "No result recorded"
+        trend = []
 
     context = {
         'url': recent_result.url if recent_result else 'No URL checked yet',
@@ -95,25 +216,362 @@ def dashboard(request):
         'skipped_example': skipped_example,
         'success_example': success_example,
         'serif_font_check': serif_result,
+        'trend': trend,
     }
 
     return render(request, 'scanner/dashboard.html', context)
 
+
+def scan_trend(url, limit=None, user=None, profile=None):
+    """
+    Returns the summary counts of the most recent scans of a URL with one profile, oldest first.
+
+    When fewer scans are kept than the limit, the days before them are filled
+    in from the ScanRollup rows of the scans retention has deleted. A day's
+    point has the average counts of its scans, an id of None and the number
+    of scans in scan_count
+
+    Args:
+        url (str): The scanned URL
+        limit (int, optional): How many scans to include; defaults to settings.DASHBOARD_TREND_SCANS
+        user (User, optional): Whose scans to include; None for the anonymous ones
+        profile (ScanProfile, optional): The profile the scans used; None for full scans
+
+    Returns:
+        list: A dict per scan or day with its timestamp, counts and bar widths for the chart
+    """
+    limit = limit or settings.DASHBOARD_TREND_SCANS
+    scans = list(
+        AccessibilityResult.objects.filter(url=url, user=user, profile=profile)
+        .order_by('-timestamp')
+        .values('id', 'timestamp', 'success_count', 'failure_count', 'warning_count', 'skipped_count')
+        [:limit]
+    )
+    for scan in scans:
+        scan['scan_count'] = 1
+    if len(scans) < limit:
+        rollups = (
+            ScanRollup.objects.filter(url=url, user=user, profile_name=profile.name if profile else '')
+            .order_by('-last_scan_at')[:limit - len(scans)]
+        )
+        for rollup in rollups:
+            day = {'id': None, 'timestamp': rollup.last_scan_at, 'scan_count': rollup.scan_count}
+            for field in ('success_count', 'failure_count', 'warning_count', 'skipped_count'):
+                day[field] = round(getattr(rollup, field) / (rollup.scan_count or 1))
+            scans.append(day)
+    scans.reverse()
+
+    most_issues = max([scan['failure_count'] + scan['warning_count'] for scan in scans] or [0]) or 1
+    for scan in scans:
+        scan['failure_width'] = round(100 * scan['failure_count'] / most_issues)
+        scan['warning_width'] = round(100 * scan['warning_count'] / most_issues)
+    return scans
+
+
+def dashboard_trend(request):
+    """
+    Returns the scan-by-scan counts for a URL as JSON, for charting
+
+    Args:
+        request (HttpRequest): The HTTP request object, ?url= picks the URL, ?profile= the
+            profile (full scans without it) and ?limit= the number of scans; defaults to
+            the URL and profile the user scanned last
+
+    Returns:
+        JsonResponse: The url, the profile and a list of scans, oldest first
+    """
+    url = request.GET.get('url')
+    profile = None
+    if not url:
+        recent_result = owned_scans(request).order_by('-timestamp').select_related('profile').first()
+        url = recent_result.url if recent_result else None
+        profile = recent_result.profile if recent_result else None
+    elif request.GET.get('profile'):
+        profile = ScanProfile.objects.filter(name=request.GET['profile']).first()
+        if profile is None:
+            return JsonResponse({'error': f"No scan profile named '{request.GET['profile']}'"}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', settings.DASHBOARD_TREND_SCANS)), 1000))
+    except ValueError:
+        limit = settings.DASHBOARD_TREND_SCANS
+
+    scans = scan_trend(url, limit, request_user(request), profile) if url else []
+    for scan in scans:
+        scan['timestamp'] = scan['timestamp'].isoformat()
+        del scan['failure_width'], scan['warning_width']
+    return JsonResponse({'url': url, 'profile': profile.name if profile else None, 'scans': scans})
+
+@login_required
+def scan_history(request):
+    """
+    Lists the signed in user's scans, newest first, a page at a time.
+
+    Pages are keyset-paginated on (timestamp, id) from the last scan shown,
+    so each one reads straight off the (user, timestamp, id) index however
+    far back the user pages.
+
+    Args:
+        request (HttpRequest): ?url= keeps the scans of one URL; ?before=<scan id>
+            continues from that scan
+
+    Returns:
+        HttpResponse: The history page
+    """
+    scans = owned_scans(request)
+    url = request.GET.get('url')
+    if url:
+        scans = scans.filter(url=url)
+
+    before = request.GET.get('before')
+    if before:
+        cursor = scans.filter(pk=before).values('timestamp', 'id').first() if before.isdigit() else None
+        if cursor is None:
+            return redirect('scan_history')
+        scans = scans.filter(
+            Q(timestamp__lt=cursor['timestamp']) | Q(timestamp=cursor['timestamp'], id__lt=cursor['id'])
+        )
+
+    page_size = settings.HISTORY_PAGE_SIZE
+    rows = list(
+        scans.order_by('-timestamp', '-id')
+        .values('id', 'url', 'timestamp', 'failure_count', 'warning_count', 'success_count', 'profile__name')
+        [:page_size + 1]
+    )
+    next_page = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        params = request.GET.copy()
+        params['before'] = rows[-1]['id']
+        next_page = f'?{params.urlencode()}'
+
+    return render(request, 'scanner/history.html', {'scans': rows, 'url': url, 'next_page': next_page})
+
+
 def download_json(request):
-    recent_result = AccessibilityResult.objects.order_by('-timestamp').first()
+    recent_result = owned_scans(request).order_by('-timestamp').first()
 
     if recent_result:
-        json_data = json.loads(recent_result.json_response)
-
-        #formatted_json = json.dumps(json_data, indent=4)
-        
-        response = HttpResponse(json.dumps(json_data, indent=4), content_type='application/json')
+        # Stream the scan a section at a time instead of building it in memory
+        response = StreamingHttpResponse(scan_json_chunks(recent_result), content_type='application/json')
         response['Content-Disposition'] = 'attachment; filename="accessibility_results.json"'
 
         return response
     else:
         return JsonResponse({'error': 'No results found to download'}, status=404)
-    
+
+
+def parse_export_time(value):
+    """
+    Reads a date or datetime query parameter as an aware datetime
+
+    Args:
+        value (str): An ISO date or datetime, or an empty string
+
+    Returns:
+        datetime: The parsed time, or None if value is empty
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed_date = parse_date(value)
+        if parsed_date is None:
+            raise ValueError(f"'{value}' is not a date or datetime")
+        parsed = datetime.combine(parsed_date, datetime.min.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_results(request):
+    """
+    Streams the findings of the request's own scans as NDJSON, CSV or Parquet, optionally gzipped
+
+    Args:
+        request (HttpRequest): The HTTP request object. ?format= picks the format,
+            ?scan=, ?start=, ?end= and ?url_prefix= filter the findings and
+            ?compress=gzip gzips the download
+
+    Returns:
+        StreamingHttpResponse: The export as a file download
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"Unknown format, use one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+    try:
+        scan_id = int(request.GET['scan']) if request.GET.get('scan') else None
+        start = parse_export_time(request.GET.get('start'))
+        end = parse_export_time(request.GET.get('end'))
+    except ValueError as err:
+        return JsonResponse({'error': f"Invalid filter: {err}"}, status=400)
+
+    findings = export_findings(
+        request_user(request), scan_id=scan_id, start=start, end=end, url_prefix=request.GET.get('url_prefix'),
+    )
+    compress = request.GET.get('compress') == 'gzip'
+    try:
+        chunks = export_chunks(export_format, findings, compress=compress)
+    except ExportUnavailable as err:
+        return JsonResponse({'error': str(err)}, status=501)
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f'accessibility_findings.{extension}'
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def parse_stream_options(params):
+    """
+    Reads the ?sections= and ?max_failures= options of a streamed scan
+
+    Args:
+        params (QueryDict): The query parameters
+
+    Returns:
+        tuple: (sections or None for all of them, max_failures or None)
+    """
+    sections = None
+    if params.get('sections'):
+        sections = params['sections'].split(',')
+        unknown = [section for section in sections if section not in SECTIONS]
+        if unknown:
+            raise ValueError(f"unknown section {', '.join(unknown)}, use {', '.join(SECTIONS)}")
+    max_failures = None
+    if params.get('max_failures'):
+        max_failures = int(params['max_failures'])
+        if max_failures < 1:
+            raise ValueError("max_failures must be at least 1")
+    return sections, max_failures
+
+
+class StreamSlot:
+    """
+    One of the settings.STREAM_SCAN_MAX_CONCURRENT scans stream_scan runs at once
+    in this process. It wraps the response content and is given back when the
+    response is closed, whether or not the content was ever read
+    """
+    _lock = threading.Lock()
+    active = 0
+
+    def __init__(self):
+        self.chunks = iter(())
+        self.held = False
+
+    def acquire(self):
+        with StreamSlot._lock:
+            if StreamSlot.active >= settings.STREAM_SCAN_MAX_CONCURRENT:
+                return False
+            StreamSlot.active += 1
+        self.held = True
+        return True
+
+    def __iter__(self):
+        return self.chunks
+
+    def close(self):
+        if self.held:
+            self.held = False
+            with StreamSlot._lock:
+                StreamSlot.active -= 1
+
+
+@login_required
+def stream_scan(request):
+    """
+    Scans a page and streams its findings as NDJSON while the validators run.
+    Nothing is saved; the last line is a summary of the scan. The scan runs in
+    the request, so at most settings.STREAM_SCAN_MAX_CONCURRENT run at once
+
+    Args:
+        request (HttpRequest): The HTTP request object. ?url= is the page,
+            ?profile= names the ScanProfile to use,
+            ?sections=failures,warnings keeps only those sections and
+            ?max_failures= stops the scan after that many failures
+
+    Returns:
+        StreamingHttpResponse: One JSON object per finding, then the summary, or
+            a 429 when too many scans are already streaming
+    """
+    import requests
+
+    from .renderers import render_page
+    from .wcag_script import FindingStream
+
+    form = UrlForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Pass a valid ?url= and ?profile='}, status=400)
+    try:
+        sections, max_failures = parse_stream_options(request.GET)
+    except ValueError as err:
+        return JsonResponse({'error': f"Invalid option: {err}"}, status=400)
+
+    slot = StreamSlot()
+    if not slot.acquire():
+        response = JsonResponse({'error': 'Too many scans are streaming, try again shortly'}, status=429)
+        response['Retry-After'] = str(settings.SCAN_STATUS_RETRY_AFTER)
+        return response
+
+    url = form.cleaned_data['url']
+    try:
+        response = render_page(url)
+        response.raise_for_status()
+        stream = FindingStream(
+            response, sections=sections, max_failures=max_failures, profile=form.cleaned_data['profile'],
+        )
+    except requests.exceptions.RequestException as err:
+        slot.close()
+        return JsonResponse({'error': f"Could not fetch {url}: {err}"}, status=502)
+    except Exception:
+        slot.close()
+        raise
+
+    def lines():
+        try:
+            for row in stream:
+                yield json.dumps(row.as_dict()) + '\n'
+            yield json.dumps({
+                'done': True,
+                'failures': stream.failures,
+                'stopped_early': stream.stopped_early,
+                'serif_font_check': stream.serif_font_check,
+            }) + '\n'
+        finally:
+            # Once the scan is over the next one can start, before the response is closed
+            slot.close()
+
+    slot.chunks = lines()
+    return StreamingHttpResponse(slot, content_type='application/x-ndjson')
+
+
+def scan_changes(request, scan_id=None):
+    """
+    Returns the findings added and resolved since the previous scan of a URL
+
+    Args:
+        request (HttpRequest): The HTTP request object; without a scan_id,
+            ?url= picks the latest scan of that URL
+        scan_id (int, optional): The id of the scan
+
+    Returns:
+        JsonResponse: The scan and previous scan ids, and the added and resolved rows
+    """
+    if scan_id is not None:
+        scan = get_object_or_404(owned_scans(request), pk=scan_id)
+    else:
+        url = request.GET.get('url')
+        if not url:
+            return JsonResponse({'error': 'Pass a scan id or ?url='}, status=400)
+        scan = previous_scan(url, user=request_user(request))
+        if scan is None:
+            return JsonResponse({'error': 'No scans found for this URL'}, status=404)
+    return JsonResponse(incremental.scan_changes(scan))
+
+
 def sign_in(request):
     """
     Handles both GET and POST requests for user login
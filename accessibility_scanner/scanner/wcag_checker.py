@@ -1,6 +1,45 @@
+from django.conf import settings
+
+from scanner.instrumentation import Measurement, ScanMetrics
+from scanner.sinks import dump_results, get_result_sink
 from scanner.wcag_script import check_accessibility
 
 
-def run_access_scan(html_content):
-    # do stuff
-    return check_accessibility(html_content)
\ No newline at end of file
+def run_access_scan(response, metrics=None, sink=None, profile=None, user=None):
+    """
+    Scans a fetched page and persists the results; the one place scans are saved
+
+    Args:
+        response (requests.Response): The response for the page to scan
+        metrics (ScanMetrics, optional): Collects the stage timings; when given the
+            caller finishes it, otherwise it is finished here
+        sink (object, optional): Where the results go; defaults to settings.RESULT_SINK
+        profile (ScanProfile, optional): The validators, level, techniques and sections to use
+        user (User, optional): The user the scan is saved for
+
+    Returns:
+        AccessibilityResult: The saved scan, or None when the sink doesn't save one yet
+    """
+    owns_metrics = metrics is None
+    if owns_metrics:
+        metrics = ScanMetrics()
+    if sink is None:
+        sink = get_result_sink()
+
+    # Scans run by the app reuse the results of identical pages
+    results = check_accessibility(
+        response, use_cache=settings.RESULT_CACHE_ENABLED, metrics=metrics, profile=profile,
+    )
+
+    # The timings are written with the scan, so the stages after it are only
+    # reported on /metrics rather than saved with a second write
+    timings = metrics.as_dict()
+    with Measurement({}, 'persist', metric='stage'):
+        scan = sink.write(results, response.url, timings, profile, user)
+    if settings.SCAN_DEBUG_DUMP:
+        with Measurement({}, 'dump', metric='stage'):
+            dump_results(results, scan)
+
+    if owns_metrics:
+        metrics.finish(scan)
+    return scan
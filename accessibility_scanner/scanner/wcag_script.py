@@ -1,27 +1,45 @@
-import requests
-import json
-import re
-from wcag_zoo.validators.anteater import Anteater
-from wcag_zoo.validators.ayeaye import Ayeaye
-from wcag_zoo.validators.glowworm import Glowworm
-from wcag_zoo.validators.molerat import Molerat
-from wcag_zoo.validators.tarsier import Tarsier
-from .utils import save_accessibility_result
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .fetcher import fetch
+from .result_cache import result_cache
+from .pipeline import ParsedDocument, get_executor, get_executor_backend, validate_in_process
+from .instrumentation import ScanMetrics, measure_validator
+from .fonts import analyse_fonts, load_cached_stylesheet
+from .findings import FindingBatch
+from .documents import SiteDirectory
+from .profiles import DEFAULT_LEVEL, SECTIONS, VALIDATORS, applicable_validators, load_validator
+from django.conf import settings
+from itertools import repeat
 from datetime import datetime
 
-def run_validator(ValidatorClass, html_content):
+
+def __getattr__(name):
+    # The validators are imported when first used, see profiles.VALIDATORS
+    if name in VALIDATORS:
+        return load_validator(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def run_validator(ValidatorClass, html_content, document=None, level=None):
     """
     Runs a validator on the HTML content
 
     Args:
         ValidatorClass (class): The WCAG validator to use
         html_content (str): The HTML content of the webpage
+        document (ParsedDocument, optional): An already parsed copy of the page to
+            share between validators instead of parsing html_content again
+        level (str, optional): The WCAG level, 'AA' or 'AAA', for the validators that use it
 
     Returns:
         dict: The validation results; (success, failures, warnings, skipped elements)
     """
     
-    validator = ValidatorClass()
+    validator = ValidatorClass(level=level) if level else ValidatorClass()
+
+    if document is not None:
+        document.prepare(validator)
+        return validator.validate_document(document.html_bytes)
     
     # HTML content has to be turned into bytes for the validator to work
     html_content_bytes = html_content.encode('utf-8')
@@ -29,74 +47,243 @@ def run_validator(ValidatorClass, html_content):
     return result
 
 def check_for_serif_fonts(content):
-    # with open(file_path, 'r', encoding='utf-8') as file:
-    #     content = file.read()
-    
-    serif_font_pattern = r"font-family:.*?\b([^;]*\bserif\b[^;]*)(?!sans-serif)"
-    matches = re.findall(serif_font_pattern, content, re.IGNORECASE)
-    
-    serif_fonts = [match.strip() for match in matches if 'sans-serif' not in match.lower()]
-    
-    if serif_fonts:
-        return "Serif font found in url."
-        # for font in serif_fonts:
-        #     print(f"- {font}\n")
-    else:
-        return "No serif fonts found in url."
-
-
-def check_accessibility(response):
-    html_content = response.text
-    # commented out lines below for testing example htmls
-    # with open('bad_example.html', 'r', encoding='utf-8') as file:
-    #     html_content = file.read()
-    url = response.url
-    datetime_stamp = datetime.now().isoformat()
+    """
+    Checks whether a page sets any text in a serif font
 
-    # Categorize results
-    all_results = {
-        'success': [],
-        'failures': [],
-        'warnings': [],
-        'skipped': [], 
-        'serif_font_check': [],
-    }
-
-    all_results['serif_font_check'].append(check_for_serif_fonts(html_content))
-
-    # WCAG Validators
-    validators = [Anteater, Ayeaye, Glowworm, Molerat, Tarsier]
-
-    for ValidatorClass in validators:
-        result = run_validator(ValidatorClass, html_content)
-        
+    Args:
+        content (str): The HTML content of the webpage
+
+    Returns:
+        str: "Serif font found in url." or "No serif fonts found in url."
+    """
+    return analyse_fonts(content).summary
+
+
+class FindingStream:
+    """
+    Scans a fetched page and yields its rows as each validator finishes.
+
+    Iterate it directly, or with `async for`, which runs the scan on a thread
+    of its own. Rows are CompactFindings in the order check_accessibility
+    lists them. Rows of sections not in `sections` are never built, and with
+    `max_failures` set the scan stops once that many failures were yielded,
+    without running the remaining validators or the font check.
+
+    After iterating, serif_font_check holds the font check summary (empty when
+    the scan stopped early), failures the number of failures yielded and
+    stopped_early whether max_failures was reached.
+
+    A ScanProfile picks the validators, WCAG level, techniques and sections;
+    validators it leaves out are never imported. Without one every validator
+    runs at level AA and every section is kept.
+
+    While a scan is streamed, its validate stage includes the time the
+    consumer spends between rows.
+    """
+
+    def __init__(self, response, executor=None, use_cache=False, metrics=None, sections=None, max_failures=None,
+                 profile=None):
+        """
+        Args:
+            response (requests.Response): The response for the page to scan
+            executor (str, optional): Runs the validators 'serial', 'thread' or 'process';
+                defaults to settings.SCAN_EXECUTOR
+            use_cache (bool): Reuse the validator results of an identical page scanned earlier
+            metrics (ScanMetrics, optional): Collects the stage timings; the caller finishes it
+            sections (iterable, optional): The sections to keep; defaults to the profile's
+                sections, or all of SECTIONS
+            max_failures (int, optional): Stop after this many failures
+            profile (ScanProfile, optional): What the scan checks and keeps
+        """
+        self.response = response
+        self.executor = executor
+        self.use_cache = use_cache
+        self.metrics = metrics
+        kept = SECTIONS if profile is None else profile.sections
+        self.sections = frozenset(kept if sections is None else set(sections) & set(kept))
+        if profile is None:
+            self.validator_names = list(VALIDATORS)
+            self.level = DEFAULT_LEVEL
+            self.techniques = None
+            self.check_fonts = True
+        else:
+            self.validator_names = applicable_validators(profile.validators, profile.level)
+            self.level = profile.level
+            self.techniques = frozenset(profile.techniques) if profile.techniques else None
+            self.check_fonts = profile.check_fonts
+        self.max_failures = max_failures
+        self.failures = 0
+        self.stopped_early = False
+        self.serif_font_check = []
+        self.document = None
+        self.site = None
+        self._rows = None
+
+    def __iter__(self):
+        if self._rows is None:
+            self._rows = self._scan()
+        return self._rows
+
+    async def __aiter__(self):
+        # One thread runs the whole scan, so its stage measurements stay on one thread
+        rows = iter(self)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='finding-stream') as pool:
+            try:
+                while True:
+                    row = await loop.run_in_executor(pool, next, rows, None)
+                    if row is None:
+                        break
+                    yield row
+            finally:
+                await loop.run_in_executor(pool, rows.close)
+
+    def _scan(self):
+        owns_metrics = self.metrics is None
+        metrics = ScanMetrics() if owns_metrics else self.metrics
+        try:
+            html_content = self.response.text
+            # commented out lines below for testing example htmls
+            # with open('bad_example.html', 'r', encoding='utf-8') as file:
+            #     html_content = file.read()
+            url = self.response.url
+            # Pages read from a site on disk load their stylesheets from it too
+            site = getattr(self.response, 'site', None)
+            self.site = site if isinstance(site, SiteDirectory) else None
+            # Rows share the url and timestamp through the batch instead of a dict each
+            batch = FindingBatch(url, datetime.now().isoformat())
+
+            # WCAG Validators
+            validators = [load_validator(name) for name in self.validator_names]
+
+            results = None
+            completed = None
+            if self.use_cache:
+                # The key covers the linked stylesheets, so the page is parsed before the lookup
+                with metrics.stage('parse'):
+                    self.document = ParsedDocument(html_content, base_url=url, site=self.site)
+                    stylesheets = self.document.stylesheet_fingerprints()
+                cache_key = result_cache.key(html_content, validators, self.level, stylesheets)
+                results = result_cache.get(cache_key)
+            if results is None:
+                results = self._validate(metrics, validators, html_content, url)
+                completed = []
+            else:
+                metrics.cache_hit = True
+
+            for result in results:
+                if completed is not None:
+                    completed.append(result)
+                yield from self._rows_of(batch, result)
+                if self.stopped_early:
+                    return
+            if self.use_cache and completed is not None:
+                result_cache.set(cache_key, completed)
+
+            if not self.check_fonts:
+                return
+            # Resolve the font of every element, reusing the parsed page when there is one
+            with metrics.stage('fonts'):
+                fonts = analyse_fonts(
+                    html_content,
+                    base_url=url,
+                    root=self.document.root if self.document is not None else None,
+                    load_stylesheet=self._stylesheet_loader(),
+                )
+            self.serif_font_check.append(fonts.summary)
+            yield from self._rows_of(batch, fonts.as_validator_result())
+        finally:
+            if owns_metrics:
+                metrics.finish()
+
+    def _validate(self, metrics, validators, html_content, url):
+        # Fan the validators out; map keeps the results in validator order
+        backend = get_executor_backend(self.executor)
+        if backend == 'process':
+            arguments = (
+                repeat(validate_in_process), validators, repeat(html_content), repeat(url), repeat(self.level),
+                repeat(self.site),
+            )
+        else:
+            # Parse the page once and share the tree between all the validators
+            if self.document is None:
+                with metrics.stage('parse'):
+                    self.document = ParsedDocument(html_content, base_url=url, site=self.site)
+                    self.document.root
+            arguments = (
+                repeat(run_validator), validators, repeat(html_content), repeat(self.document), repeat(self.level)
+            )
+
+        with metrics.stage('validate'):
+            measured = get_executor(backend).map(measure_validator, *arguments)
+            try:
+                for Validator, (result, measurement) in zip(validators, measured):
+                    metrics.add_validator(Validator.__name__, measurement)
+                    yield result
+            finally:
+                # Stopping early cancels the validators that haven't started
+                close = getattr(measured, 'close', None)
+                if close is not None:
+                    close()
+
+    def _stylesheet_loader(self):
+        if self.site is not None:
+            return self.site.load_rules
+        return load_cached_stylesheet if settings.FONT_CHECK_LOAD_STYLESHEETS else None
+
+    def _rows_of(self, batch, result):
         for section, content in result.items():
+            if section not in self.sections:
+                continue
             for guideline, items in content.items():
                 for technique, entries in items.items():
+                    # Skipped elements are filed under the technique 'skipped'
+                    if self.techniques is not None and section != 'skipped' and technique not in self.techniques:
+                        continue
                     for entry in entries:
-                        # Define the type of issue, e.g., based on some condition in `entry`
-                        issue_type = section  # Default to 'failures' if no type provided
-                        
-                        row = {
-                            'datetime': datetime_stamp,
-                            'url': url,
-                            'section_type': section,
-                            'guideline': entry.get('guideline'),
-                            'technique': entry.get('technique'),
-                            'message': entry.get('message'),
-                            'error_code': entry.get('error_code'),
-                            'xpath': entry.get('xpath'),
-                            'classes': entry.get('classes'),
-                            'id': entry.get('id')
-                        }
-                        
-                        # Append to appropriate category
-                        all_results[issue_type].append(row)
-    with open("sample.json", "w") as file:
-        json.dump(all_results, file)
-                        
-    save_accessibility_result(all_results, url)
-    
+                        yield batch.add(section, entry)
+                        if section == 'failures':
+                            self.failures += 1
+                            if self.max_failures is not None and self.failures >= self.max_failures:
+                                self.stopped_early = True
+                                return
+
+
+def check_accessibility(response, executor=None, use_cache=False, metrics=None, sections=None, max_failures=None,
+                        profile=None):
+    """
+    Runs the WCAG validators and serif font check over a fetched page.
+
+    Nothing is saved here; wcag_checker.run_access_scan persists the results
+    through the configured result sink. FindingStream yields the same rows
+    without waiting for the whole scan.
+
+    Args:
+        response (requests.Response): The response for the page to scan
+        executor (str, optional): Runs the validators 'serial', 'thread' or 'process';
+            defaults to settings.SCAN_EXECUTOR
+        use_cache (bool): Reuse the validator results of an identical page scanned earlier
+        metrics (ScanMetrics, optional): Collects the stage timings; the caller finishes it
+        sections (iterable, optional): The sections to keep; the others are left empty
+        max_failures (int, optional): Stop scanning after this many failures
+        profile (ScanProfile, optional): The validators, level, techniques and sections to use
+
+    Returns:
+        dict: The results grouped into success, failures, warnings, skipped and serif_font_check.
+            Each row is a CompactFinding, which reads like the row dict; write
+            the results with json.dump(..., default=json_default)
+    """
+    stream = FindingStream(
+        response, executor=executor, use_cache=use_cache, metrics=metrics,
+        sections=sections, max_failures=max_failures, profile=profile,
+    )
+
+    # Categorize results
+    all_results = {section: [] for section in SECTIONS}
+    for row in stream:
+        all_results[row.section_type].append(row)
+    all_results['serif_font_check'] = stream.serif_font_check
+
     return all_results if any(all_results.values()) else {"message": "No accessibility issues found."}
 
 
@@ -108,7 +295,7 @@ def check_accessibility(response):
 if __name__ == "__main__":
     url = "https://www.bbc.com"
     
-    response = requests.get(url)
+    response = fetch(url)
     recommendations = check_accessibility(response)
 
     # for rec in recommendations: